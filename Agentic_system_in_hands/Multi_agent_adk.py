@@ -6,6 +6,9 @@ from google.adk.agents.invocation_context import InvocationContext
 from google.adk.runners import Runner
 from google.adk.sessions import InMemorySessionService
 from google.genai import types
+
+from model_registry import get_adk_model
+from usage_tracking import tracker
 # from google.adk.agents.invocation_context import InvocationContext
 
 # print(InvocationContext.model_json_schema())
@@ -26,10 +29,14 @@ class ConditionChecker(BaseAgent):
             content=types.Content(role="model", parts=[types.Part(text="Condition not met, continuing loop.")])
         )
 
+before_usage, after_usage = tracker.adk_callbacks(pipeline="status_poller")
+
 process_step= LlmAgent(
     name="ProcessStep",
-    model="gemini-2.0-flash",
-    instruction="you are a step in a longer process. If you are the fourth step, update session state by setting 'status' to 'completed'."
+    model=get_adk_model("gemini-2.0-flash"),
+    instruction="you are a step in a longer process. If you are the fourth step, update session state by setting 'status' to 'completed'.",
+    before_model_callback=before_usage,
+    after_model_callback=after_usage,
 )
 
 pollar= LoopAgent(
@@ -70,6 +77,8 @@ async def main():
         if event.actions and event.actions.escalate:
             print(f"✅ {event.author} signaled completion, stopping loop.")
 
+    print("\n--- Usage ---\n" + tracker.report())
+
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -2,7 +2,7 @@ import os
 import asyncio
 from typing import List
 
-from langchain_google_genai import ChatGoogleGenerativeAI
+from model_registry import get_chat_model
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.tools import tool
 from langchain.agents import create_tool_calling_agent, AgentExecutor
@@ -11,7 +11,7 @@ from langchain.agents import create_tool_calling_agent, AgentExecutor
 # Ensure your GOOGLE_API_KEY environment variable is set.
 try:
     # A model with function/tool calling capabilities is required.
-    llm = ChatGoogleGenerativeAI(model="gemini-pro", temperature=0)
+    llm = get_chat_model("gemini-pro", temperature=0)
     print(f"✅ Language model initialized: {llm.model_name}")
 except Exception as e:
     print(f"🛑 Error initializing language model: {e}")
@@ -0,0 +1,371 @@
+"""
+Offline benchmark for the pipelines in this folder, driven by fake_llm.
+
+Runs without Gemini access: the scripts are imported with the model registry
+overridden, so LangChain scripts get a `FakeChatModel` and the ADK LoopAgent
+pipelines get a `FakeAdkLlm` on their LlmAgent. For each pipeline it reports
+p50/p95/p99 latency, LLM calls per run and throughput, and compares them with
+the stored baselines in benchmark_baselines.json.
+
+By default only the deterministic metrics (LLM calls per run and error rate)
+are compared, so the check is stable in CI. Wall-clock metrics are compared
+only with --compare-timing, against a baseline recorded on the same machine.
+
+Usage:
+    python benchmark.py                          # run all pipelines, compare
+    python benchmark.py --runs 50 --concurrency 4 --latency-ms 200
+    python benchmark.py --compare-timing         # also compare p50/p95/p99 and throughput
+    python benchmark.py --pipelines parallel reflection --save-baseline
+"""
+
+import argparse
+import asyncio
+import contextlib
+import importlib
+import io
+import json
+import math
+import os
+import re
+import sys
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from fake_llm import FakeAdkLlm, FakeCall, FakeChatModel, FakeReply, FakeResponder, Latency
+from model_registry import registry
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(HERE, "benchmark_baselines.json")
+
+# The LangChain scripts read GOOGLE_API_KEY at import time.
+os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark")
+if HERE not in sys.path:
+    sys.path.insert(0, HERE)
+
+
+@dataclass
+class Pipeline:
+    name: str
+    responder: FakeResponder
+    run_once: Callable[[], Awaitable[Any]]
+
+
+@dataclass
+class Result:
+    name: str
+    runs: int
+    errors: int
+    latencies: List[float] = field(default_factory=list)
+    llm_calls: int = 0
+    wall_seconds: float = 0.0
+
+    def percentile(self, p: float) -> float:
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        # Nearest-rank percentile.
+        index = max(0, math.ceil(p / 100 * len(ordered)) - 1)
+        return ordered[index] * 1000
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "p50_ms": round(self.percentile(50), 2),
+            "p95_ms": round(self.percentile(95), 2),
+            "p99_ms": round(self.percentile(99), 2),
+            "llm_calls_per_run": round(self.llm_calls / self.runs, 2) if self.runs else 0.0,
+            "throughput_rps": round(self.runs / self.wall_seconds, 2) if self.wall_seconds else 0.0,
+            "error_rate": round(self.errors / self.runs, 4) if self.runs else 0.0,
+        }
+
+
+# -------------------------
+# Loading the scripts against fake models
+# -------------------------
+def import_with_fakes(module_name: str, responder: FakeResponder):
+    """Import a script with the model registry handing out fakes backed by `responder`."""
+
+    def fake_chat(model: str, temperature: float = 0.0, **kwargs: Any) -> FakeChatModel:
+        return FakeChatModel(responder=responder, model=f"fake-{model}", temperature=temperature)
+
+    def fake_adk(model: str, **kwargs: Any) -> FakeAdkLlm:
+        return FakeAdkLlm(responder=responder, model=f"fake-{model}")
+
+    with registry.override(chat=fake_chat, adk=fake_adk):
+        sys.modules.pop(module_name, None)
+        with contextlib.redirect_stdout(io.StringIO()):
+            return importlib.import_module(module_name)
+
+
+async def run_adk_agent(agent, app_name: str = "bench_app", user_id: str = "bench_user") -> None:
+    """Run an ADK agent once in a fresh session and drain its events."""
+    from google.adk.runners import Runner
+    from google.adk.sessions import InMemorySessionService
+    from google.genai import types
+
+    session_service = InMemorySessionService()
+    session_id = str(uuid.uuid4())
+    await session_service.create_session(
+        app_name=app_name, user_id=user_id, session_id=session_id, state={"checking": 1, "iterative": 0}
+    )
+    runner = Runner(app_name=app_name, agent=agent, session_service=session_service)
+    msg = types.Content(role="user", parts=[types.Part(text="Start the process")])
+    async for event in runner.run_async(user_id=user_id, session_id=session_id, new_message=msg):
+        if event.actions and event.actions.escalate:
+            break
+
+
+# -------------------------
+# Pipeline definitions
+# -------------------------
+def build_pipelines(make_responder: Callable[..., FakeResponder]) -> Dict[str, Callable[[], Pipeline]]:
+    def parallel() -> Pipeline:
+        responder = make_responder(default="A concise paragraph about the topic.")
+        module = import_with_fakes("parallel_code_in_langchain", responder)
+        return Pipeline(
+            "parallel", responder,
+            lambda: module.full_parallel_chain.ainvoke("The history of space exploration"),
+        )
+
+    def reflection() -> Pipeline:
+        responder = make_responder(
+            rules=[(r"senior software engineer", "- Add type hints.\n- Test n=1.")],
+            default="def calculate_factorial(n: int) -> int:\n    ...",
+        )
+        module = import_with_fakes("reflection_code_in_langchain", responder)
+        return Pipeline("reflection", responder, lambda: asyncio.to_thread(module.run_reflection_loop))
+
+    def tool_agent() -> Pipeline:
+        def after_tool(call: FakeCall) -> bool:
+            return re.search(r"^tool:", call.prompt, re.MULTILINE) is not None
+
+        responder = make_responder(
+            rules=[(after_tool, "The capital of France is Paris.")],
+            default=FakeReply(tool_calls=[("search_information", {"query": "capital of france"})]),
+        )
+        module = import_with_fakes("Tool_execution_in_langchain", responder)
+        return Pipeline(
+            "tool_agent", responder,
+            lambda: module.agent_executor.ainvoke({"input": "What is the capital of France?"}),
+        )
+
+    def prompt_chain() -> Pipeline:
+        responder = make_responder(default='{"CPU": "3.5 GHz octa-core", "RAM": "16GB", "Storage": "1TB SSD"}')
+        module = import_with_fakes("prompt_chaining_in_langgraph", responder)
+        return Pipeline(
+            "prompt_chain", responder,
+            lambda: module.full_chain.ainvoke(
+                "The new laptop has a 3.5 GHz octa-core processor, 16GB of RAM, and a 1TB NVMe SSD."
+            ),
+        )
+
+    def loop_agent_status() -> Pipeline:
+        # The LlmAgent cannot set state itself, so this loop always runs to max_iterations.
+        responder = make_responder(default="Step done.")
+        module = import_with_fakes("Multi_agent_adk", responder)
+        return Pipeline("loop_agent_status", responder, lambda: run_adk_agent(module.pollar))
+
+    def loop_agent_output_key() -> Pipeline:
+        responder = make_responder(default='{"status": "completed"}')
+        module = import_with_fakes("mutli_agent_with_adk_loop_agent", responder)
+        return Pipeline("loop_agent_output_key", responder, lambda: run_adk_agent(module.poller))
+
+    def loop_agent_output_schema() -> Pipeline:
+        def status_for_iteration(call: FakeCall) -> str:
+            match = re.search(r"Current iteration: (\d+)", call.prompt)
+            done = match is not None and int(match.group(1)) >= 3
+            return json.dumps({"status": "completed" if done else "pending"})
+
+        responder = make_responder(default=status_for_iteration)
+        module = import_with_fakes("multi_agent_with_state_with_output_schema", responder)
+        return Pipeline("loop_agent_output_schema", responder, lambda: run_adk_agent(module.poller))
+
+    return {
+        "parallel": parallel,
+        "reflection": reflection,
+        "tool_agent": tool_agent,
+        "prompt_chain": prompt_chain,
+        "loop_agent_status": loop_agent_status,
+        "loop_agent_output_key": loop_agent_output_key,
+        "loop_agent_output_schema": loop_agent_output_schema,
+    }
+
+
+# -------------------------
+# Running and reporting
+# -------------------------
+async def measure(pipeline: Pipeline, runs: int, concurrency: int) -> Result:
+    result = Result(name=pipeline.name, runs=runs, errors=0)
+    semaphore = asyncio.Semaphore(concurrency)
+    pipeline.responder.reset()
+
+    async def one() -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await pipeline.run_once()
+            except Exception:
+                result.errors += 1
+            result.latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        await asyncio.gather(*(one() for _ in range(runs)))
+    result.wall_seconds = time.perf_counter() - start
+    result.llm_calls = pipeline.responder.calls
+    return result
+
+
+# Settings recorded with the baselines. The deterministic metrics are only
+# comparable between runs with the same BASELINE_SETTINGS; timing metrics also
+# need the same TIMING_SETTINGS.
+BASELINE_SETTINGS = ("runs", "concurrency", "error_rate", "seed")
+TIMING_SETTINGS = ("distribution", "latency_ms", "spread_ms", "tokens_per_second")
+
+
+def settings_mismatch(
+    recorded: Dict[str, Any], current: Dict[str, Any], timing: bool
+) -> Tuple[bool, bool, Optional[str]]:
+    """
+    Decide what can be compared against baselines recorded with `recorded`
+    settings. Returns (compare at all, compare timing, warning to print).
+    """
+
+    def mismatched(keys: tuple) -> Dict[str, Any]:
+        return {key: recorded.get(key) for key in keys if recorded.get(key) != current[key]}
+
+    if mismatched(BASELINE_SETTINGS):
+        return False, False, f"⚠️  Baselines were recorded with {mismatched(BASELINE_SETTINGS)}; skipping comparison."
+    if timing and mismatched(TIMING_SETTINGS):
+        return True, False, (
+            f"⚠️  Baseline timings were recorded with {mismatched(TIMING_SETTINGS)}; comparing calls and errors only."
+        )
+    return True, timing, None
+
+
+def compare(
+    summary: Dict[str, float],
+    baseline: Optional[Dict[str, float]],
+    tolerance: float,
+    timing: bool = False,
+) -> List[str]:
+    """
+    Return human-readable regressions against a stored baseline. LLM calls per
+    run and error rate must not increase; latency and throughput are only
+    checked (within `tolerance`) when `timing` is set.
+    """
+    if not baseline:
+        return []
+    regressions = []
+    for key in ("llm_calls_per_run", "error_rate"):
+        old, new = baseline.get(key), summary[key]
+        if old is not None and new > old + 1e-9:
+            regressions.append(f"{key} {old} -> {new}")
+    if not timing:
+        return regressions
+    for key in ("p50_ms", "p95_ms", "p99_ms"):
+        old, new = baseline.get(key), summary[key]
+        if old is not None and new > old * (1 + tolerance) + 1e-9:
+            regressions.append(f"{key} {old} -> {new}")
+    old_rps = baseline.get("throughput_rps")
+    if old_rps and summary["throughput_rps"] < old_rps * (1 - tolerance):
+        regressions.append(f"throughput_rps {old_rps} -> {summary['throughput_rps']}")
+    return regressions
+
+
+def print_report(summaries: Dict[str, Dict[str, float]], regressions: Dict[str, List[str]]) -> None:
+    header = f"{'pipeline':<26}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'calls/run':>11}{'runs/s':>9}{'errors':>8}  vs baseline"
+    print(header)
+    print("-" * len(header))
+    for name, s in summaries.items():
+        if name not in regressions:
+            status = "no baseline"
+        else:
+            status = "; ".join(regressions[name]) or "ok"
+        print(
+            f"{name:<26}{s['p50_ms']:>9.1f}{s['p95_ms']:>9.1f}{s['p99_ms']:>9.1f}"
+            f"{s['llm_calls_per_run']:>11.2f}{s['throughput_rps']:>9.2f}{s['error_rate']:>8.1%}  {status}"
+        )
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description="Offline fake-LLM benchmark for the agent pipelines.")
+    parser.add_argument("--pipelines", nargs="*", help="Subset of pipelines to run (default: all)")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--distribution", default="lognormal", choices=["constant", "uniform", "normal", "lognormal"])
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Median time to first token")
+    parser.add_argument("--spread-ms", type=float, default=15.0)
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative timing regression")
+    parser.add_argument("--compare-timing", action="store_true", help="Also compare latency percentiles and throughput")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    args = parser.parse_args()
+
+    def make_responder(**kwargs: Any) -> FakeResponder:
+        return FakeResponder(
+            latency=Latency(args.distribution, args.latency_ms, args.spread_ms),
+            tokens_per_second=args.tokens_per_second,
+            error_rate=args.error_rate,
+            seed=args.seed,
+            **kwargs,
+        )
+
+    factories = build_pipelines(make_responder)
+    names = args.pipelines or list(factories)
+    unknown = [n for n in names if n not in factories]
+    if unknown:
+        parser.error(f"unknown pipelines: {', '.join(unknown)} (choose from {', '.join(factories)})")
+
+    settings = {key: getattr(args, key) for key in BASELINE_SETTINGS + TIMING_SETTINGS}
+    stored: Dict[str, Any] = {"settings": settings, "pipelines": {}}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            stored = json.load(f)
+    baselines: Dict[str, Dict[str, float]] = stored["pipelines"]
+
+    if not args.save_baseline and baselines:
+        comparable, args.compare_timing, warning = settings_mismatch(
+            stored["settings"], settings, args.compare_timing
+        )
+        if warning:
+            print(warning + "\n")
+        if not comparable:
+            baselines = {}
+
+    summaries, regressions = {}, {}
+    for name in names:
+        try:
+            pipeline = factories[name]()
+        except Exception as e:
+            # A script that cannot even be built counts as failing every run.
+            print(f"⚠️  {name}: setup failed: {type(e).__name__}: {str(e).splitlines()[0]}")
+            result = Result(name=name, runs=args.runs, errors=args.runs)
+        else:
+            result = await measure(pipeline, args.runs, args.concurrency)
+        summaries[name] = result.summary()
+        if name in baselines:
+            regressions[name] = compare(summaries[name], baselines[name], args.tolerance, args.compare_timing)
+
+    print_report(summaries, regressions)
+
+    if args.save_baseline:
+        if stored["settings"] != settings:
+            stored = {"settings": settings, "pipelines": {}}
+        stored["pipelines"].update(summaries)
+        with open(args.baseline, "w") as f:
+            json.dump(stored, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"\n💾 Baselines saved to {args.baseline}")
+        return 0
+    if not stored["pipelines"]:
+        print("\nNo stored baselines yet; run with --save-baseline to record them.")
+    return 1 if any(regressions.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
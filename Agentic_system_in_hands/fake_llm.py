@@ -0,0 +1,374 @@
+"""
+Deterministic fake chat models for running the pipelines offline.
+
+One `FakeResponder` holds the behaviour (scripted or rule-based replies,
+latency distribution, tokens/sec streaming, error injection) and can back:
+
+- `FakeChatModel`: a LangChain `BaseChatModel` (invoke/ainvoke/stream/bind_tools)
+- `FakeAdkLlm`:    an ADK `BaseLlm`, usable as `LlmAgent(model=FakeAdkLlm(...))`
+
+Example:
+    responder = FakeResponder(
+        rules=[(r"senior software engineer", "CODE_IS_PERFECT")],
+        default="def calculate_factorial(n): ...",
+        latency=Latency("lognormal", mean_ms=300, spread_ms=80),
+        tokens_per_second=150,
+    )
+    llm = FakeChatModel(responder=responder)
+"""
+
+import asyncio
+import json
+import math
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from pydantic import ConfigDict
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from google.adk.models import BaseLlm, LlmRequest, LlmResponse
+from google.genai import types
+
+
+class FakeLLMError(RuntimeError):
+    """Raised by the fake models when an error is injected."""
+
+
+# -------------------------
+# Replies and latency
+# -------------------------
+@dataclass
+class FakeReply:
+    """A framework-neutral reply: text and/or tool calls as (name, args) pairs."""
+    text: str = ""
+    tool_calls: List[Tuple[str, Dict[str, Any]]] = field(default_factory=list)
+
+
+@dataclass
+class FakeCall:
+    """What a rule sees: the call index, the flattened prompt and the raw input."""
+    index: int
+    prompt: str
+    raw: Any
+
+
+Reply = Union[str, FakeReply]
+Rule = Tuple[Union[str, Callable[[FakeCall], bool]], Union[Reply, Callable[[FakeCall], Reply]]]
+
+
+@dataclass
+class Latency:
+    """Time to first token. distribution: constant | uniform | normal | lognormal."""
+    distribution: str = "constant"
+    mean_ms: float = 0.0
+    spread_ms: float = 0.0
+
+    def sample(self, rng: random.Random) -> float:
+        """Return a latency sample in seconds."""
+        if self.mean_ms <= 0:
+            return 0.0
+        if self.distribution == "constant":
+            ms = self.mean_ms
+        elif self.distribution == "uniform":
+            ms = rng.uniform(self.mean_ms - self.spread_ms, self.mean_ms + self.spread_ms)
+        elif self.distribution == "normal":
+            ms = rng.gauss(self.mean_ms, self.spread_ms)
+        elif self.distribution == "lognormal":
+            # Parameterised so the median is mean_ms and spread_ms sets the tail.
+            sigma = self.spread_ms / self.mean_ms
+            ms = rng.lognormvariate(math.log(self.mean_ms), sigma)
+        else:
+            raise ValueError(f"Unknown latency distribution: {self.distribution}")
+        return max(0.0, ms) / 1000.0
+
+
+def split_tokens(text: str) -> List[str]:
+    """Rough tokenisation used for streaming and usage counts."""
+    return re.findall(r"\S+\s*|\s+", text)
+
+
+# -------------------------
+# Shared responder
+# -------------------------
+class FakeResponder:
+    """
+    Picks replies and timing for each call. Rules are checked first (a regex
+    searched in the prompt, or a predicate), then the scripted responses in
+    order, then `default`. Seeded, so runs are reproducible.
+    """
+
+    def __init__(
+        self,
+        responses: Sequence[Reply] = (),
+        rules: Sequence[Rule] = (),
+        default: Reply = "OK",
+        latency: Optional[Latency] = None,
+        tokens_per_second: Optional[float] = None,
+        error_rate: float = 0.0,
+        seed: int = 0,
+        cycle: bool = True,
+    ):
+        self.responses = list(responses)
+        self.rules = list(rules)
+        self.default = default
+        self.latency = latency or Latency()
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.seed = seed
+        self.cycle = cycle
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Reset counters, script position and the random generator."""
+        with self._lock:
+            self._rng = random.Random(self.seed)
+            self._script_index = 0
+            self.calls = 0
+            self.errors = 0
+            self.prompt_tokens = 0
+            self.completion_tokens = 0
+
+    def plan(self, prompt: str, raw: Any) -> Tuple[FakeReply, float, float, bool]:
+        """Return (reply, first-token delay, per-token delay, inject_error)."""
+        with self._lock:
+            index = self.calls
+            self.calls += 1
+            delay = self.latency.sample(self._rng)
+            fail = self.error_rate > 0 and self._rng.random() < self.error_rate
+            if fail:
+                self.errors += 1
+        reply = self._select(FakeCall(index=index, prompt=prompt, raw=raw))
+        per_token = 1.0 / self.tokens_per_second if self.tokens_per_second else 0.0
+        with self._lock:
+            self.prompt_tokens += len(split_tokens(prompt))
+            self.completion_tokens += len(split_tokens(reply.text)) + len(reply.tool_calls)
+        return reply, delay, per_token, fail
+
+    def _select(self, call: FakeCall) -> FakeReply:
+        for matcher, response in self.rules:
+            matched = re.search(matcher, call.prompt) if isinstance(matcher, str) else matcher(call)
+            if matched:
+                return self._resolve(response, call)
+        with self._lock:
+            if self.responses and (self.cycle or self._script_index < len(self.responses)):
+                response = self.responses[self._script_index % len(self.responses)]
+                self._script_index += 1
+                return self._resolve(response, call)
+        return self._resolve(self.default, call)
+
+    @staticmethod
+    def _resolve(response: Any, call: FakeCall) -> FakeReply:
+        if callable(response):
+            response = response(call)
+        return response if isinstance(response, FakeReply) else FakeReply(text=str(response))
+
+
+def _generation_time(reply: FakeReply, per_token: float) -> float:
+    return per_token * len(split_tokens(reply.text))
+
+
+def _raise_injected(model: str) -> None:
+    raise FakeLLMError(f"Injected fake LLM error ({model})")
+
+
+# -------------------------
+# LangChain adapter
+# -------------------------
+def _messages_to_prompt(messages: List[BaseMessage]) -> str:
+    return "\n".join(f"{m.type}: {m.content}" for m in messages)
+
+
+def _usage(prompt: str, reply: FakeReply) -> Dict[str, int]:
+    input_tokens = len(split_tokens(prompt))
+    output_tokens = len(split_tokens(reply.text)) + len(reply.tool_calls)
+    return {
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "total_tokens": input_tokens + output_tokens,
+    }
+
+
+class FakeChatModel(BaseChatModel):
+    """LangChain chat model driven by a `FakeResponder`."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    responder: FakeResponder
+    model: str = "fake-chat"
+    temperature: float = 0.0
+
+    @property
+    def model_name(self) -> str:
+        return self.model
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any):
+        return self.bind(tools=[convert_to_openai_tool(t) for t in tools], **kwargs)
+
+    def _to_message(self, prompt: str, reply: FakeReply) -> AIMessage:
+        return AIMessage(
+            content=reply.text,
+            tool_calls=[
+                {"name": name, "args": args, "id": f"call_{i}", "type": "tool_call"}
+                for i, (name, args) in enumerate(reply.tool_calls)
+            ],
+            usage_metadata=_usage(prompt, reply),
+            response_metadata={"model_name": self.model},
+        )
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        prompt = _messages_to_prompt(messages)
+        reply, delay, per_token, fail = self.responder.plan(prompt, messages)
+        time.sleep(delay + _generation_time(reply, per_token))
+        if fail:
+            _raise_injected(self.model)
+        return ChatResult(generations=[ChatGeneration(message=self._to_message(prompt, reply))])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        prompt = _messages_to_prompt(messages)
+        reply, delay, per_token, fail = self.responder.plan(prompt, messages)
+        await asyncio.sleep(delay + _generation_time(reply, per_token))
+        if fail:
+            _raise_injected(self.model)
+        return ChatResult(generations=[ChatGeneration(message=self._to_message(prompt, reply))])
+
+    def _chunks(self, prompt: str, reply: FakeReply) -> Iterator[Tuple[ChatGenerationChunk, str]]:
+        if reply.tool_calls:
+            chunk = AIMessageChunk(
+                content="",
+                tool_call_chunks=[
+                    {"name": name, "args": json.dumps(args), "id": f"call_{i}", "index": i}
+                    for i, (name, args) in enumerate(reply.tool_calls)
+                ],
+            )
+            yield ChatGenerationChunk(message=chunk), ""
+        for token in split_tokens(reply.text):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token)), token
+        yield ChatGenerationChunk(
+            message=AIMessageChunk(content="", usage_metadata=_usage(prompt, reply))
+        ), ""
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        prompt = _messages_to_prompt(messages)
+        reply, delay, per_token, fail = self.responder.plan(prompt, messages)
+        time.sleep(delay)
+        if fail:
+            _raise_injected(self.model)
+        for chunk, token in self._chunks(prompt, reply):
+            if token:
+                time.sleep(per_token)
+                if run_manager:
+                    run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        prompt = _messages_to_prompt(messages)
+        reply, delay, per_token, fail = self.responder.plan(prompt, messages)
+        await asyncio.sleep(delay)
+        if fail:
+            _raise_injected(self.model)
+        for chunk, token in self._chunks(prompt, reply):
+            if token:
+                await asyncio.sleep(per_token)
+                if run_manager:
+                    await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+
+# -------------------------
+# ADK adapter
+# -------------------------
+def _request_to_prompt(llm_request: LlmRequest) -> str:
+    lines = []
+    system = llm_request.config.system_instruction if llm_request.config else None
+    if system:
+        lines.append(f"system: {system}")
+    for content in llm_request.contents or []:
+        for part in content.parts or []:
+            if part.text:
+                lines.append(f"{content.role}: {part.text}")
+            elif part.function_response:
+                lines.append(f"tool: {json.dumps(part.function_response.response, default=str)}")
+    return "\n".join(lines)
+
+
+class FakeAdkLlm(BaseLlm):
+    """ADK model driven by a `FakeResponder`. Pass an instance as `LlmAgent(model=...)`."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    model: str = "fake-llm"
+    responder: FakeResponder
+
+    @classmethod
+    def supported_models(cls) -> list[str]:
+        return [r"fake-.*"]
+
+    def _response(self, prompt: str, reply: FakeReply, text: str, partial: bool) -> LlmResponse:
+        parts = [types.Part(text=text)] if text else []
+        if not partial:
+            parts += [
+                types.Part(function_call=types.FunctionCall(name=name, args=args))
+                for name, args in reply.tool_calls
+            ]
+        usage = _usage(prompt, reply)
+        return LlmResponse(
+            content=types.Content(role="model", parts=parts),
+            partial=partial,
+            usage_metadata=types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=usage["input_tokens"],
+                candidates_token_count=usage["output_tokens"],
+                total_token_count=usage["total_tokens"],
+            ),
+        )
+
+    async def generate_content_async(self, llm_request: LlmRequest, stream: bool = False):
+        prompt = _request_to_prompt(llm_request)
+        reply, delay, per_token, fail = self.responder.plan(prompt, llm_request)
+        await asyncio.sleep(delay)
+        if fail:
+            _raise_injected(self.model)
+        if stream:
+            for token in split_tokens(reply.text):
+                await asyncio.sleep(per_token)
+                yield self._response(prompt, reply, token, partial=True)
+        else:
+            await asyncio.sleep(_generation_time(reply, per_token))
+        yield self._response(prompt, reply, reply.text, partial=False)
@@ -1,14 +1,20 @@
 import asyncio
+import os
+import sys
 from google.adk.agents import LlmAgent
 from google.adk.sessions import InMemorySessionService
 from google.adk.runners import Runner
 from google.genai.types import Content, Part
 
+# The shared model registry lives in the parent directory.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from model_registry import get_adk_model
+
 async def main():
     # Define an LlmAgent with an output_key.
     greeting_agent = LlmAgent(
         name="Greeter",
-        model="gemini-2.0-flash",
+        model=get_adk_model("gemini-2.0-flash"),
         instruction="Generate a short, friendly greeting.",
         output_key="last_greeting"
     )
@@ -1,4 +1,5 @@
 import os
+import sys
 import asyncio
 import json
 from google.adk.agents import LlmAgent
@@ -12,6 +13,10 @@ import uuid
 import time
 from google.adk.events.event_actions import EventActions
 
+# The shared model registry lives in the parent directory.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from model_registry import get_adk_model
+
 async def persist_state_from_response_tool(current_state: dict, session_service: InMemorySessionService, app_name: str, user_id: str, session_id: str):
     session = await session_service.get_session(app_name=app_name, user_id=user_id, session_id=session_id)
     actions = EventActions(state_delta={**{State.USER_PREFIX + k: v for k, v in current_state.items()}})
@@ -57,7 +62,7 @@ def show_state(tool_context: ToolContext) -> dict:
 async def main():
     agent = LlmAgent(
         name="Greeter",
-        model="gemini-2.0-flash",
+        model=get_adk_model("gemini-2.0-flash"),
         instruction=(
             "When the user says hello, respond with a greeting. "
             "Also call the `log_user_login` tool to track logins, then call `show_state` "
@@ -0,0 +1,462 @@
+"""
+Process-wide registry of shared, pooled model clients.
+
+Every script used to build its own `ChatGoogleGenerativeAI(...)` and every ADK
+`LlmAgent` named its model as a string, so hosting several agents in one
+service meant one client, connection pool and set of TLS handshakes per agent.
+Instead, ask the registry:
+
+    from model_registry import get_chat_model, get_adk_model
+
+    llm = get_chat_model("gemini-2.0-flash", temperature=0.7)      # LangChain
+    agent = LlmAgent(name="Step", model=get_adk_model("gemini-2.0-flash"), ...)
+
+Clients are shared per (model, parameters), keep connections alive in a
+bounded pool, and calls to the same model share one concurrency limit across
+LangChain and ADK. Configuration comes from the environment:
+
+    MODEL_POOL_MAX_CONNECTIONS   (default 20)
+    MODEL_POOL_MAX_KEEPALIVE     (default 10)
+    MODEL_POOL_KEEPALIVE_EXPIRY  seconds (default 30)
+    MODEL_MAX_CONCURRENCY        per model (default 8)
+    GEMINI_BASE_URL              e.g. a local stub server (see stub_model_server.py)
+
+How the pool settings apply depends on the transport:
+
+- ADK models use httpx; all three pool settings apply.
+- LangChain models on the "rest" transport (used when GEMINI_BASE_URL is set)
+  use a requests session. It keeps up to MODEL_POOL_MAX_KEEPALIVE idle
+  connections. requests has no separate connection cap or keep-alive expiry,
+  so MODEL_MAX_CONCURRENCY bounds the open connections instead.
+- LangChain models on the default gRPC transport, and all async LangChain
+  calls, multiplex over a single HTTP/2 channel per client. The pool settings
+  do not apply there; only the concurrency limit does.
+"""
+
+import asyncio
+import atexit
+import json
+import os
+import threading
+import time
+import weakref
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from importlib import metadata
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Iterator, Optional, Tuple
+
+from pydantic import PrivateAttr
+
+from langchain_google_genai import ChatGoogleGenerativeAI
+from google.adk.models import LlmRequest
+from google.adk.models.google_llm import Gemini
+from google.genai import Client, types
+
+
+class RegistryClosedError(RuntimeError):
+    """Raised when a model is requested or called after shutdown."""
+
+
+class _Limiter:
+    """
+    Per-model concurrency limit usable from threads and event loops alike.
+
+    A released permit is handed straight to the longest waiter, which is woken
+    on its own thread or event loop, so async callers wait without polling.
+    """
+
+    def __init__(self, registry: "ModelRegistry", limit: int):
+        self._registry = registry
+        self._lock = threading.Lock()
+        self._available = limit
+        # threading.Event for sync waiters, (loop, future) for async ones.
+        self._waiters: Deque[Any] = deque()
+        self.limit = limit
+
+    @contextmanager
+    def hold(self) -> Iterator[None]:
+        with self._registry._in_flight():
+            with self._lock:
+                if self._available:
+                    self._available -= 1
+                    granted = None
+                else:
+                    granted = threading.Event()
+                    self._waiters.append(granted)
+            if granted is not None:
+                granted.wait()
+            try:
+                yield
+            finally:
+                self._release()
+
+    @asynccontextmanager
+    async def ahold(self) -> AsyncIterator[None]:
+        with self._registry._in_flight():
+            with self._lock:
+                if self._available:
+                    self._available -= 1
+                    waiter = None
+                else:
+                    loop = asyncio.get_running_loop()
+                    waiter = (loop, loop.create_future())
+                    self._waiters.append(waiter)
+            if waiter is not None:
+                try:
+                    await waiter[1]
+                except asyncio.CancelledError:
+                    with self._lock:
+                        if waiter in self._waiters:
+                            self._waiters.remove(waiter)
+                            raise
+                    # The permit was handed over as we were cancelled: pass it on.
+                    self._release()
+                    raise
+            try:
+                yield
+            finally:
+                self._release()
+
+    def _release(self) -> None:
+        with self._lock:
+            if not self._waiters:
+                self._available += 1
+                return
+            waiter = self._waiters.popleft()
+        if isinstance(waiter, threading.Event):
+            waiter.set()
+        else:
+            loop, future = waiter
+            loop.call_soon_threadsafe(_grant, future)
+
+
+def _grant(future: "asyncio.Future[None]") -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+# -------------------------
+# Pooled LangChain client
+# -------------------------
+class PooledChatGoogleGenerativeAI(ChatGoogleGenerativeAI):
+    """ChatGoogleGenerativeAI whose calls go through the registry's model limiter."""
+
+    _limiter: Any = PrivateAttr(default=None)
+
+    def _generate(self, *args: Any, **kwargs: Any):
+        with self._limiter.hold():
+            return super()._generate(*args, **kwargs)
+
+    async def _agenerate(self, *args: Any, **kwargs: Any):
+        async with self._limiter.ahold():
+            return await super()._agenerate(*args, **kwargs)
+
+    def _stream(self, *args: Any, **kwargs: Any):
+        with self._limiter.hold():
+            yield from super()._stream(*args, **kwargs)
+
+    async def _astream(self, *args: Any, **kwargs: Any):
+        async with self._limiter.ahold():
+            async for chunk in super()._astream(*args, **kwargs):
+                yield chunk
+
+
+# -------------------------
+# Pooled ADK model
+# -------------------------
+# PooledGemini reuses private parts of google-adk's Gemini (pinned in
+# requirements.txt): the per-event-loop `api_client` property and the helpers
+# it builds HttpOptions from. Check they exist so an ADK upgrade fails here,
+# with a clear message, instead of deep inside the first model call.
+def _check_adk_internals() -> Any:
+    descriptor = Gemini.__dict__.get("api_client")
+    missing = []
+    if not callable(getattr(descriptor, "func", None)):
+        missing.append("Gemini.api_client.func")
+    for name in ("_base_url_and_api_version", "_tracking_headers", "_configured_api_version"):
+        if not hasattr(Gemini, name):
+            missing.append(f"Gemini.{name}")
+    if missing:
+        raise ImportError(
+            f"model_registry needs google-adk internals that google-adk "
+            f"{metadata.version('google-adk')} does not have: {', '.join(missing)}. "
+            "Install the google-adk version pinned in requirements.txt."
+        )
+    return descriptor
+
+
+_gemini_api_client = _check_adk_internals()
+# The descriptor class behind Gemini.api_client (PerLoopCachedProperty): a
+# cached_property that keeps one value per running event loop.
+_PerLoopCachedProperty = type(_gemini_api_client)
+
+
+def _pooled_api_client(self: "PooledGemini") -> Client:
+    """Build the client exactly as Gemini does, remembering it for shutdown."""
+    client = _gemini_api_client.func(self)
+    self._opened.add(client)
+    return client
+
+
+class PooledGemini(Gemini):
+    """ADK Gemini model with a keep-alive connection pool and a concurrency limit."""
+
+    _limiter: Any = PrivateAttr(default=None)
+    _opened: Any = PrivateAttr(default_factory=weakref.WeakSet)
+
+    def use_pool(self, limits: Any) -> None:
+        """
+        Add httpx pool limits to the client options. Gemini.api_client applies
+        `client_kwargs` over the HttpOptions it builds, so ADK's tracking
+        headers, retry options, base URL and API version are copied in here
+        rather than dropped.
+        """
+        base_url, api_version = self._base_url_and_api_version
+        options = types.HttpOptions(
+            headers=self._tracking_headers(),
+            retry_options=self.retry_options,
+            base_url=base_url,
+            api_version=api_version or self._configured_api_version(),
+        ).model_dump(exclude_none=True)
+
+        client_kwargs = dict(self.client_kwargs or {})
+        given = client_kwargs.get("http_options") or {}
+        if isinstance(given, types.HttpOptions):
+            given = given.model_dump(exclude_none=True)
+        options.update(given)
+        options["headers"] = {**self._tracking_headers(), **given.get("headers", {})}
+        options["client_args"] = {"limits": limits, **given.get("client_args", {})}
+        options["async_client_args"] = {"limits": limits, **given.get("async_client_args", {})}
+        client_kwargs["http_options"] = types.HttpOptions(**options)
+        self.client_kwargs = client_kwargs
+
+    # Replaces Gemini.api_client with the same per-event-loop caching around
+    # a builder that also records each client, so shutdown can close them.
+    api_client = _PerLoopCachedProperty(_pooled_api_client)
+
+    async def generate_content_async(self, llm_request: LlmRequest, stream: bool = False):
+        async with self._limiter.ahold():
+            async for response in super().generate_content_async(llm_request, stream):
+                yield response
+
+
+# -------------------------
+# Registry
+# -------------------------
+class ModelRegistry:
+    """Hands out shared model clients keyed by model name and parameters."""
+
+    def __init__(
+        self,
+        max_connections: int = 20,
+        max_keepalive: int = 10,
+        keepalive_expiry: float = 30.0,
+        default_concurrency: int = 8,
+        base_url: Optional[str] = None,
+    ):
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self.keepalive_expiry = keepalive_expiry
+        self.default_concurrency = default_concurrency
+        self.base_url = base_url
+        self._lock = threading.Lock()
+        self._clients: Dict[Tuple[str, str, str], Any] = {}
+        self._limiters: Dict[str, _Limiter] = {}
+        self._concurrency: Dict[str, int] = {}
+        self._factories: Dict[str, Callable[..., Any]] = {}
+        self._closed = False
+        self._active = 0
+        self._idle = threading.Condition(self._lock)
+
+    @classmethod
+    def from_env(cls) -> "ModelRegistry":
+        return cls(
+            max_connections=int(os.getenv("MODEL_POOL_MAX_CONNECTIONS", "20")),
+            max_keepalive=int(os.getenv("MODEL_POOL_MAX_KEEPALIVE", "10")),
+            keepalive_expiry=float(os.getenv("MODEL_POOL_KEEPALIVE_EXPIRY", "30")),
+            default_concurrency=int(os.getenv("MODEL_MAX_CONCURRENCY", "8")),
+            base_url=os.getenv("GEMINI_BASE_URL"),
+        )
+
+    # --- configuration ---
+    def set_concurrency(self, model: str, limit: int) -> None:
+        """Set the concurrent-call limit for a model. Call before creating its clients."""
+        with self._lock:
+            self._concurrency[model] = limit
+            self._limiters.pop(model, None)
+
+    @contextmanager
+    def override(self, chat: Optional[Callable[..., Any]] = None, adk: Optional[Callable[..., Any]] = None):
+        """
+        Temporarily build models with custom factories instead of Gemini, e.g.
+        fake models for offline runs. Overridden models are not cached.
+        """
+        previous = dict(self._factories)
+        if chat:
+            self._factories["chat"] = chat
+        if adk:
+            self._factories["adk"] = adk
+        try:
+            yield self
+        finally:
+            self._factories = previous
+
+    # --- lookup ---
+    def chat_model(self, model: str, **params: Any) -> ChatGoogleGenerativeAI:
+        """Shared LangChain chat model for `model` with the given parameters."""
+        if "chat" in self._factories:
+            return self._factories["chat"](model=model, **params)
+        return self._get("chat", model, params, self._build_chat_model)
+
+    def adk_model(self, model: str, **params: Any) -> Gemini:
+        """Shared ADK model instance for `model`, to pass as `LlmAgent(model=...)`."""
+        if "adk" in self._factories:
+            return self._factories["adk"](model=model, **params)
+        return self._get("adk", model, params, self._build_adk_model)
+
+    def _get(self, kind: str, model: str, params: Dict[str, Any], build: Callable[..., Any]) -> Any:
+        key = (kind, model, json.dumps(params, sort_keys=True, default=repr))
+        with self._lock:
+            if self._closed:
+                raise RegistryClosedError("Model registry has been shut down")
+            client = self._clients.get(key)
+            if client is None:
+                client = build(model, self._limiter(model), **params)
+                self._clients[key] = client
+            return client
+
+    def _limiter(self, model: str) -> _Limiter:
+        # Caller holds self._lock.
+        limiter = self._limiters.get(model)
+        if limiter is None:
+            limit = self._concurrency.get(model, self.default_concurrency)
+            limiter = self._limiters[model] = _Limiter(self, limit)
+        return limiter
+
+    def _build_chat_model(self, model: str, limiter: _Limiter, **params: Any) -> PooledChatGoogleGenerativeAI:
+        if self.base_url:
+            params.setdefault("transport", "rest")
+            params.setdefault("client_options", {"api_endpoint": self.base_url})
+        llm = PooledChatGoogleGenerativeAI(model=model, **params)
+        llm._limiter = limiter
+        # Only the REST transport has a requests session to size (see module docstring).
+        session = getattr(getattr(llm.client, "_transport", None), "_session", None)
+        if session is not None:
+            from requests.adapters import HTTPAdapter
+
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_keepalive)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+        return llm
+
+    def _build_adk_model(self, model: str, limiter: _Limiter, **params: Any) -> PooledGemini:
+        import httpx
+
+        if self.base_url:
+            params.setdefault("base_url", self.base_url)
+        llm = PooledGemini(model=model, **params)
+        llm._limiter = limiter
+        llm.use_pool(httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive,
+            keepalive_expiry=self.keepalive_expiry,
+        ))
+        return llm
+
+    # --- in-flight tracking and shutdown ---
+    @contextmanager
+    def _in_flight(self) -> Iterator[None]:
+        with self._lock:
+            if self._closed:
+                raise RegistryClosedError("Model registry has been shut down")
+            self._active += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._active -= 1
+                if self._active == 0:
+                    self._idle.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "clients": len(self._clients),
+                "in_flight": self._active,
+                "concurrency": {model: lim.limit for model, lim in self._limiters.items()},
+            }
+
+    def shutdown(self, timeout: float = 30.0) -> None:
+        """Stop handing out clients, wait for in-flight calls, then close connections."""
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            self._closed = True
+            while self._active and time.monotonic() < deadline:
+                self._idle.wait(deadline - time.monotonic())
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            _close_sync(client)
+
+    async def ashutdown(self, timeout: float = 30.0) -> None:
+        """Async variant of `shutdown` that also closes async HTTP clients."""
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            self._closed = True
+        while self._active and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            if isinstance(client, PooledGemini):
+                for api_client in list(client._opened):
+                    aclose = getattr(api_client.aio, "aclose", None)
+                    try:
+                        if aclose:
+                            await aclose()
+                    except Exception as e:
+                        # e.g. a client opened on an event loop that has since closed
+                        print(f"Warning: error closing async model client: {e}")
+            _close_sync(client)
+
+
+def _close_sync(client: Any) -> None:
+    """Best-effort close of whatever transport a client has opened."""
+    try:
+        if isinstance(client, PooledGemini):
+            for api_client in list(client._opened):
+                close = getattr(api_client, "close", None)
+                if close:
+                    close()
+        else:
+            transport = getattr(getattr(client, "client", None), "transport", None)
+            if transport is not None and hasattr(transport, "close"):
+                transport.close()
+    except Exception as e:
+        print(f"Warning: error closing model client: {e}")
+
+
+# -------------------------
+# Process-wide instance
+# -------------------------
+registry = ModelRegistry.from_env()
+
+
+def get_chat_model(model: str, **params: Any) -> ChatGoogleGenerativeAI:
+    return registry.chat_model(model, **params)
+
+
+def get_adk_model(model: str, **params: Any) -> Gemini:
+    return registry.adk_model(model, **params)
+
+
+def shutdown(timeout: float = 30.0) -> None:
+    registry.shutdown(timeout)
+
+
+async def ashutdown(timeout: float = 30.0) -> None:
+    await registry.ashutdown(timeout)
+
+
+atexit.register(lambda: registry.shutdown(timeout=5.0))
@@ -16,6 +16,9 @@ from google.adk.models import LlmResponse, LlmRequest
 from google.genai import types
 import json
 
+from model_registry import get_adk_model
+from usage_tracking import tracker
+
 load_dotenv()
 
 # -------------------------
@@ -102,9 +105,11 @@ def after_model_logger(callback_context: CallbackContext, llm_response: LlmRespo
 # -------------------------
 # Define Agents
 # -------------------------
+before_usage, after_usage = tracker.adk_callbacks(pipeline="status_poller_schema")
+
 process_step = LlmAgent(
     name="ProcessingStep",
-    model="gemini-2.0-flash-exp",
+    model=get_adk_model("gemini-2.0-flash-exp"),
     instruction=(
         "You are a step in a longer, multi-step process. "
         "Current iteration: {iterative}. "
@@ -114,8 +119,9 @@ process_step = LlmAgent(
     ),
     output_schema=StatusResult,     # <— Pydantic model for validated structured output
     output_key="status_update",     # <— ADK saves the validated result in session.state under this key
-    before_model_callback=before_model_logger,
-    after_model_callback=after_model_logger,
+    # The usage callback runs first so an exhausted budget skips the model call.
+    before_model_callback=[before_usage, before_model_logger],
+    after_model_callback=[after_model_logger, after_usage],
 )
 
 poller = LoopAgent(
@@ -167,6 +173,7 @@ async def main():
             break
     updated_session = await session_service.get_session(app_name="status_app", user_id="user123", session_id=SESSION_ID)
     print(f"Updated state: {updated_session.state}")
+    print("\n--- Usage ---\n" + tracker.report())
 
 if __name__ == "__main__":
     asyncio.run(main())
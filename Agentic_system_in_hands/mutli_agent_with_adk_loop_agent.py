@@ -12,6 +12,9 @@ from google.adk.sessions import InMemorySessionService
 from google.genai import types
 import re
 import json
+
+from model_registry import get_adk_model
+from usage_tracking import tracker
 # Load environment variables from .env file
 load_dotenv()
 
@@ -82,15 +85,19 @@ class ConditionChecker(BaseAgent):
 # -------------------------
 # Define Agents
 # -------------------------
+before_usage, after_usage = tracker.adk_callbacks(pipeline="status_poller_output_key")
+
 process_step = LlmAgent(
     name="ProcessingStep",
-    model="gemini-2.0-flash-exp",
+    model=get_adk_model("gemini-2.0-flash-exp"),
     instruction=(
         "You are a step in a longer process. "
         "Perform your task about multiple steps and only give a json format with a 'status' key in the following not any other text. "
         " output format: {\"status\": \"completed\"}"
     ),
     output_key="status_update",
+    before_model_callback=before_usage,
+    after_model_callback=after_usage,
 )
 
 poller = LoopAgent(
@@ -143,6 +150,8 @@ async def main():
             print("✅ Loop terminated: status completed.")
             break
 
+    print("\n--- Usage ---\n" + tracker.report())
+
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -1,12 +1,14 @@
 import os
+import uuid
 import asyncio
 from typing import Optional
 
 # from langchain_openai import ChatOpenAI
-from langchain_google_genai import ChatGoogleGenerativeAI
+from model_registry import get_chat_model
+from usage_tracking import tracker
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import Runnable, RunnableParallel, RunnablePassthrough
+from langchain_core.runnables import Runnable, RunnableLambda, RunnableParallel, RunnablePassthrough
 
 import logging
 import dotenv
@@ -22,8 +24,9 @@ print("Library imported")
 # --- Configuration ---
 # Ensure your API key environment variable is set (e.g., OPENAI_API_KEY)
 try:
-    llm = ChatGoogleGenerativeAI(
-          model="gemini-2.0-flash",   # or "gemini-1.5-flash" for cheaper/faster
+    # Shared, pooled client from the process-wide registry.
+    llm = get_chat_model(
+          "gemini-2.0-flash",   # or "gemini-1.5-flash" for cheaper/faster
           temperature=0.7,
       )
     if llm:
@@ -36,14 +39,11 @@ print("Openai model extracted")
 # --- Define Independent Chains ---
 # These three chains represent distinct tasks that can be executed in parallel.
 
-summarize_chain: Runnable = (
-    ChatPromptTemplate.from_messages([
-        ("system", "Summarize the following topic concisely:"),
-        ("user", "{topic}")
-    ])
-    | llm
-    | StrOutputParser()
-)
+summarize_prompt = ChatPromptTemplate.from_messages([
+    ("system", "Summarize the following topic concisely:"),
+    ("user", "{topic}")
+])
+summarize_chain: Runnable = summarize_prompt | llm | StrOutputParser()
 
 print("Summarize function setup done")
 
@@ -76,9 +76,10 @@ print("terms_chain function setup done")
 #    along with the original topic, will be fed into the next step.
 map_chain = RunnableParallel(
     {
-        "summary": summarize_chain,
-        "questions": questions_chain,
-        "key_terms": terms_chain,
+        # The "stage" metadata labels each call in the usage report.
+        "summary": summarize_chain.with_config(metadata={"stage": "summarize"}),
+        "questions": questions_chain.with_config(metadata={"stage": "questions"}),
+        "key_terms": terms_chain.with_config(metadata={"stage": "key_terms"}),
         "topic": RunnablePassthrough(),  # Pass the original topic through
     }
 )
@@ -97,31 +98,70 @@ synthesis_prompt = ChatPromptTemplate.from_messages([
 print("systhesis_prompt function setup done")
 # 3. Construct the full chain by piping the parallel results directly
 #    into the synthesis prompt, followed by the LLM and output parser.
-full_parallel_chain = map_chain | synthesis_prompt | llm | StrOutputParser()
+full_parallel_chain = map_chain | synthesis_prompt | llm.with_config(metadata={"stage": "synthesize"}) | StrOutputParser()
 
 print("full_parallel_chain function setup done")
+
+# --- Degraded Chain ---
+# Once a session's "degrade" budget is exceeded, only the summary branch runs
+# and both remaining calls go to the budget's cheaper fallback model.
+def build_degraded_chain(fallback_model: str) -> Runnable:
+    cheap_llm = get_chat_model(fallback_model, temperature=0.7)
+    skipped = RunnableLambda(lambda _: "(skipped to save budget)")
+    return (
+        RunnableParallel(
+            {
+                "summary": (summarize_prompt | cheap_llm | StrOutputParser()).with_config(
+                    metadata={"stage": "summarize"}
+                ),
+                "questions": skipped,
+                "key_terms": skipped,
+                "topic": RunnablePassthrough(),
+            }
+        )
+        | synthesis_prompt
+        | cheap_llm.with_config(metadata={"stage": "synthesize"})
+        | StrOutputParser()
+    )
+
 # --- Run the Chain ---
-async def run_parallel_example(topic: str) -> None:
+async def run_parallel_example(topic: str, session_id: Optional[str] = None) -> None:
     """
     Asynchronously invokes the parallel processing chain with a specific topic
     and prints the synthesized result.
 
     Args:
         topic: The input topic to be processed by the LangChain chains.
+        session_id: Usage session to account the calls to. A new session is
+            created (and ended afterwards) when omitted.
     """
     if not llm:
         print("LLM not initialized. Cannot run example.")
         return
 
     print(f"\n--- Running Parallel LangChain Example for Topic: '{topic}' ---")
+    owns_session = session_id is None
+    session_id = session_id or str(uuid.uuid4())
     try:
         # The input to `ainvoke` is the single 'topic' string, which is
         # then passed to each runnable in the `map_chain`.
-        response = await full_parallel_chain.ainvoke(topic)
+        usage = tracker.langchain_handler(pipeline="parallel", session_id=session_id)
+        chain = full_parallel_chain
+        budget = tracker.exceeded_budget(session_id, usage.user_id, "parallel")
+        if budget and budget.on_exceed == "degrade":
+            print(f"Usage budget reached; skipping optional branches and using {budget.fallback_model}.")
+            chain = build_degraded_chain(budget.fallback_model)
+        response = await chain.ainvoke(topic, config={"callbacks": [usage]})
         print("\n--- Final Response ---")
         print(response)
     except Exception as e:
         print(f"\nAn error occurred during chain execution: {e}")
+    finally:
+        # Per-session totals and budgets are no longer needed; sessions
+        # passed in by the caller are ended by the caller.
+        if owns_session:
+            tracker.end_session(session_id)
+    print("\n--- Usage ---\n" + tracker.report())
 
 if __name__ == "__main__":
     test_topic = "The history of space exploration"
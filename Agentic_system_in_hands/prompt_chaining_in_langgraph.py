@@ -1,12 +1,12 @@
 import os
-from langchain_google_genai import ChatGoogleGenerativeAI
+from model_registry import get_chat_model
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 
 from dotenv import load_dotenv
 load_dotenv()
 
-llm=ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0)
+llm=get_chat_model("gemini-2.0-flash", temperature=0)
 
 prompt_extract=ChatPromptTemplate.from_template(
     "Extract the technical specifications from the following text. text:\n{text}"
@@ -1,7 +1,9 @@
 import os
+import uuid
 from dotenv import load_dotenv
 # from langchain_openai import ChatOpenAI
-from langchain_google_genai import ChatGoogleGenerativeAI
+from model_registry import get_chat_model
+from usage_tracking import BudgetExceededError, tracker
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.messages import SystemMessage, HumanMessage
 
@@ -10,7 +12,7 @@ dotenv.load_dotenv()
 
 os.environ["GOOGLE_API_KEY"] = os.getenv("GOOGLE_API_KEY")
 
-llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0.7)
+llm = get_chat_model("gemini-2.0-flash", temperature=0.7)
 
 def run_reflection_loop():
     """
@@ -28,66 +30,89 @@ def run_reflection_loop():
     5.  Handle invalid input: Raise a ValueError if the input is a negative number.
     """
 
-    # --- The Reflection Loop ---
-    max_iterations = 3
-    current_code = ""
-    # We will build a conversation history to provide context in each step.
-    message_history = [HumanMessage(content=task_prompt)]
-
-
-    for i in range(max_iterations):
-        print("\n" + "="*25 + f" REFLECTION LOOP: ITERATION {i + 1} " + "="*25)
-
-        # --- 1. GENERATE / REFINE STAGE ---
-        # In the first iteration, it generates. In subsequent iterations, it refines.
-        if i == 0:
-            print("\n>>> STAGE 1: GENERATING initial code...")
-            # The first message is just the task prompt.
-            response = llm.invoke(message_history)
-            current_code = response.content
-        else:
-            print("\n>>> STAGE 1: REFINING code based on previous critique...")
-            # The message history now contains the task, the last code, and the last critique.
-            # We instruct the model to apply the critiques.
-            message_history.append(HumanMessage(content="Please refine the code using the critiques provided."))
-            response = llm.invoke(message_history)
-            current_code = response.content
-
-        print("\n--- Generated Code (v" + str(i + 1) + ") ---\n" + current_code)
-        message_history.append(response) # Add the generated code to history
-
-        # --- 2. REFLECT STAGE ---
-        print("\n>>> STAGE 2: REFLECTING on the generated code...")
-
-        # Create a specific prompt for the reflector agent.
-        # This asks the model to act as a senior code reviewer.
-        reflector_prompt = [
-            SystemMessage(content="""
-                You are a senior software engineer and an expert in Python.
-                Your role is to perform a meticulous code review.
-                Critically evaluate the provided Python code based on the original task requirements.
-                Look for bugs, style issues, missing edge cases, and areas for improvement.
-                If the code is perfect and meets all requirements, respond with the single phrase 'CODE_IS_PERFECT'.
-                Otherwise, provide a bulleted list of your critiques.
-            """),
-            HumanMessage(content=f"Original Task:\n{task_prompt}\n\nCode to Review:\n{current_code}")
-        ]
-
-        critique_response = llm.invoke(reflector_prompt)
-        critique = critique_response.content
-
-        # --- 3. STOPPING CONDITION ---
-        if "CODE_IS_PERFECT" in critique:
-            print("\n--- Critique ---\nNo further critiques found. The code is satisfactory.")
-            break
-
-        print("\n--- Critique ---\n" + critique)
-        # Add the critique to the history for the next refinement loop.
-        message_history.append(HumanMessage(content=f"Critique of the previous code:\n{critique}"))
-
-        print("\n" + "="*30 + " FINAL RESULT " + "="*30)
-        print("\nFinal refined code after the reflection process:\n")
-        print(current_code)
+    # --- Usage Accounting ---
+    # Token usage and latency are recorded per stage; budgets can stop the loop early.
+    session_id = str(uuid.uuid4())
+    usage = tracker.langchain_handler(pipeline="reflection", session_id=session_id)
+
+    def call_llm(messages, stage):
+        return llm.invoke(messages, config={"callbacks": [usage], "metadata": {"stage": stage}})
+
+    try:
+        # --- The Reflection Loop ---
+        max_iterations = 3
+        current_code = ""
+        # We will build a conversation history to provide context in each step.
+        message_history = [HumanMessage(content=task_prompt)]
+
+
+        for i in range(max_iterations):
+            if tracker.status(session_id, usage.user_id, "reflection") != "ok":
+                print("\n--- Usage budget reached; stopping refinement with the current code. ---")
+                break
+
+            print("\n" + "="*25 + f" REFLECTION LOOP: ITERATION {i + 1} " + "="*25)
+
+            try:
+                # --- 1. GENERATE / REFINE STAGE ---
+                # In the first iteration, it generates. In subsequent iterations, it refines.
+                if i == 0:
+                    print("\n>>> STAGE 1: GENERATING initial code...")
+                    # The first message is just the task prompt.
+                    response = call_llm(message_history, "generate")
+                    current_code = response.content
+                else:
+                    print("\n>>> STAGE 1: REFINING code based on previous critique...")
+                    # The message history now contains the task, the last code, and the last critique.
+                    # We instruct the model to apply the critiques.
+                    message_history.append(HumanMessage(content="Please refine the code using the critiques provided."))
+                    response = call_llm(message_history, "refine")
+                    current_code = response.content
+
+                print("\n--- Generated Code (v" + str(i + 1) + ") ---\n" + current_code)
+                message_history.append(response) # Add the generated code to history
+
+                # --- 2. REFLECT STAGE ---
+                print("\n>>> STAGE 2: REFLECTING on the generated code...")
+
+                # Create a specific prompt for the reflector agent.
+                # This asks the model to act as a senior code reviewer.
+                reflector_prompt = [
+                    SystemMessage(content="""
+                        You are a senior software engineer and an expert in Python.
+                        Your role is to perform a meticulous code review.
+                        Critically evaluate the provided Python code based on the original task requirements.
+                        Look for bugs, style issues, missing edge cases, and areas for improvement.
+                        If the code is perfect and meets all requirements, respond with the single phrase 'CODE_IS_PERFECT'.
+                        Otherwise, provide a bulleted list of your critiques.
+                    """),
+                    HumanMessage(content=f"Original Task:\n{task_prompt}\n\nCode to Review:\n{current_code}")
+                ]
+
+                critique_response = call_llm(reflector_prompt, "reflect")
+                critique = critique_response.content
+
+                # --- 3. STOPPING CONDITION ---
+                if "CODE_IS_PERFECT" in critique:
+                    print("\n--- Critique ---\nNo further critiques found. The code is satisfactory.")
+                    break
+
+                print("\n--- Critique ---\n" + critique)
+                # Add the critique to the history for the next refinement loop.
+                message_history.append(HumanMessage(content=f"Critique of the previous code:\n{critique}"))
+
+                print("\n" + "="*30 + " FINAL RESULT " + "="*30)
+                print("\nFinal refined code after the reflection process:\n")
+                print(current_code)
+            except BudgetExceededError:
+                # A "stop" budget was hit mid-iteration; keep the code we have.
+                print("\n--- Usage budget reached; stopping refinement with the current code. ---")
+                break
+
+        print("\n--- Usage ---\n" + tracker.report())
+    finally:
+        # Per-session totals and budgets are no longer needed.
+        tracker.end_session(session_id)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,174 @@
+"""
+Local stub of the Gemini generateContent REST endpoint.
+
+Used to check connection reuse and latency of model_registry without network
+access. The server counts TCP connections, so the comparison shows how many
+handshakes each approach costs.
+
+Usage:
+    python stub_model_server.py                 # run the shared-vs-fresh comparison
+    python stub_model_server.py --serve 8765    # only serve, e.g. for GEMINI_BASE_URL
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Tuple
+
+
+class StubModelServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, latency_ms: float = 20.0):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.latency = latency_ms / 1000.0
+        self.connections = 0
+        self.requests = 0
+        self._counter_lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def reset_counters(self) -> None:
+        with self._counter_lock:
+            self.connections = 0
+            self.requests = 0
+
+    def start(self) -> "StubModelServer":
+        threading.Thread(target=self.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+        return self
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so clients can keep connections alive between requests.
+    protocol_version = "HTTP/1.1"
+    # Without TCP_NODELAY, Nagle's algorithm plus delayed ACKs add ~40 ms to
+    # every response on a reused connection, hiding the benefit of reuse.
+    disable_nagle_algorithm = True
+
+    def setup(self) -> None:
+        super().setup()
+        with self.server._counter_lock:
+            self.server.connections += 1
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        with self.server._counter_lock:
+            self.server.requests += 1
+        time.sleep(self.server.latency)
+
+        if ":generateContent" not in self.path:
+            self._send(404, {"error": {"code": 404, "message": f"Unsupported path {self.path}"}})
+            return
+        self._send(200, {
+            "candidates": [{
+                "content": {"role": "model", "parts": [{"text": "stub reply"}]},
+                "finishReason": "STOP",
+                "index": 0,
+            }],
+            "usageMetadata": {"promptTokenCount": 5, "candidatesTokenCount": 2, "totalTokenCount": 7},
+        })
+
+    def _send(self, status: int, payload: Dict) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+# -------------------------
+# Shared vs fresh comparison
+# -------------------------
+async def _adk_calls(make_model, calls: int) -> float:
+    from google.adk.models import LlmRequest
+    from google.genai import types
+
+    start = time.perf_counter()
+    for _ in range(calls):
+        llm = make_model()
+        request = LlmRequest(
+            model=llm.model,
+            contents=[types.Content(role="user", parts=[types.Part(text="hello")])],
+        )
+        async for _ in llm.generate_content_async(request):
+            pass
+    return (time.perf_counter() - start) / calls
+
+
+def _chat_calls(make_model, calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        make_model().invoke("hello")
+    return (time.perf_counter() - start) / calls
+
+
+async def run_comparison(server: StubModelServer, calls: int) -> Dict[str, Tuple[int, int, float]]:
+    """
+    Make `calls` sequential calls per approach against `server` and return
+    {label: (connections, requests, mean seconds per call)}.
+    """
+    os.environ.setdefault("GOOGLE_API_KEY", "stub-key")
+
+    from google.adk.models.google_llm import Gemini
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    from model_registry import ModelRegistry
+
+    registry = ModelRegistry(base_url=server.base_url)
+    model = "gemini-2.0-flash"
+
+    def fresh_chat():
+        return ChatGoogleGenerativeAI(model=model, transport="rest", client_options={"api_endpoint": server.base_url})
+
+    approaches = [
+        ("ADK, fresh client per agent", lambda: _adk_calls(lambda: Gemini(model=model, base_url=server.base_url), calls)),
+        ("ADK, shared registry client", lambda: _adk_calls(lambda: registry.adk_model(model), calls)),
+        ("LangChain, fresh client", lambda: asyncio.to_thread(_chat_calls, fresh_chat, calls)),
+        ("LangChain, shared registry", lambda: asyncio.to_thread(_chat_calls, lambda: registry.chat_model(model), calls)),
+    ]
+    results = {}
+    try:
+        for label, run in approaches:
+            server.reset_counters()
+            mean = await run()
+            results[label] = (server.connections, server.requests, mean)
+    finally:
+        await registry.ashutdown()
+    return results
+
+
+async def compare(calls: int, latency_ms: float) -> None:
+    server = StubModelServer(latency_ms=latency_ms).start()
+    print(f"🔄 {calls} sequential calls against stub at {server.base_url} ({latency_ms:.0f} ms/call)\n")
+    results = await run_comparison(server, calls)
+
+    print(f"{'approach':<30}{'connections':>12}{'requests':>10}{'mean ms':>10}")
+    for label, (connections, requests, mean) in results.items():
+        print(f"{label:<30}{connections:>12}{requests:>10}{mean * 1000:>10.1f}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--serve", type=int, metavar="PORT", help="Only run the stub server on PORT")
+    parser.add_argument("--calls", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    args = parser.parse_args()
+
+    if args.serve is not None:
+        server = StubModelServer(port=args.serve, latency_ms=args.latency_ms)
+        print(f"Stub model server listening on {server.base_url}")
+        server.serve_forever()
+    else:
+        asyncio.run(compare(args.calls, args.latency_ms))
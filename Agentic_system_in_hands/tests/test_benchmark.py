@@ -0,0 +1,47 @@
+from benchmark import BASELINE_SETTINGS, TIMING_SETTINGS, compare, settings_mismatch
+
+SUMMARY = {
+    "p50_ms": 100.0,
+    "p95_ms": 150.0,
+    "p99_ms": 200.0,
+    "llm_calls_per_run": 4.0,
+    "throughput_rps": 10.0,
+    "error_rate": 0.0,
+}
+SETTINGS = {key: 1 for key in BASELINE_SETTINGS + TIMING_SETTINGS}
+
+
+def test_compare_flags_more_calls_and_errors():
+    assert compare(SUMMARY, dict(SUMMARY), tolerance=0.2) == []
+    assert compare(SUMMARY, None, tolerance=0.2) == []
+    baseline = dict(SUMMARY, llm_calls_per_run=3.0, error_rate=0.0)
+    assert compare(dict(SUMMARY, error_rate=0.05), baseline, tolerance=0.2) == [
+        "llm_calls_per_run 3.0 -> 4.0",
+        "error_rate 0.0 -> 0.05",
+    ]
+    # Fewer calls is an improvement, not a regression.
+    assert compare(SUMMARY, dict(SUMMARY, llm_calls_per_run=5.0), tolerance=0.2) == []
+
+
+def test_compare_checks_timing_only_when_asked():
+    baseline = dict(SUMMARY, p50_ms=80.0, p95_ms=140.0, throughput_rps=20.0)
+    assert compare(SUMMARY, baseline, tolerance=0.2) == []
+    assert compare(SUMMARY, baseline, tolerance=0.2, timing=True) == [
+        "p50_ms 80.0 -> 100.0",
+        "throughput_rps 20.0 -> 10.0",
+    ]
+
+
+def test_settings_mismatch_skips_or_narrows_the_comparison():
+    assert settings_mismatch(SETTINGS, SETTINGS, timing=True) == (True, True, None)
+
+    comparable, timing, warning = settings_mismatch(dict(SETTINGS, runs=50), SETTINGS, timing=True)
+    assert (comparable, timing) == (False, False)
+    assert warning is not None and "'runs': 50" in warning and "skipping" in warning
+
+    comparable, timing, warning = settings_mismatch(dict(SETTINGS, latency_ms=200), SETTINGS, timing=True)
+    assert (comparable, timing) == (True, False)
+    assert warning is not None and "'latency_ms': 200" in warning
+
+    # Timing settings do not matter when timing is not compared.
+    assert settings_mismatch(dict(SETTINGS, latency_ms=200), SETTINGS, timing=False) == (True, False, None)
@@ -0,0 +1,76 @@
+import random
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+from fake_llm import FakeChatModel, FakeLLMError, FakeReply, FakeResponder, Latency, split_tokens
+
+
+def texts(responder, prompts):
+    return [responder.plan(prompt, None)[0].text for prompt in prompts]
+
+
+def test_rules_then_script_then_default():
+    responder = FakeResponder(
+        responses=["first", "second"],
+        rules=[(r"review", "LGTM"), (lambda call: call.index == 3, FakeReply(text="fourth call"))],
+        default="fallback",
+        cycle=False,
+    )
+    replies = texts(responder, ["draft", "please review", "draft", "draft", "draft"])
+    # A rule match does not use up a scripted response.
+    assert replies == ["first", "LGTM", "second", "fourth call", "fallback"]
+
+
+def test_script_cycles_by_default():
+    responder = FakeResponder(responses=["a", "b"], default="fallback")
+    assert texts(responder, ["x"] * 5) == ["a", "b", "a", "b", "a"]
+    responder.reset()
+    assert texts(responder, ["x"]) == ["a"]
+
+
+@pytest.mark.parametrize("distribution", ["uniform", "normal", "lognormal"])
+def test_latency_samples_are_seeded(distribution):
+    latency = Latency(distribution, mean_ms=100, spread_ms=30)
+
+    def samples(seed):
+        rng = random.Random(seed)
+        return [latency.sample(rng) for _ in range(50)]
+
+    assert samples(7) == samples(7)
+    assert samples(7) != samples(8)
+    assert all(sample >= 0 for sample in samples(7))
+    assert Latency("constant", mean_ms=100).sample(random.Random(7)) == 0.1
+
+
+def test_latency_rejects_unknown_distribution():
+    with pytest.raises(ValueError):
+        Latency("pareto", mean_ms=10).sample(random.Random(0))
+
+
+def test_error_rate_injects_the_seeded_number_of_errors():
+    def failures(seed):
+        responder = FakeResponder(error_rate=0.3, seed=seed)
+        flags = [responder.plan("x", None)[3] for _ in range(1000)]
+        assert responder.errors == sum(flags)
+        return flags
+
+    flags = failures(seed=1)
+    assert 250 <= sum(flags) <= 350
+    assert failures(seed=1) == flags
+
+    llm = FakeChatModel(responder=FakeResponder(error_rate=1.0))
+    with pytest.raises(FakeLLMError):
+        llm.invoke("hello")
+    assert FakeResponder(error_rate=0.0).plan("x", None)[3] is False
+
+
+def test_streamed_chunks_carry_usage_metadata():
+    llm = FakeChatModel(responder=FakeResponder(default="three short words"))
+    chunks = list(llm.stream([HumanMessage(content="count my tokens")]))
+    assert "".join(chunk.content for chunk in chunks) == "three short words"
+
+    usage = [chunk.usage_metadata for chunk in chunks if chunk.usage_metadata]
+    assert len(usage) == 1
+    prompt_tokens = len(split_tokens("human: count my tokens"))
+    assert usage[0] == {"input_tokens": prompt_tokens, "output_tokens": 3, "total_tokens": prompt_tokens + 3}
@@ -0,0 +1,157 @@
+import asyncio
+import os
+import threading
+import time
+
+import pytest
+from google.genai import types
+
+os.environ.setdefault("GOOGLE_API_KEY", "stub-key")
+
+import model_registry  # noqa: E402
+from model_registry import ModelRegistry, RegistryClosedError, _Limiter  # noqa: E402
+from stub_model_server import StubModelServer, run_comparison  # noqa: E402
+
+
+@pytest.fixture
+def server():
+    stub = StubModelServer(latency_ms=1).start()
+    yield stub
+    stub.shutdown()
+    stub.server_close()
+
+
+def test_shared_clients_reuse_connections(server):
+    results = asyncio.run(run_comparison(server, calls=5))
+    # (connections, requests, mean seconds)
+    assert results["ADK, fresh client per agent"][:2] == (5, 5)
+    assert results["ADK, shared registry client"][:2] == (1, 5)
+    assert results["LangChain, fresh client"][:2] == (5, 5)
+    assert results["LangChain, shared registry"][:2] == (1, 5)
+
+
+def test_adk_client_keeps_tracking_headers_and_retry_options():
+    registry = ModelRegistry(max_keepalive=3, base_url="http://127.0.0.1:1")
+    retry = types.HttpRetryOptions(attempts=3)
+    llm = registry.adk_model("gemini-2.0-flash", retry_options=retry)
+    options = llm.api_client._api_client._http_options
+    assert "google-adk" in options.headers["x-goog-api-client"]
+    assert options.retry_options.attempts == 3
+    assert options.base_url == "http://127.0.0.1:1"
+    assert options.client_args["limits"].max_keepalive_connections == 3
+    assert options.async_client_args["limits"].max_keepalive_connections == 3
+
+
+def test_chat_model_rest_session_uses_pool_size():
+    registry = ModelRegistry(max_keepalive=3, base_url="http://127.0.0.1:1")
+    llm = registry.chat_model("gemini-2.0-flash")
+    adapter = llm.client._transport._session.get_adapter("http://127.0.0.1:1")
+    assert adapter._pool_maxsize == 3
+    assert registry.chat_model("gemini-2.0-flash") is llm
+
+
+class Tracker:
+    def __init__(self):
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+
+    def __exit__(self, *exc):
+        with self.lock:
+            self.active -= 1
+
+
+def test_async_waiters_are_woken_on_release():
+    limiter = _Limiter(ModelRegistry(), limit=2)
+    tracker = Tracker()
+
+    async def call():
+        async with limiter.ahold():
+            with tracker:
+                await asyncio.sleep(0.01)
+
+    async def main():
+        start = time.perf_counter()
+        await asyncio.gather(*(call() for _ in range(10)))
+        return time.perf_counter() - start
+
+    elapsed = asyncio.run(main())
+    assert tracker.peak == 2
+    assert limiter._available == 2 and not limiter._waiters
+    assert elapsed < 0.2
+
+
+def test_cancelled_async_waiter_does_not_leak_a_permit():
+    limiter = _Limiter(ModelRegistry(), limit=1)
+
+    async def main():
+        release = asyncio.Event()
+
+        async def holder():
+            async with limiter.ahold():
+                await release.wait()
+
+        async def waiter():
+            async with limiter.ahold():
+                pass
+
+        first = asyncio.create_task(holder())
+        await asyncio.sleep(0)
+        second = asyncio.create_task(waiter())
+        await asyncio.sleep(0)
+        second.cancel()
+        release.set()
+        await first
+        with pytest.raises(asyncio.CancelledError):
+            await second
+        async with limiter.ahold():
+            pass
+
+    asyncio.run(main())
+    assert limiter._available == 1 and not limiter._waiters
+
+
+def test_limit_is_shared_between_threads_and_event_loops():
+    limiter = _Limiter(ModelRegistry(), limit=1)
+    tracker = Tracker()
+
+    def sync_call():
+        with limiter.hold():
+            with tracker:
+                time.sleep(0.01)
+
+    async def async_calls():
+        async def one():
+            async with limiter.ahold():
+                with tracker:
+                    await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(one() for _ in range(5)))
+
+    threads = [threading.Thread(target=sync_call) for _ in range(5)]
+    threads.append(threading.Thread(target=asyncio.run, args=(async_calls(),)))
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    assert tracker.peak == 1
+    assert limiter._available == 1
+
+
+def test_shutdown_rejects_new_models():
+    registry = ModelRegistry()
+    registry.shutdown()
+    with pytest.raises(RegistryClosedError):
+        registry.adk_model("gemini-2.0-flash")
+
+
+def test_missing_adk_internals_fail_at_import(monkeypatch):
+    model_registry._check_adk_internals()
+    monkeypatch.delattr(model_registry.Gemini, "_tracking_headers")
+    with pytest.raises(ImportError, match="Gemini._tracking_headers"):
+        model_registry._check_adk_internals()
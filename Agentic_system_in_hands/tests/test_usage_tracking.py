@@ -0,0 +1,169 @@
+import asyncio
+import json
+import re
+import uuid
+from collections import defaultdict
+
+import pytest
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from benchmark import import_with_fakes
+from fake_llm import FakeChatModel, FakeResponder
+from model_registry import registry
+from usage_tracking import Budget, Totals, UsageTracker, tracker
+
+
+def status_for_iteration(call):
+    match = re.search(r"Current iteration: (\d+)", call.prompt)
+    done = match is not None and int(match.group(1)) >= 3
+    return json.dumps({"status": "completed" if done else "pending"})
+
+
+@pytest.fixture
+def budgets(monkeypatch):
+    """Budgets on the shared tracker, dropped again after the test."""
+    monkeypatch.setattr(tracker, "_budgets", {})
+    return tracker
+
+
+async def run_to_end(agent):
+    """Run an ADK agent in a fresh session; return its events and final state."""
+    service = InMemorySessionService()
+    session_id = str(uuid.uuid4())
+    await service.create_session(
+        app_name="test", user_id="u1", session_id=session_id, state={"checking": 1, "iterative": 0}
+    )
+    runner = Runner(app_name="test", agent=agent, session_service=service)
+    message = types.Content(role="user", parts=[types.Part(text="Start the process")])
+    events = [e async for e in runner.run_async(user_id="u1", session_id=session_id, new_message=message)]
+    session = await service.get_session(app_name="test", user_id="u1", session_id=session_id)
+    return events, session.state
+
+
+def test_output_schema_loop_runs_to_completion_without_budget(budgets):
+    responder = FakeResponder(default=status_for_iteration)
+    module = import_with_fakes("multi_agent_with_state_with_output_schema", responder)
+    events, state = asyncio.run(run_to_end(module.poller))
+    assert state["status_update"] == {"status": "completed"}
+    assert responder.calls == 4
+
+
+def test_adk_calls_are_recorded_under_the_session_and_user(budgets, monkeypatch):
+    monkeypatch.setattr(tracker, "_totals", defaultdict(Totals))
+    module = import_with_fakes("multi_agent_with_state_with_output_schema", FakeResponder(default=status_for_iteration))
+    asyncio.run(run_to_end(module.poller))
+    assert tracker.totals(user_id="u1", pipeline="status_poller_schema").calls == 4
+    sessions = {scope[0] for scope in tracker._totals if scope[0] is not None}
+    assert len(sessions) == 1 and "default" not in sessions
+
+
+def test_stop_budget_ends_output_schema_loop(budgets):
+    responder = FakeResponder(default=status_for_iteration)
+    module = import_with_fakes("multi_agent_with_state_with_output_schema", responder)
+    budgets.set_budget(Budget(max_calls=1, on_exceed="stop"), pipeline="status_poller_schema")
+
+    events, state = asyncio.run(run_to_end(module.poller))
+
+    # The first call uses up the budget. The second is skipped without
+    # tripping output_schema validation and escalates, ending the loop early.
+    assert responder.calls == 1
+    assert state["status_update"] == {"status": "pending"}
+    assert events[-1].author == "ProcessingStep" and events[-1].actions.escalate
+    assert sum(e.author == "ProcessingStep" for e in events) == 2
+
+
+def record(usage, session="s1", stage="draft", tokens=10):
+    usage.record(session, "u1", "reflection", stage, "gemini-2.0-flash", tokens, tokens, 0.01)
+
+
+def test_record_history_is_bounded_but_stage_totals_are_complete():
+    usage = UsageTracker(max_records=5)
+    for i in range(20):
+        record(usage, stage="draft" if i % 2 else "reflect")
+    assert len(usage.records) == 5
+    stages = dict(usage.by_stage())
+    assert stages[("reflection", "draft")].calls == 10
+    assert stages[("reflection", "reflect")].calls == 10
+    assert usage.totals().calls == 20
+
+
+def test_end_session_drops_session_totals_and_budgets():
+    usage = UsageTracker()
+    usage.set_budget(Budget(max_calls=1), session_id="s1")
+    usage.set_budget(Budget(max_calls=1), pipeline="reflection")
+    record(usage, session="s1")
+    record(usage, session="s2")
+    assert usage.status("s1", "u1", "reflection") == "stop"
+
+    usage.end_session("s1")
+    assert usage.totals(session_id="s1").calls == 0
+    assert usage.totals(session_id="s1", user_id="u1", pipeline="reflection").calls == 0
+    assert ("s1", None, None) not in usage._budgets
+    assert usage.totals(session_id="s2").calls == 1
+    assert usage.totals(pipeline="reflection").calls == 2
+    assert usage.status("s2", "u1", "reflection") == "stop"
+    assert usage.status("s1", "u1", "reflection") == "ok"
+
+
+@pytest.mark.parametrize("kwargs", [{"on_exceed": "degrade"}, {"on_exceed": "skip"}])
+def test_invalid_budgets_are_rejected(kwargs):
+    with pytest.raises(ValueError):
+        Budget(max_calls=1, **kwargs)
+
+
+def test_from_env_rejects_degrade_without_fallback(monkeypatch):
+    monkeypatch.setenv("SESSION_TOKEN_BUDGET", "1000")
+    monkeypatch.setenv("BUDGET_ON_EXCEED", "degrade")
+    monkeypatch.delenv("BUDGET_FALLBACK_MODEL", raising=False)
+    with pytest.raises(ValueError, match="BUDGET_FALLBACK_MODEL"):
+        UsageTracker.from_env()
+    monkeypatch.setenv("BUDGET_FALLBACK_MODEL", "gemini-2.0-flash-lite")
+    budget = UsageTracker.from_env()._budgets[(None, None, None)]
+    assert budget.fallback_model == "gemini-2.0-flash-lite"
+
+
+def test_totals_are_snapshots():
+    usage = UsageTracker()
+    record(usage)
+    snapshot = usage.totals()
+    record(usage)
+    assert snapshot.calls == 1 and usage.totals().calls == 2
+
+
+@pytest.mark.parametrize("max_calls, expected_calls", [(1, 1), (2, 2), (None, 6)])
+def test_reflection_loop_stops_on_budget(budgets, max_calls, expected_calls):
+    responder = FakeResponder(default="- add type hints")
+    module = import_with_fakes("reflection_code_in_langchain", responder)
+    if max_calls:
+        # max_calls=1 stops inside an iteration (the reflect call raises);
+        # max_calls=2 stops at the status check before the second iteration.
+        budgets.set_budget(Budget(max_calls=max_calls, on_exceed="stop"), pipeline="reflection")
+    module.run_reflection_loop()
+    assert responder.calls == expected_calls
+
+
+def test_degrade_budget_skips_optional_parallel_branches(budgets):
+    responder = FakeResponder(default="A concise paragraph.")
+    module = import_with_fakes("parallel_code_in_langchain", responder)
+    budgets.set_budget(
+        Budget(max_calls=4, on_exceed="degrade", fallback_model="gemini-2.0-flash-lite"),
+        pipeline="parallel",
+    )
+
+    def fake_chat(model, **kwargs):
+        return FakeChatModel(responder=responder, model=f"fake-{model}")
+
+    with registry.override(chat=fake_chat):
+        asyncio.run(module.run_parallel_example("space", session_id="degrade-test"))
+        assert responder.calls == 4
+        # The first run used up the budget: the second only summarizes and
+        # synthesizes, both on the fallback model.
+        asyncio.run(module.run_parallel_example("space", session_id="degrade-test"))
+    tracker.end_session("degrade-test")
+
+    assert responder.calls == 6
+    degraded = [r for r in tracker.records if r.session_id == "degrade-test"][-2:]
+    assert {r.stage for r in degraded} == {"summarize", "synthesize"}
+    assert {r.model for r in degraded} == {"fake-gemini-2.0-flash-lite"}
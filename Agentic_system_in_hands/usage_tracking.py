@@ -0,0 +1,425 @@
+"""
+Token and cost accounting with per-session budgets.
+
+Usage is collected from LangChain callbacks and ADK model callbacks, then
+aggregated per session, user, pipeline and stage:
+
+    from usage_tracking import tracker, Budget
+
+    tracker.set_budget(Budget(max_tokens=50_000, on_exceed="stop"), pipeline="reflection")
+
+    # LangChain: pass the handler in the run config; label stages via metadata.
+    handler = tracker.langchain_handler(pipeline="reflection", session_id="s1", user_id="u1")
+    llm.invoke(messages, config={"callbacks": [handler], "metadata": {"stage": "reflect"}})
+
+    # ADK: attach the callbacks to an LlmAgent.
+    before, after = tracker.adk_callbacks(pipeline="status_poller")
+    LlmAgent(..., before_model_callback=before, after_model_callback=after)
+
+    print(tracker.report())
+    tracker.export_json("usage.json")
+    tracker.end_session("s1")    # drop per-session totals once a session is over
+
+When a budget is exceeded:
+- "stop": LangChain calls raise BudgetExceededError; ADK calls are skipped
+  and the agent escalates, which ends a LoopAgent.
+- "degrade": ADK calls switch to `fallback_model`, which is required; LangChain
+  runs continue and callers check `tracker.status(...)` to switch to the
+  fallback model or skip optional work (e.g. more reflection rounds).
+
+Default budgets can be set from the environment: SESSION_TOKEN_BUDGET,
+SESSION_COST_BUDGET_USD, BUDGET_ON_EXCEED (stop|degrade), BUDGET_FALLBACK_MODEL.
+
+Memory stays bounded in a long-running service: only the last `max_records`
+individual records are kept for export (USAGE_MAX_RECORDS, default 10000),
+per-stage totals are aggregated as records arrive, and `end_session` drops a
+finished session's totals and budgets.
+"""
+
+import csv
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from dataclasses import asdict, dataclass, field, replace
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models import LlmRequest, LlmResponse
+from google.genai import types
+
+# USD per 1M (input, output) tokens. List prices at the time of writing;
+# override with tracker.set_price().
+DEFAULT_PRICES: Dict[str, Tuple[float, float]] = {
+    "gemini-2.0-flash": (0.10, 0.40),
+    "gemini-2.0-flash-exp": (0.10, 0.40),
+    "gemini-2.0-flash-lite": (0.075, 0.30),
+    "gemini-pro": (0.50, 1.50),
+}
+
+
+class BudgetExceededError(RuntimeError):
+    """Raised from a LangChain callback when a "stop" budget is exceeded."""
+
+
+@dataclass
+class Budget:
+    max_tokens: Optional[int] = None
+    max_cost_usd: Optional[float] = None
+    max_calls: Optional[int] = None
+    on_exceed: str = "stop"                 # stop | degrade
+    fallback_model: Optional[str] = None    # required when degrading
+
+    def __post_init__(self) -> None:
+        if self.on_exceed not in ("stop", "degrade"):
+            raise ValueError(f"on_exceed must be 'stop' or 'degrade', got {self.on_exceed!r}")
+        if self.on_exceed == "degrade" and not self.fallback_model:
+            raise ValueError(
+                "on_exceed='degrade' needs a fallback_model (BUDGET_FALLBACK_MODEL) to degrade to"
+            )
+
+    def exceeded(self, totals: "Totals") -> bool:
+        return (
+            (self.max_tokens is not None and totals.total_tokens >= self.max_tokens)
+            or (self.max_cost_usd is not None and totals.cost_usd >= self.max_cost_usd)
+            or (self.max_calls is not None and totals.calls >= self.max_calls)
+        )
+
+
+@dataclass
+class UsageRecord:
+    session_id: str
+    user_id: str
+    pipeline: str
+    stage: str
+    model: str
+    prompt_tokens: int
+    completion_tokens: int
+    latency_s: float
+    cost_usd: float
+    timestamp: float = field(default_factory=time.time)
+
+
+@dataclass
+class Totals:
+    calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    latency_s: float = 0.0
+    cost_usd: float = 0.0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def add(self, record: UsageRecord) -> None:
+        self.calls += 1
+        self.prompt_tokens += record.prompt_tokens
+        self.completion_tokens += record.completion_tokens
+        self.latency_s += record.latency_s
+        self.cost_usd += record.cost_usd
+
+
+# (session_id, user_id, pipeline); None matches anything.
+Scope = Tuple[Optional[str], Optional[str], Optional[str]]
+
+
+class UsageTracker:
+    """Collects usage records and enforces budgets scoped by session, user and pipeline."""
+
+    def __init__(self, prices: Optional[Dict[str, Tuple[float, float]]] = None, max_records: int = 10_000):
+        self.prices = dict(DEFAULT_PRICES if prices is None else prices)
+        # Most recent records only, for export; totals cover everything.
+        self.records: Deque[UsageRecord] = deque(maxlen=max_records)
+        self._budgets: Dict[Scope, Budget] = {}
+        self._totals: Dict[Scope, Totals] = defaultdict(Totals)
+        self._stages: Dict[Tuple[str, str], Totals] = defaultdict(Totals)
+        self._session_scopes: Dict[str, Set[Scope]] = defaultdict(set)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "UsageTracker":
+        tracker = cls(max_records=int(os.getenv("USAGE_MAX_RECORDS", "10000")))
+        max_tokens = os.getenv("SESSION_TOKEN_BUDGET")
+        max_cost = os.getenv("SESSION_COST_BUDGET_USD")
+        if max_tokens or max_cost:
+            tracker.set_budget(Budget(
+                max_tokens=int(max_tokens) if max_tokens else None,
+                max_cost_usd=float(max_cost) if max_cost else None,
+                on_exceed=os.getenv("BUDGET_ON_EXCEED", "stop"),
+                fallback_model=os.getenv("BUDGET_FALLBACK_MODEL"),
+            ))
+        return tracker
+
+    # --- configuration ---
+    def set_price(self, model: str, input_per_million: float, output_per_million: float) -> None:
+        self.prices[model] = (input_per_million, output_per_million)
+
+    def set_budget(
+        self,
+        budget: Budget,
+        session_id: Optional[str] = None,
+        user_id: Optional[str] = None,
+        pipeline: Optional[str] = None,
+    ) -> None:
+        """
+        Attach a budget. Budgets are enforced per session; `user_id` and
+        `pipeline` restrict which calls count, e.g.
+        `set_budget(b, pipeline="reflection")` limits every reflection session,
+        while passing `session_id` limits only that session.
+        """
+        with self._lock:
+            self._budgets[(session_id, user_id, pipeline)] = budget
+
+    # --- recording ---
+    def cost(self, model: str, prompt_tokens: int, completion_tokens: int) -> float:
+        # Model names may carry a "models/" prefix or a version suffix;
+        # match the longest known prefix.
+        name = model.split("/")[-1]
+        matches = [m for m in self.prices if name.startswith(m)]
+        price = self.prices[max(matches, key=len)] if matches else (0.0, 0.0)
+        return (prompt_tokens * price[0] + completion_tokens * price[1]) / 1_000_000
+
+    def record(
+        self,
+        session_id: str,
+        user_id: str,
+        pipeline: str,
+        stage: str,
+        model: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+        latency_s: float,
+    ) -> UsageRecord:
+        record = UsageRecord(
+            session_id=session_id,
+            user_id=user_id,
+            pipeline=pipeline,
+            stage=stage,
+            model=model,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            latency_s=latency_s,
+            cost_usd=self.cost(model, prompt_tokens, completion_tokens),
+        )
+        with self._lock:
+            self.records.append(record)
+            self._stages[(pipeline, stage)].add(record)
+            for scope in _scopes(session_id, user_id, pipeline):
+                self._totals[scope].add(record)
+                if scope[0] is not None:
+                    self._session_scopes[session_id].add(scope)
+        return record
+
+    def end_session(self, session_id: str) -> None:
+        """
+        Forget a finished session's totals and session-specific budgets.
+        User, pipeline and stage totals keep its usage.
+        """
+        with self._lock:
+            for scope in self._session_scopes.pop(session_id, ()):
+                self._totals.pop(scope, None)
+            for scope in [s for s in self._budgets if s[0] == session_id]:
+                del self._budgets[scope]
+
+    # --- budgets ---
+    def exceeded_budget(self, session_id: str, user_id: str, pipeline: str) -> Optional[Budget]:
+        """The first budget covering this session/user/pipeline that has been exceeded."""
+        with self._lock:
+            for (b_session, b_user, b_pipeline), budget in self._budgets.items():
+                if (
+                    (b_session is not None and b_session != session_id)
+                    or (b_user is not None and b_user != user_id)
+                    or (b_pipeline is not None and b_pipeline != pipeline)
+                ):
+                    continue
+                # Budgets are per session; user/pipeline narrow which calls count.
+                if budget.exceeded(self._totals.get((session_id, b_user, b_pipeline), Totals())):
+                    return budget
+        return None
+
+    def status(self, session_id: str, user_id: str, pipeline: str) -> str:
+        """Return "ok", "stop" or "degrade" for the next call in this session."""
+        budget = self.exceeded_budget(session_id, user_id, pipeline)
+        return budget.on_exceed if budget else "ok"
+
+    # --- reporting ---
+    def totals(self, session_id: Optional[str] = None, user_id: Optional[str] = None,
+               pipeline: Optional[str] = None) -> Totals:
+        with self._lock:
+            return replace(self._totals.get((session_id, user_id, pipeline), Totals()))
+
+    def by_stage(self) -> List[Tuple[Tuple[str, str], Totals]]:
+        """Totals per (pipeline, stage), most expensive first."""
+        with self._lock:
+            stages = [(key, replace(totals)) for key, totals in self._stages.items()]
+        return sorted(stages, key=lambda kv: (kv[1].cost_usd, kv[1].total_tokens), reverse=True)
+
+    def report(self, top: int = 10) -> str:
+        lines = [
+            f"{'pipeline':<22}{'stage':<22}{'calls':>6}{'prompt':>9}{'compl.':>9}{'latency s':>11}{'cost $':>11}",
+        ]
+        for (pipeline, stage), t in self.by_stage()[:top]:
+            lines.append(
+                f"{pipeline[:21]:<22}{stage[:21]:<22}{t.calls:>6}{t.prompt_tokens:>9}"
+                f"{t.completion_tokens:>9}{t.latency_s:>11.2f}{t.cost_usd:>11.5f}"
+            )
+        overall = self.totals()
+        lines.append(
+            f"{'TOTAL':<44}{overall.calls:>6}{overall.prompt_tokens:>9}"
+            f"{overall.completion_tokens:>9}{overall.latency_s:>11.2f}{overall.cost_usd:>11.5f}"
+        )
+        return "\n".join(lines)
+
+    def export_json(self, path: str) -> None:
+        with self._lock:
+            rows = [asdict(r) for r in self.records]
+        with open(path, "w") as f:
+            json.dump(rows, f, indent=2)
+
+    def export_csv(self, path: str) -> None:
+        with self._lock:
+            rows = [asdict(r) for r in self.records]
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(UsageRecord.__dataclass_fields__))
+            writer.writeheader()
+            writer.writerows(rows)
+
+    # --- framework adapters ---
+    def langchain_handler(self, pipeline: str, session_id: str = "default",
+                          user_id: str = "default") -> "UsageCallbackHandler":
+        return UsageCallbackHandler(self, pipeline, session_id, user_id)
+
+    def adk_callbacks(self, pipeline: str):
+        """(before_model_callback, after_model_callback) for an ADK LlmAgent."""
+        started: Dict[Tuple[str, str], Tuple[float, str]] = {}
+
+        def ids(callback_context: CallbackContext) -> Tuple[str, str]:
+            return callback_context.session.id, callback_context.user_id
+
+        def before_model(callback_context: CallbackContext, llm_request: LlmRequest) -> Optional[LlmResponse]:
+            session_id, user_id = ids(callback_context)
+            budget = self.exceeded_budget(session_id, user_id, pipeline)
+            if budget and budget.on_exceed == "degrade":
+                print(f"[usage] {pipeline}: budget exceeded, degrading to {budget.fallback_model}")
+                llm_request.model = budget.fallback_model
+            elif budget:
+                print(f"[usage] {pipeline}: budget exceeded, skipping model call")
+                actions = getattr(callback_context, "actions", None)
+                if actions is not None:
+                    actions.escalate = True
+                # Empty content still yields an event (carrying the escalation)
+                # but no text, which would be saved under the agent's
+                # output_key and fail validation against its output_schema.
+                return LlmResponse(
+                    content=types.Content(role="model", parts=[]),
+                    custom_metadata={"usage_budget": "exceeded"},
+                )
+            key = (callback_context.invocation_id, callback_context.agent_name)
+            started[key] = (time.perf_counter(), llm_request.model or "")
+            return None
+
+        def after_model(callback_context: CallbackContext, llm_response: LlmResponse) -> Optional[LlmResponse]:
+            if llm_response.partial:
+                return None
+            key = (callback_context.invocation_id, callback_context.agent_name)
+            start, model = started.pop(key, (time.perf_counter(), ""))
+            usage = llm_response.usage_metadata
+            session_id, user_id = ids(callback_context)
+            self.record(
+                session_id=session_id,
+                user_id=user_id,
+                pipeline=pipeline,
+                stage=callback_context.agent_name,
+                model=model,
+                prompt_tokens=(usage.prompt_token_count or 0) if usage else 0,
+                completion_tokens=(usage.candidates_token_count or 0) if usage else 0,
+                latency_s=time.perf_counter() - start,
+            )
+            return None
+
+        return before_model, after_model
+
+
+def _scopes(session_id: str, user_id: str, pipeline: str) -> List[Scope]:
+    """Every aggregation level a record counts towards."""
+    return [
+        (None, None, None),
+        (session_id, None, None),
+        (None, user_id, None),
+        (None, None, pipeline),
+        (session_id, user_id, None),
+        (session_id, None, pipeline),
+        (None, user_id, pipeline),
+        (session_id, user_id, pipeline),
+    ]
+
+
+class UsageCallbackHandler(BaseCallbackHandler):
+    """LangChain callback that records token usage and latency per LLM call."""
+
+    raise_error = True  # so BudgetExceededError stops the run
+
+    def __init__(self, tracker: UsageTracker, pipeline: str, session_id: str, user_id: str):
+        self.tracker = tracker
+        self.pipeline = pipeline
+        self.session_id = session_id
+        self.user_id = user_id
+        self._started: Dict[UUID, Tuple[float, str, str]] = {}
+
+    def _start(self, serialized: Dict[str, Any], run_id: UUID, metadata: Optional[Dict[str, Any]]) -> None:
+        if self.tracker.status(self.session_id, self.user_id, self.pipeline) == "stop":
+            raise BudgetExceededError(
+                f"Usage budget exceeded for pipeline={self.pipeline} session={self.session_id}"
+            )
+        metadata = metadata or {}
+        kwargs = (serialized or {}).get("kwargs", {})
+        model = metadata.get("ls_model_name") or kwargs.get("model") or ""
+        stage = metadata.get("stage") or "llm"
+        self._started[run_id] = (time.perf_counter(), model, stage)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, metadata=None, **kwargs: Any) -> None:
+        self._start(serialized, run_id, metadata)
+
+    def on_llm_start(self, serialized, prompts, *, run_id: UUID, metadata=None, **kwargs: Any) -> None:
+        self._start(serialized, run_id, metadata)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        start, model, stage = self._started.pop(run_id, (time.perf_counter(), "", "llm"))
+        prompt_tokens = completion_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                usage = getattr(message, "usage_metadata", None)
+                if usage:
+                    prompt_tokens += usage.get("input_tokens", 0)
+                    completion_tokens += usage.get("output_tokens", 0)
+                model = model or (getattr(message, "response_metadata", None) or {}).get("model_name", "")
+        if not prompt_tokens and not completion_tokens and response.llm_output:
+            token_usage = response.llm_output.get("token_usage") or {}
+            prompt_tokens = token_usage.get("prompt_tokens", 0)
+            completion_tokens = token_usage.get("completion_tokens", 0)
+        self.tracker.record(
+            session_id=self.session_id,
+            user_id=self.user_id,
+            pipeline=self.pipeline,
+            stage=stage,
+            model=model,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            latency_s=time.perf_counter() - start,
+        )
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._started.pop(run_id, None)
+
+
+# -------------------------
+# Process-wide instance
+# -------------------------
+tracker = UsageTracker.from_env()
@@ -0,0 +1,271 @@
+"""
+Incrementally maintained conversation summary for the extraction phase.
+
+The extraction prompt is built from "conversation summary and recent
+messages". Rebuilding that summary from the full history makes every turn
+more expensive than the last. Instead, ``RollingSummary``:
+
+- keeps the last ``recent_pairs`` message pairs verbatim
+- folds each pair that falls out of that window into the stored summary with
+  a bounded-size delta call (current summary + one pair)
+- does a full refresh (re-summarize from the summary and a bounded window of
+  recent pairs) only when the summary exceeds ``max_summary_tokens`` or after
+  ``refresh_every`` delta updates, to limit drift
+- renders extraction context within a fixed ``context_budget_tokens``
+
+Run ``python conversation_summary.py`` for a 1,000-turn benchmark showing
+constant per-turn cost.
+"""
+
+import os
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from token_utils import estimate_tokens, truncate_to_tokens
+
+# Takes a prompt and returns the model's text completion.
+LLMFn = Callable[[str], str]
+
+DELTA_PROMPT = """You maintain a running summary of a conversation between a user and a
+Text2SQL assistant. Update the summary with the new exchange below. Keep user
+preferences, terminology definitions, referenced entities and metrics; drop
+small talk. Reply with the updated summary only, at most {max_words} words.
+
+Current summary:
+{summary}
+
+New exchange:
+{exchange}
+"""
+
+REFRESH_PROMPT = """Rewrite the summary of a conversation between a user and a Text2SQL
+assistant. Use the existing summary and the most recent exchanges below.
+Resolve contradictions in favour of the most recent exchanges. Reply with the
+new summary only, at most {max_words} words.
+
+Existing summary:
+{summary}
+
+Most recent exchanges:
+{exchanges}
+"""
+
+
+def openai_llm_fn(model: Optional[str] = None, client: Optional[Any] = None) -> LLMFn:
+    """Build an ``LLMFn`` backed by the OpenAI chat completions API."""
+    model = model or os.getenv("LLM_MODEL", "gpt-4o-mini")
+    if client is None:
+        from openai import OpenAI  # type: ignore[import-not-found]
+
+        client = OpenAI()
+
+    def complete(prompt: str) -> str:
+        response = client.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0,
+        )
+        return response.choices[0].message.content or ""
+
+    return complete
+
+
+def _format_pair(pair: Tuple[str, str], max_tokens: int) -> str:
+    user_message, ai_message = pair
+    return truncate_to_tokens(f"User: {user_message}\nAI: {ai_message}", max_tokens)
+
+
+@dataclass
+class SummaryStats:
+    delta_updates: int = 0
+    full_refreshes: int = 0
+    llm_input_tokens: int = 0
+    llm_seconds: float = 0.0
+
+
+class RollingSummary:
+    """
+    Per-user rolling conversation summary with a fixed-size extraction context.
+
+    Usage:
+        summary = RollingSummary(openai_llm_fn())
+        summary.add_pair(question, answer)
+        context = summary.build_context()   # feed into the extraction prompt
+        store.save(user_id, summary.to_dict())
+    """
+
+    def __init__(
+        self,
+        llm: LLMFn,
+        recent_pairs: int = 4,
+        max_summary_tokens: int = 400,
+        max_pair_tokens: int = 300,
+        refresh_every: int = 25,
+        refresh_window: int = 8,
+        context_budget_tokens: int = 1500,
+    ) -> None:
+        if recent_pairs < 1:
+            raise ValueError("recent_pairs must be at least 1")
+        self.llm = llm
+        self.recent_pairs = recent_pairs
+        self.max_summary_tokens = max_summary_tokens
+        self.max_pair_tokens = max_pair_tokens
+        self.refresh_every = refresh_every
+        # The history must also hold the pair being evicted from the window.
+        self.refresh_window = max(refresh_window, recent_pairs + 1)
+        self.context_budget_tokens = context_budget_tokens
+
+        self.summary = ""
+        self.turns = 0
+        self.deltas_since_refresh = 0
+        # Bounded history: the recent window is its tail, the rest is only
+        # kept for full refreshes.
+        self._history: Deque[Tuple[str, str]] = deque(maxlen=self.refresh_window)
+        self.stats = SummaryStats()
+
+    @property
+    def recent(self) -> List[Tuple[str, str]]:
+        return list(self._history)[-self.recent_pairs :]
+
+    def add_pair(self, user_message: str, ai_message: str) -> None:
+        """Record a new message pair, updating the summary incrementally."""
+        self._history.append((user_message, ai_message))
+        self.turns += 1
+
+        if self.turns <= self.recent_pairs:
+            return
+        # The pair that just left the verbatim window goes into the summary.
+        evicted = self._history[-self.recent_pairs - 1]
+        self._delta_update(evicted)
+
+        if (
+            estimate_tokens(self.summary) > self.max_summary_tokens
+            or self.deltas_since_refresh >= self.refresh_every
+        ):
+            self._full_refresh()
+
+    def build_context(self) -> str:
+        """Summary plus as many recent pairs as fit in ``context_budget_tokens``."""
+        header = "Conversation summary:\n"
+        # The summary may be up to max_summary_tokens, but never more than
+        # the context budget leaves room for.
+        room = self.context_budget_tokens - estimate_tokens(header)
+        summary = truncate_to_tokens(self.summary, min(self.max_summary_tokens, room))
+        parts = [header + (summary or "(none yet)")]
+        budget = self.context_budget_tokens - estimate_tokens(parts[0])
+
+        recent: List[str] = []
+        for pair in reversed(self.recent):
+            text = _format_pair(pair, self.max_pair_tokens)
+            cost = estimate_tokens(text)
+            if cost > budget:
+                break
+            recent.append(text)
+            budget -= cost
+        if recent:
+            parts.append("Recent messages:\n" + "\n".join(reversed(recent)))
+        return "\n\n".join(parts)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "summary": self.summary,
+            "turns": self.turns,
+            "deltas_since_refresh": self.deltas_since_refresh,
+            "history": [list(pair) for pair in self._history],
+        }
+
+    @classmethod
+    def from_dict(
+        cls, data: Dict[str, Any], llm: LLMFn, **kwargs: Any
+    ) -> "RollingSummary":
+        summary = cls(llm, **kwargs)
+        summary.summary = data.get("summary", "")
+        summary.turns = data.get("turns", 0)
+        summary.deltas_since_refresh = data.get("deltas_since_refresh", 0)
+        for user_message, ai_message in data.get("history", []):
+            summary._history.append((user_message, ai_message))
+        return summary
+
+    def _call(self, prompt: str) -> str:
+        start = time.perf_counter()
+        result = self.llm(prompt).strip()
+        self.stats.llm_seconds += time.perf_counter() - start
+        self.stats.llm_input_tokens += estimate_tokens(prompt)
+        return result
+
+    def _delta_update(self, pair: Tuple[str, str]) -> None:
+        prompt = DELTA_PROMPT.format(
+            max_words=self.max_summary_tokens * 3 // 4,
+            summary=truncate_to_tokens(self.summary, self.max_summary_tokens)
+            or "(empty)",
+            exchange=_format_pair(pair, self.max_pair_tokens),
+        )
+        self.summary = self._call(prompt)
+        self.deltas_since_refresh += 1
+        self.stats.delta_updates += 1
+
+    def _full_refresh(self) -> None:
+        exchanges = "\n\n".join(
+            _format_pair(pair, self.max_pair_tokens) for pair in self._history
+        )
+        prompt = REFRESH_PROMPT.format(
+            max_words=self.max_summary_tokens * 3 // 4,
+            summary=truncate_to_tokens(self.summary, self.max_summary_tokens)
+            or "(empty)",
+            exchanges=exchanges,
+        )
+        self.summary = truncate_to_tokens(self._call(prompt), self.max_summary_tokens)
+        self.deltas_since_refresh = 0
+        self.stats.full_refreshes += 1
+
+
+def _benchmark(turns: int = 1000) -> None:
+    """Drive RollingSummary with a fake LLM and report per-turn cost over time."""
+
+    def fake_llm(prompt: str) -> str:
+        # Echo the tail of the prompt, like a summarizer that keeps recent facts.
+        return prompt[-1200:]
+
+    summary = RollingSummary(fake_llm)
+    per_turn: List[Tuple[int, float, int]] = []
+    for turn in range(turns):
+        before_tokens = summary.stats.llm_input_tokens
+        start = time.perf_counter()
+        summary.add_pair(
+            f"Question {turn}: show approved loans over {turn * 1000} in California",
+            f"Answer {turn}: here are the approved loans above {turn * 1000}.",
+        )
+        context = summary.build_context()
+        elapsed = time.perf_counter() - start
+        per_turn.append(
+            (
+                summary.stats.llm_input_tokens - before_tokens,
+                elapsed,
+                estimate_tokens(context),
+            )
+        )
+
+    window = max(1, turns // 10)
+    print(
+        f"{'turns':>12} | {'llm in tok/turn':>15} | {'ms/turn':>8} |"
+        f" {'context tok':>11}"
+    )
+    for start in range(0, turns, window):
+        chunk = per_turn[start : start + window]
+        print(
+            f"{start + 1:>5}-{start + len(chunk):<6} | "
+            f"{sum(c[0] for c in chunk) / len(chunk):>15.1f} | "
+            f"{1000 * sum(c[1] for c in chunk) / len(chunk):>8.3f} | "
+            f"{max(c[2] for c in chunk):>11}"
+        )
+    print(
+        f"\ndelta updates: {summary.stats.delta_updates}, "
+        f"full refreshes: {summary.stats.full_refreshes}, "
+        f"context budget: {summary.context_budget_tokens} tokens"
+    )
+
+
+if __name__ == "__main__":
+    _benchmark()
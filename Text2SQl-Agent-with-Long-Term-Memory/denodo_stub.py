@@ -0,0 +1,241 @@
+"""
+Local stub of the Denodo AI SDK ``getMetadata`` endpoint.
+
+Serves canned metadata per database, answers ``If-None-Match`` with 304 and
+counts requests, so ``schema_cache`` can be tested and benchmarked without a
+Denodo instance. Also provides a sample wide schema and a deterministic
+offline embedding function.
+
+Usage:
+    python denodo_stub.py --port 8080 --tables 60
+    # then DENODO_API_HOST=http://127.0.0.1:8080
+"""
+
+import argparse
+import hashlib
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, cast
+from urllib.parse import parse_qs, urlparse
+
+
+class StubDenodoServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self, metadata: Dict[str, Dict[str, Any]], port: int = 0, send_etag: bool = True
+    ) -> None:
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.send_etag = send_etag
+        self.requests = 0
+        self.not_modified = 0
+        self._lock = threading.Lock()
+        self._metadata: Dict[str, Dict[str, Any]] = {}
+        for database, payload in metadata.items():
+            self.set_metadata(database, payload)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def set_metadata(self, database: str, payload: Dict[str, Any]) -> None:
+        """Replace a database's metadata, e.g. to simulate a schema change."""
+        with self._lock:
+            self._metadata[database] = payload
+
+    def start(self) -> "StubDenodoServer":
+        threading.Thread(
+            target=self.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True
+        ).start()
+        return self
+
+    def __enter__(self) -> "StubDenodoServer":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def stub(self) -> StubDenodoServer:
+        # BaseRequestHandler types ``server`` as a plain BaseServer.
+        return cast(StubDenodoServer, self.server)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        database = parse_qs(url.query).get("vdp_database_names", [""])[0]
+        stub = self.stub
+        with stub._lock:
+            stub.requests += 1
+            payload = stub._metadata.get(database)
+        if url.path != "/getMetadata" or payload is None:
+            detail = {"detail": f"Unknown database {database!r}"}
+            self._send(404, json.dumps(detail).encode("utf-8"))
+            return
+
+        body = json.dumps(payload, sort_keys=True).encode("utf-8")
+        etag = None
+        if stub.send_etag:
+            etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+        if etag and self.headers.get("If-None-Match") == etag:
+            with stub._lock:
+                stub.not_modified += 1
+            self._send(304, b"", etag)
+            return
+        self._send(200, body, etag)
+
+    def _send(self, status: int, body: bytes, etag: Optional[str] = None) -> None:
+        self.send_response(status)
+        if status != 304:
+            self.send_header("Content-Type", "application/json")
+        if etag:
+            self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+# -------------------------
+# Sample data
+# -------------------------
+_CORE_VIEWS = [
+    (
+        "customers",
+        "Bank customers",
+        [
+            ("customer_id", "int"),
+            ("full_name", "text"),
+            ("state", "text"),
+            ("credit_score", "int"),
+        ],
+        [],
+    ),
+    (
+        "loans",
+        "Loans issued to customers",
+        [
+            ("loan_id", "int"),
+            ("customer_id", "int"),
+            ("amount", "decimal"),
+            ("interest_rate", "decimal"),
+            ("loan_status", "text"),
+        ],
+        [("customers", "loans.customer_id = customers.customer_id")],
+    ),
+    (
+        "payments",
+        "Loan repayments",
+        [
+            ("payment_id", "int"),
+            ("loan_id", "int"),
+            ("paid_on", "date"),
+            ("amount", "decimal"),
+        ],
+        [("loans", "payments.loan_id = loans.loan_id")],
+    ),
+    (
+        "properties",
+        "Properties used as loan collateral",
+        [
+            ("property_id", "int"),
+            ("loan_id", "int"),
+            ("city", "text"),
+            ("market_value", "decimal"),
+        ],
+        [("loans", "properties.loan_id = loans.loan_id")],
+    ),
+]
+
+_FILLER_TOPICS = [
+    "audit",
+    "branch",
+    "campaign",
+    "employee",
+    "fx_rate",
+    "ledger",
+    "product",
+    "region",
+    "survey",
+    "ticket",
+]
+
+
+def _view(
+    name: str, description: str, columns: List[Any], joins: List[Any]
+) -> Dict[str, Any]:
+    return {
+        "tableName": name,
+        "description": description,
+        "schema": [
+            {
+                "columnName": column,
+                "type": type_,
+                "description": column.replace("_", " "),
+            }
+            for column, type_ in columns
+        ],
+        "associations": [
+            {"table_name": other, "where": condition} for other, condition in joins
+        ],
+    }
+
+
+def sample_metadata(tables: int = 60) -> Dict[str, Any]:
+    """A bank schema padded with unrelated tables to ``tables`` views."""
+    views = [_view(*spec) for spec in _CORE_VIEWS]
+    for i in range(max(0, tables - len(views))):
+        topic = _FILLER_TOPICS[i % len(_FILLER_TOPICS)]
+        name = f"{topic}_{i}"
+        views.append(
+            _view(
+                name,
+                f"Internal {topic.replace('_', ' ')} records",
+                [
+                    (f"{topic}_id", "int"),
+                    ("code", "text"),
+                    ("created_at", "timestamp"),
+                    ("notes", "text"),
+                    ("owner", "text"),
+                ],
+                [],
+            )
+        )
+    return {"db_schema_json": views}
+
+
+def hashed_embed_fn(texts: List[str], dims: int = 256) -> List[List[float]]:
+    """Deterministic bag-of-words embedding for offline tests and benchmarks."""
+    vectors = []
+    for text in texts:
+        vector = [0.0] * dims
+        for word in re.findall(r"[a-z0-9]+", text.lower()):
+            for token in {word, word.rstrip("s")}:
+                bucket = int(hashlib.md5(token.encode("utf-8")).hexdigest(), 16) % dims
+                vector[bucket] += 1.0
+        vectors.append(vector)
+    return vectors
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--database", default="bank")
+    parser.add_argument("--tables", type=int, default=60)
+    args = parser.parse_args()
+
+    server = StubDenodoServer(
+        {args.database: sample_metadata(args.tables)}, port=args.port
+    )
+    print(f"Stub Denodo AI SDK listening on {server.base_url}")
+    server.serve_forever()
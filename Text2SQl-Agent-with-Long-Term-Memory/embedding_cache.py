@@ -0,0 +1,328 @@
+"""
+Content-addressed embedding cache for the memory pipeline.
+
+Every extracted memory and every incoming question is embedded with
+``EMBEDDING_MODEL``. This module sits in front of the embedding API and:
+
+- keys each vector on ``sha256(model + normalized text)``
+- keeps an in-process LRU tier and a persistent SQLite tier
+- coalesces cache misses from concurrent callers into batched embedding calls
+  (bounded by ``max_batch_size`` and ``max_wait_ms``)
+- reports the cache hit rate and the average batch size
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# Takes a list of texts and returns one embedding per text, in order.
+EmbedFn = Callable[[List[str]], List[List[float]]]
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text so trivially different strings share a cache entry."""
+    return " ".join(text.split()).lower()
+
+
+def cache_key(text: str, model: str) -> str:
+    """Content address for an embedding: hash of the model and normalized text."""
+    payload = f"{model}\x00{normalize_text(text)}".encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
+
+def openai_embed_fn(model: str, client: Optional[Any] = None) -> EmbedFn:
+    """Build a batched embedding function backed by the OpenAI embeddings API."""
+    if client is None:
+        from openai import OpenAI  # type: ignore[import-not-found]
+
+        client = OpenAI()
+
+    def embed(texts: List[str]) -> List[List[float]]:
+        response = client.embeddings.create(model=model, input=texts)
+        data = sorted(response.data, key=lambda item: item.index)
+        return [item.embedding for item in data]
+
+    return embed
+
+
+class _SQLiteTier:
+    """Persistent key -> vector store. Vectors are stored as packed float32."""
+
+    def __init__(self, path: str) -> None:
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY,"
+            " model TEXT NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        if not keys:
+            return found
+        with self._lock:
+            # Stay well under SQLite's host parameter limit.
+            for start in range(0, len(keys), 500):
+                chunk = keys[start : start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    list(chunk),
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+        return found
+
+    def put_many(
+        self, model: str, items: Sequence[Tuple[str, Sequence[float]]]
+    ) -> None:
+        if not items:
+            return
+        now = time.time()
+        rows = [
+            (key, model, array("f", vector).tobytes(), now) for key, vector in items
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, vector, created_at)"
+                " VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache with batched miss handling.
+
+    Usage:
+        cache = EmbeddingCache(openai_embed_fn("text-embedding-ada-002"),
+                               model="text-embedding-ada-002")
+        vector = cache.embed("show me approved loans")
+        vectors = cache.embed_many(["memory one", "memory two"])
+        print(cache.stats())
+    """
+
+    def __init__(
+        self,
+        embed_fn: EmbedFn,
+        model: Optional[str] = None,
+        db_path: Optional[str] = None,
+        lru_size: int = 10_000,
+        max_batch_size: int = 64,
+        max_wait_ms: float = 10.0,
+    ) -> None:
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.embed_fn = embed_fn
+        self.model = model or os.getenv("EMBEDDING_MODEL") or "text-embedding-ada-002"
+        self.lru_size = lru_size
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+
+        db_path = db_path or os.getenv("EMBEDDING_CACHE_PATH")
+        self._disk = _SQLiteTier(db_path) if db_path else None
+        # Vectors are stored as tuples so callers can't mutate cached entries.
+        self._lru: "OrderedDict[str, Tuple[float, ...]]" = OrderedDict()
+        self._lru_lock = threading.Lock()
+
+        # Misses waiting to be flushed as one batch, and one future per key
+        # that is pending or currently being embedded. Later callers for the
+        # same key share that future instead of triggering another call.
+        self._pending: "OrderedDict[str, str]" = OrderedDict()
+        self._inflight: Dict[str, Future] = {}
+        self._cond = threading.Condition()
+        self._closed = False
+        self._worker = threading.Thread(
+            target=self._batch_loop, name="embedding-batcher", daemon=True
+        )
+        self._worker.start()
+
+        self._stats_lock = threading.Lock()
+        self._requests = 0
+        self._memory_hits = 0
+        self._disk_hits = 0
+        self._batches = 0
+        self._batched_texts = 0
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+    def embed(self, text: str) -> List[float]:
+        """Return the embedding for a single text."""
+        return self.embed_many([text])[0]
+
+    def embed_many(self, texts: Sequence[str]) -> List[List[float]]:
+        """Return embeddings for ``texts`` in order, embedding only cache misses."""
+        keys = [cache_key(text, self.model) for text in texts]
+        results: Dict[str, Tuple[float, ...]] = {}
+
+        with self._lru_lock:
+            for key in keys:
+                vector = self._lru.get(key)
+                if vector is not None:
+                    self._lru.move_to_end(key)
+                    results[key] = vector
+        memory_hits = sum(1 for key in keys if key in results)
+
+        missing = [key for key in dict.fromkeys(keys) if key not in results]
+        disk_hits = 0
+        if missing and self._disk is not None:
+            from_disk = self._disk.get_many(missing)
+            for key, stored in from_disk.items():
+                results[key] = tuple(stored)
+                self._remember(key, results[key])
+            disk_hits = sum(1 for key in keys if key in from_disk)
+
+        texts_by_key: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            texts_by_key.setdefault(key, text)
+        futures = {
+            key: self._enqueue(key, texts_by_key[key])
+            for key in dict.fromkeys(keys)
+            if key not in results
+        }
+        for key, future in futures.items():
+            results[key] = future.result()
+
+        with self._stats_lock:
+            self._requests += len(keys)
+            self._memory_hits += memory_hits
+            self._disk_hits += disk_hits
+
+        return [list(results[key]) for key in keys]
+
+    def stats(self) -> Dict[str, float]:
+        """Hit rates and batching statistics since the cache was created."""
+        with self._stats_lock:
+            hits = self._memory_hits + self._disk_hits
+            return {
+                "requests": self._requests,
+                "memory_hits": self._memory_hits,
+                "disk_hits": self._disk_hits,
+                "hit_rate": hits / self._requests if self._requests else 0.0,
+                "batches": self._batches,
+                "avg_batch_size": (
+                    self._batched_texts / self._batches if self._batches else 0.0
+                ),
+            }
+
+    def close(self) -> None:
+        """Flush pending misses, stop the batching thread and close the disk tier."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._worker.join()
+        if self._disk is not None:
+            self._disk.close()
+
+    def __enter__(self) -> "EmbeddingCache":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+    def _remember(self, key: str, vector: Tuple[float, ...]) -> None:
+        with self._lru_lock:
+            self._lru[key] = vector
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+
+    def _enqueue(self, key: str, text: str) -> Future:
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("EmbeddingCache is closed")
+            future = self._inflight.get(key)
+            if future is not None:
+                return future
+            future = Future()
+            # A batch may have finished between the caller's LRU check and now.
+            with self._lru_lock:
+                vector = self._lru.get(key)
+            if vector is not None:
+                future.set_result(vector)
+                return future
+            self._inflight[key] = future
+            self._pending[key] = text
+            self._cond.notify()
+        return future
+
+    def _batch_loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending and self._closed:
+                    return
+                # Give other callers a chance to join this batch.
+                deadline = time.monotonic() + self.max_wait
+                while len(self._pending) < self.max_batch_size and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch: List[Tuple[str, str]] = []
+                while self._pending and len(batch) < self.max_batch_size:
+                    batch.append(self._pending.popitem(last=False))
+
+            self._flush(batch)
+
+    def _resolve(self, keys: List[str]) -> Dict[str, Future]:
+        """Take the in-flight futures for ``keys`` so new callers stop joining them."""
+        with self._cond:
+            return {key: self._inflight.pop(key) for key in keys}
+
+    def _flush(self, batch: List[Tuple[str, str]]) -> None:
+        keys = [key for key, _ in batch]
+        try:
+            vectors = self.embed_fn([text for _, text in batch])
+            if len(vectors) != len(batch):
+                raise ValueError(
+                    f"embed_fn returned {len(vectors)} vectors for {len(batch)} texts"
+                )
+        except Exception as e:
+            for future in self._resolve(keys).values():
+                future.set_exception(e)
+            return
+
+        items = [(key, tuple(vector)) for key, vector in zip(keys, vectors)]
+        # Fill the LRU before releasing the futures, so a caller arriving after
+        # this point hits the cache instead of starting another embedding.
+        for key, vector in items:
+            self._remember(key, vector)
+
+        with self._stats_lock:
+            self._batches += 1
+            self._batched_texts += len(batch)
+
+        futures = self._resolve(keys)
+        for key, vector in items:
+            futures[key].set_result(vector)
+
+        if self._disk is not None:
+            try:
+                self._disk.put_many(self.model, items)
+            except sqlite3.Error as e:
+                # The in-memory tier already has these; persistence is best effort.
+                print(f"Warning: failed to persist embeddings: {e}")
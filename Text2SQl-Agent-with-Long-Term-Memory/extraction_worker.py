@@ -0,0 +1,301 @@
+"""
+Background memory extraction, off the question-answering path.
+
+Extracting memories from a message pair (context retrieval, the extraction LLM
+call and the memory update) used to run before the answer was returned. With
+``ExtractionWorker`` the request handler only enqueues the pair and returns the
+SQL result right away:
+
+- the queue is a SQLite table, so pairs survive a restart; pairs claimed by a
+  worker that died are picked up again on the next start
+- each user's pairs are processed in order, by one worker thread at a time
+- all pending pairs of a user (up to ``max_batch``) are coalesced into one
+  extraction run
+- ``wait_for(user_id)`` blocks until every pair enqueued for that user so far
+  has been processed, giving read-your-writes for the user's next question
+"""
+
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+# Runs the extraction phase for one user over message pairs, oldest first.
+ExtractFn = Callable[[str, List[Tuple[str, str]]], None]
+
+_PENDING, _RUNNING, _FAILED = "pending", "running", "failed"
+
+
+@dataclass
+class Job:
+    id: int
+    user_id: str
+    user_message: str
+    ai_message: str
+    attempts: int
+
+
+class ExtractionQueue:
+    """Durable FIFO of message pairs awaiting extraction, claimed per user."""
+
+    def __init__(self, path: str) -> None:
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS extraction_jobs ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " user_id TEXT NOT NULL,"
+            " user_message TEXT NOT NULL,"
+            " ai_message TEXT NOT NULL,"
+            " state TEXT NOT NULL DEFAULT 'pending',"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " enqueued_at REAL NOT NULL,"
+            " error TEXT)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS extraction_jobs_user"
+            " ON extraction_jobs (user_id, state, id)"
+        )
+        self._conn.commit()
+
+    def enqueue(self, user_id: str, user_message: str, ai_message: str) -> int:
+        """Persist a message pair and return its sequence number."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO extraction_jobs"
+                " (user_id, user_message, ai_message, enqueued_at)"
+                " VALUES (?, ?, ?, ?)",
+                (user_id, user_message, ai_message, time.time()),
+            )
+            self._conn.commit()
+            return int(cursor.lastrowid or 0)
+
+    def recover(self) -> int:
+        """Return pairs left claimed by a previous process to the queue."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE extraction_jobs SET state = ? WHERE state = ?",
+                (_PENDING, _RUNNING),
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+    def claim(self, busy: Set[str], limit: int) -> List[Job]:
+        """
+        Claim up to ``limit`` pending pairs of the user with the oldest pending
+        pair, skipping users in ``busy``. Returns an empty list if none qualify.
+        """
+        with self._lock:
+            users = self._conn.execute(
+                "SELECT user_id FROM extraction_jobs WHERE state = ?"
+                " GROUP BY user_id ORDER BY MIN(id)",
+                (_PENDING,),
+            ).fetchall()
+            user_id = next((u for (u,) in users if u not in busy), None)
+            if user_id is None:
+                return []
+            rows = self._conn.execute(
+                "SELECT id, user_id, user_message, ai_message, attempts"
+                " FROM extraction_jobs WHERE user_id = ? AND state = ?"
+                " ORDER BY id LIMIT ?",
+                (user_id, _PENDING, limit),
+            ).fetchall()
+            self._conn.executemany(
+                "UPDATE extraction_jobs SET state = ? WHERE id = ?",
+                [(_RUNNING, row[0]) for row in rows],
+            )
+            self._conn.commit()
+        return [Job(*row) for row in rows]
+
+    def complete(self, jobs: List[Job]) -> None:
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM extraction_jobs WHERE id = ?", [(job.id,) for job in jobs]
+            )
+            self._conn.commit()
+
+    def retry(self, jobs: List[Job], error: str, max_attempts: int) -> int:
+        """Requeue ``jobs`` after a failed run; returns how many gave up."""
+        failed = [job for job in jobs if job.attempts + 1 >= max_attempts]
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE extraction_jobs SET state = ?, attempts = attempts + 1,"
+                " error = ? WHERE id = ?",
+                [
+                    (_FAILED if job in failed else _PENDING, error, job.id)
+                    for job in jobs
+                ],
+            )
+            self._conn.commit()
+        return len(failed)
+
+    def outstanding(self, user_id: str, up_to: int) -> int:
+        """Pending or running pairs for a user with a sequence up to ``up_to``."""
+        with self._lock:
+            (count,) = self._conn.execute(
+                "SELECT COUNT(*) FROM extraction_jobs"
+                " WHERE user_id = ? AND state IN (?, ?) AND id <= ?",
+                (user_id, _PENDING, _RUNNING, up_to),
+            ).fetchone()
+        return int(count)
+
+    def last_sequence(self, user_id: str) -> int:
+        with self._lock:
+            (last,) = self._conn.execute(
+                "SELECT MAX(id) FROM extraction_jobs"
+                " WHERE user_id = ? AND state IN (?, ?)",
+                (user_id, _PENDING, _RUNNING),
+            ).fetchone()
+        return int(last or 0)
+
+    def failed(self, user_id: Optional[str] = None) -> List[Tuple[int, str, str]]:
+        """``(id, user_id, error)`` of pairs that exhausted their attempts."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, user_id, error FROM extraction_jobs WHERE state = ?"
+                + (" AND user_id = ?" if user_id is not None else "")
+                + " ORDER BY id",
+                (_FAILED,) + ((user_id,) if user_id is not None else ()),
+            ).fetchall()
+        return [(int(i), u, e or "") for i, u, e in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class ExtractionWorker:
+    """
+    Thread pool draining an ``ExtractionQueue``.
+
+    Usage:
+        worker = ExtractionWorker("extraction_queue.db", agent.extract_memories)
+        worker.start()
+        # answering a question:
+        worker.wait_for(user_id, timeout=5)   # memories from earlier turns
+        sql, rows = agent.answer(user_id, question)
+        worker.submit(user_id, question, summary_of(rows))
+    """
+
+    def __init__(
+        self,
+        path: str,
+        extract: ExtractFn,
+        workers: int = 2,
+        max_batch: int = 16,
+        max_attempts: int = 3,
+        retry_delay: float = 1.0,
+    ) -> None:
+        if workers < 1 or max_batch < 1 or max_attempts < 1:
+            raise ValueError("workers, max_batch and max_attempts must be at least 1")
+        self.queue = ExtractionQueue(path)
+        self.extract = extract
+        self.workers = workers
+        self.max_batch = max_batch
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+
+        # Users with a batch in flight; guarded by the condition, which is
+        # also notified whenever a job is enqueued or a batch finishes.
+        self._busy: Set[str] = set()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._threads: List[threading.Thread] = []
+        self._stats: Dict[str, float] = {"runs": 0, "pairs": 0, "failures": 0}
+
+    def start(self) -> "ExtractionWorker":
+        self.queue.recover()
+        for i in range(self.workers):
+            thread = threading.Thread(
+                target=self._run, name=f"extraction-worker-{i}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def submit(self, user_id: str, user_message: str, ai_message: str) -> int:
+        """Queue a message pair for extraction and return immediately."""
+        sequence = self.queue.enqueue(user_id, user_message, ai_message)
+        with self._cond:
+            self._cond.notify_all()
+        return sequence
+
+    def wait_for(self, user_id: str, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until every pair submitted for ``user_id`` before this call has
+        been processed (or has failed for good). Returns False on timeout.
+        """
+        up_to = self.queue.last_sequence(user_id)
+        if not up_to:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self.queue.outstanding(user_id, up_to):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def stats(self) -> Dict[str, float]:
+        """Extraction runs, pairs processed and the average pairs per run."""
+        with self._cond:
+            stats = dict(self._stats)
+        stats["avg_pairs_per_run"] = (
+            stats["pairs"] / stats["runs"] if stats["runs"] else 0.0
+        )
+        return stats
+
+    def close(self) -> None:
+        """Stop after the batches in flight; unprocessed pairs stay queued."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self.queue.close()
+
+    def __enter__(self) -> "ExtractionWorker":
+        return self.start()
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        return
+                    jobs = self.queue.claim(self._busy, self.max_batch)
+                    if jobs:
+                        self._busy.add(jobs[0].user_id)
+                        break
+                    # Woken by submit() or a finished batch; the timeout also
+                    # picks up retries once their delay has passed.
+                    self._cond.wait(self.retry_delay)
+
+            user_id = jobs[0].user_id
+            pairs = [(job.user_message, job.ai_message) for job in jobs]
+            try:
+                self.extract(user_id, pairs)
+            except Exception as e:
+                print(f"Warning: memory extraction failed for user {user_id}: {e!r}")
+                with self._cond:
+                    gave_up = self.queue.retry(jobs, repr(e), self.max_attempts)
+                    self._stats["failures"] += 1
+                if gave_up < len(jobs):
+                    # The user stays busy, so the retry waits out the delay.
+                    time.sleep(self.retry_delay)
+            else:
+                # Under the condition, so wait_for() never sees the pairs gone
+                # before the stats reflect them.
+                with self._cond:
+                    self.queue.complete(jobs)
+                    self._stats["runs"] += 1
+                    self._stats["pairs"] += len(jobs)
+            with self._cond:
+                self._busy.discard(user_id)
+                self._cond.notify_all()
@@ -0,0 +1,609 @@
+"""
+Hot/cold lifecycle tiers for each user's long-term memories.
+
+Memories used to stay in the vector index forever, so retrieval got slower
+and noisier as they piled up. ``TieredMemoryIndex``:
+
+- scores each memory by how often and how recently it was retrieved: an
+  access count that halves every ``half_life_days`` without retrieval
+- keeps at most ``hot_cap`` memories per user in the hot index (overridable
+  per user with ``set_cap``); on overflow the lowest-scoring memories move to
+  the cold archive until the hot tier is back at ``low_water`` of the cap
+- stores the cold archive compressed in SQLite (zlib text, int8 vectors),
+  one segment per demotion batch
+- searches the cold archive only when the hot tier returns fewer than
+  ``min_hot_results`` matches above ``min_similarity``; cold memories that are
+  returned are promoted back to the hot tier
+
+The hot tier is an in-process numpy index loaded from the primary memory
+store with ``add``; the cold archive persists across restarts.
+
+Run ``python memory_tiers.py`` to benchmark retrieval on a synthetic user with
+100k memories, with and without tiering.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+DAY = 86_400.0
+
+
+def decay_score(weight: float, stamp: float, now: float, half_life: float) -> float:
+    """Access count ``weight`` recorded at ``stamp``, decayed to ``now``."""
+    return float(weight * 2.0 ** (-(now - stamp) / half_life))
+
+
+def _unit(vector: Sequence[float]) -> np.ndarray:
+    array = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(array))
+    return array / norm if norm else array
+
+
+def _top(similarities: np.ndarray, k: int, minimum: float) -> List[Tuple[int, float]]:
+    """Indices and values of the ``k`` largest similarities at or above ``minimum``."""
+    if len(similarities) > k:
+        rows = np.argpartition(-similarities, k - 1)[:k]
+    else:
+        rows = np.arange(len(similarities))
+    rows = rows[np.argsort(-similarities[rows])]
+    return [
+        (int(r), float(similarities[r])) for r in rows if similarities[r] >= minimum
+    ]
+
+
+@dataclass
+class TieredHit:
+    memory_id: str
+    content: str
+    similarity: float
+    tier: str  # "hot" or "cold"
+
+
+@dataclass
+class _Record:
+    memory_id: str
+    content: str
+    unit: np.ndarray
+    weight: float
+    stamp: float
+
+
+class _HotTier:
+    """One user's hot memories: unit vectors in a growable matrix plus scores."""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.cap: Optional[int] = None
+        self.cold_count = 0
+        self.ids: List[str] = []
+        self.contents: List[str] = []
+        self.rows: Dict[str, int] = {}
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+        self.weights = np.zeros(0)
+        self.stamps = np.zeros(0)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def put(self, record: _Record) -> None:
+        row = self.rows.get(record.memory_id)
+        if row is None:
+            row = len(self.ids)
+            dims = record.unit.shape[0]
+            if self.vectors.shape[1] != dims:
+                if row:
+                    raise ValueError(
+                        f"embedding has {dims} dimensions,"
+                        f" expected {self.vectors.shape[1]}"
+                    )
+                self.vectors = np.zeros((16, dims), dtype=np.float32)
+                self.weights, self.stamps = np.zeros(16), np.zeros(16)
+            elif row == self.vectors.shape[0]:
+                # Grow geometrically so adds stay amortized O(1).
+                self.vectors = np.vstack([self.vectors, np.zeros_like(self.vectors)])
+                self.weights = np.concatenate([self.weights, np.zeros(row)])
+                self.stamps = np.concatenate([self.stamps, np.zeros(row)])
+            self.ids.append(record.memory_id)
+            self.contents.append(record.content)
+            self.rows[record.memory_id] = row
+        else:
+            self.contents[row] = record.content
+        self.vectors[row] = record.unit
+        self.weights[row] = record.weight
+        self.stamps[row] = record.stamp
+
+    def scores(self, now: float, half_life: float) -> np.ndarray:
+        n = len(self.ids)
+        return np.asarray(
+            self.weights[:n] * np.exp2(-(now - self.stamps[:n]) / half_life)
+        )
+
+    def search(
+        self, unit: np.ndarray, k: int, minimum: float
+    ) -> List[Tuple[int, float]]:
+        if not self.ids or unit.shape[0] != self.vectors.shape[1]:
+            return []
+        return _top(self.vectors[: len(self.ids)] @ unit, k, minimum)
+
+    def touch(self, row: int, now: float, half_life: float) -> None:
+        self.weights[row] = self.scores(now, half_life)[row] + 1.0
+        self.stamps[row] = now
+
+    def take(self, rows: Sequence[int]) -> List[_Record]:
+        """Remove ``rows`` from the tier and return them."""
+        taken = [
+            _Record(
+                self.ids[r],
+                self.contents[r],
+                self.vectors[r].copy(),
+                float(self.weights[r]),
+                float(self.stamps[r]),
+            )
+            for r in rows
+        ]
+        keep = np.ones(len(self.ids), dtype=bool)
+        keep[list(rows)] = False
+        kept = np.flatnonzero(keep)
+        size = len(kept)
+        self.vectors[:size] = self.vectors[kept]
+        self.weights[:size] = self.weights[kept]
+        self.stamps[:size] = self.stamps[kept]
+        self.ids = [self.ids[i] for i in kept]
+        self.contents = [self.contents[i] for i in kept]
+        self.rows = {memory_id: i for i, memory_id in enumerate(self.ids)}
+        return taken
+
+
+class _ColdArchive:
+    """
+    Compressed SQLite archive of demoted memories.
+
+    Each demotion batch is stored as one segment: an int8-quantized matrix of
+    the unit vectors plus zlib-compressed ids, texts and scores. A search reads
+    only the vector blobs and decompresses the segments holding the best
+    matches.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cold_segments ("
+            " segment INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " user_id TEXT NOT NULL,"
+            " dims INTEGER NOT NULL,"
+            " vectors BLOB NOT NULL,"
+            " records BLOB NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS cold_segments_user ON cold_segments (user_id)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cold_ids ("
+            " user_id TEXT NOT NULL,"
+            " id TEXT NOT NULL,"
+            " segment INTEGER NOT NULL,"
+            " PRIMARY KEY (user_id, id))"
+        )
+        self._conn.commit()
+
+    def _insert(self, user_id: str, records: Sequence[_Record]) -> None:
+        vectors = np.round(np.stack([r.unit for r in records]) * 127).astype(np.int8)
+        payload = [[r.memory_id, r.content, r.weight, r.stamp] for r in records]
+        cursor = self._conn.execute(
+            "INSERT INTO cold_segments (user_id, dims, vectors, records)"
+            " VALUES (?, ?, ?, ?)",
+            (
+                user_id,
+                vectors.shape[1],
+                vectors.tobytes(),
+                zlib.compress(json.dumps(payload).encode("utf-8")),
+            ),
+        )
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO cold_ids (user_id, id, segment) VALUES (?, ?, ?)",
+            [(user_id, r.memory_id, cursor.lastrowid) for r in records],
+        )
+
+    def _load(self, segment: int) -> List[_Record]:
+        dims, vectors, records = self._conn.execute(
+            "SELECT dims, vectors, records FROM cold_segments WHERE segment = ?",
+            (segment,),
+        ).fetchone()
+        matrix = np.frombuffer(vectors, dtype=np.int8).reshape(-1, dims)
+        return [
+            _Record(memory_id, content, _unit(matrix[i]), weight, stamp)
+            for i, (memory_id, content, weight, stamp) in enumerate(
+                json.loads(zlib.decompress(records))
+            )
+        ]
+
+    def put_many(self, user_id: str, records: Sequence[_Record]) -> None:
+        if not records:
+            return
+        with self._lock:
+            self._insert(user_id, records)
+            self._conn.commit()
+
+    def search(
+        self, user_id: str, unit: np.ndarray, k: int, minimum: float
+    ) -> List[Tuple[_Record, float]]:
+        with self._lock:
+            segments = self._conn.execute(
+                "SELECT segment, vectors FROM cold_segments"
+                " WHERE user_id = ? AND dims = ?",
+                (user_id, unit.shape[0]),
+            ).fetchall()
+        if not segments:
+            return []
+        matrix = np.frombuffer(
+            b"".join(blob for _, blob in segments), dtype=np.int8
+        ).reshape(-1, unit.shape[0])
+        # Segment id and offset of every archived row.
+        sizes = [len(blob) // unit.shape[0] for _, blob in segments]
+        owners = np.repeat([segment for segment, _ in segments], sizes)
+        starts = np.repeat(np.cumsum([0] + sizes[:-1]), sizes)
+
+        best = _top(matrix.astype(np.float32) @ (unit / 127), k, minimum)
+        results = []
+        with self._lock:
+            loaded: Dict[int, List[_Record]] = {}
+            for row, similarity in best:
+                segment = int(owners[row])
+                if segment not in loaded:
+                    loaded[segment] = self._load(segment)
+                results.append((loaded[segment][row - int(starts[row])], similarity))
+        return results
+
+    def delete(self, user_id: str, ids: Sequence[str]) -> int:
+        """Remove memories, rewriting the segments that held them."""
+        with self._lock:
+            placeholders = ",".join("?" * len(ids))
+            found = self._conn.execute(
+                "SELECT id, segment FROM cold_ids"
+                f" WHERE user_id = ? AND id IN ({placeholders})",
+                [user_id, *ids],
+            ).fetchall()
+            if not found:
+                return 0
+            gone = {memory_id for memory_id, _ in found}
+            for segment in {segment for _, segment in found}:
+                remaining = [r for r in self._load(segment) if r.memory_id not in gone]
+                self._conn.execute(
+                    "DELETE FROM cold_segments WHERE segment = ?", (segment,)
+                )
+                if remaining:
+                    self._insert(user_id, remaining)
+            self._conn.executemany(
+                "DELETE FROM cold_ids WHERE user_id = ? AND id = ?",
+                [(user_id, memory_id) for memory_id in gone],
+            )
+            self._conn.commit()
+        return len(gone)
+
+    def count(self, user_id: str) -> int:
+        with self._lock:
+            (count,) = self._conn.execute(
+                "SELECT COUNT(*) FROM cold_ids WHERE user_id = ?", (user_id,)
+            ).fetchone()
+        return int(count)
+
+    def size_bytes(self, user_id: str) -> int:
+        """Stored bytes of compressed records and vectors for a user."""
+        with self._lock:
+            (size,) = self._conn.execute(
+                "SELECT COALESCE(SUM(LENGTH(vectors) + LENGTH(records)), 0)"
+                " FROM cold_segments WHERE user_id = ?",
+                (user_id,),
+            ).fetchone()
+        return int(size)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class TieredMemoryIndex:
+    """
+    Per-user hot index of memories with a compressed cold archive behind it.
+
+    Usage:
+        index = TieredMemoryIndex("memory_archive.db", hot_cap=5_000)
+        for memory in store.load(user_id):
+            index.add(user_id, memory.id, memory.content, memory.embedding)
+        hits = index.search(user_id, embed(question), k=5)
+        index.sweep()   # e.g. nightly: archive memories that went stale
+    """
+
+    def __init__(
+        self,
+        archive_path: str = ":memory:",
+        hot_cap: Optional[int] = 10_000,
+        low_water: float = 0.9,
+        half_life_days: float = 30.0,
+        min_similarity: float = 0.5,
+        min_hot_results: int = 1,
+        stale_score: float = 0.05,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        if hot_cap is not None and hot_cap < 1:
+            raise ValueError("hot_cap must be at least 1 (or None for no cap)")
+        if not 0 < low_water <= 1:
+            raise ValueError("low_water must be in (0, 1]")
+        self.hot_cap = hot_cap
+        self.low_water = low_water
+        self.half_life = half_life_days * DAY
+        self.min_similarity = min_similarity
+        self.min_hot_results = min_hot_results
+        self.stale_score = stale_score
+        self.clock = clock
+        self._archive = _ColdArchive(archive_path)
+        self._users: Dict[str, _HotTier] = {}
+        self._lock = threading.Lock()
+        self._stats = {"searches": 0, "cold_searches": 0, "promoted": 0, "demoted": 0}
+
+    def _user(self, user_id: str) -> _HotTier:
+        with self._lock:
+            user = self._users.get(user_id)
+            if user is None:
+                user = self._users[user_id] = _HotTier()
+                user.cold_count = self._archive.count(user_id)
+            return user
+
+    def set_cap(self, user_id: str, cap: Optional[int]) -> None:
+        """Override the hot tier size for one user (``None`` restores the default)."""
+        user = self._user(user_id)
+        with user.lock:
+            user.cap = cap
+            self._enforce_cap(user_id, user, self.clock())
+
+    def add(
+        self, user_id: str, memory_id: str, content: str, embedding: Sequence[float]
+    ) -> None:
+        """Add or replace a memory; new memories start hot with one access."""
+        user = self._user(user_id)
+        now = self.clock()
+        with user.lock:
+            if user.cold_count and self._archive.delete(user_id, [memory_id]):
+                user.cold_count -= 1
+            user.put(_Record(memory_id, content, _unit(embedding), 1.0, now))
+            self._enforce_cap(user_id, user, now)
+
+    def remove(self, user_id: str, memory_id: str) -> bool:
+        """Delete a memory from whichever tier holds it."""
+        user = self._user(user_id)
+        with user.lock:
+            if memory_id in user.rows:
+                user.take([user.rows[memory_id]])
+                return True
+            if user.cold_count and self._archive.delete(user_id, [memory_id]):
+                user.cold_count -= 1
+                return True
+        return False
+
+    def search(
+        self, user_id: str, embedding: Sequence[float], k: int = 5
+    ) -> List[TieredHit]:
+        """Top ``k`` memories above ``min_similarity``, hot tier first."""
+        unit = _unit(embedding)
+        now = self.clock()
+        user = self._user(user_id)
+        with user.lock:
+            hits = [
+                TieredHit(user.ids[row], user.contents[row], similarity, "hot")
+                for row, similarity in user.search(unit, k, self.min_similarity)
+            ]
+            promoted: List[_Record] = []
+            searched_cold = len(hits) < self.min_hot_results and user.cold_count > 0
+            if searched_cold:
+                cold = self._archive.search(user_id, unit, k, self.min_similarity)
+                for record, similarity in cold:
+                    hits.append(
+                        TieredHit(record.memory_id, record.content, similarity, "cold")
+                    )
+                hits = sorted(hits, key=lambda h: h.similarity, reverse=True)[:k]
+                returned = {hit.memory_id for hit in hits}
+                promoted = [r for r, _ in cold if r.memory_id in returned]
+
+            for hit in hits:
+                if hit.tier == "hot":
+                    user.touch(user.rows[hit.memory_id], now, self.half_life)
+            if promoted:
+                user.cold_count -= self._archive.delete(
+                    user_id, [r.memory_id for r in promoted]
+                )
+                for record in promoted:
+                    user.put(record)
+                    user.touch(user.rows[record.memory_id], now, self.half_life)
+                self._enforce_cap(user_id, user, now, protect=returned)
+
+        with self._lock:
+            self._stats["searches"] += 1
+            self._stats["cold_searches"] += int(searched_cold)
+            self._stats["promoted"] += len(promoted)
+        return hits
+
+    def score(self, user_id: str, memory_id: str) -> Optional[float]:
+        """Current decay score of a hot memory, or None if it is not hot."""
+        user = self._user(user_id)
+        with user.lock:
+            row = user.rows.get(memory_id)
+            if row is None:
+                return None
+            return float(user.scores(self.clock(), self.half_life)[row])
+
+    def sweep(self) -> int:
+        """Archive hot memories whose score fell below ``stale_score``."""
+        now = self.clock()
+        with self._lock:
+            users = list(self._users.items())
+        demoted = 0
+        for user_id, user in users:
+            with user.lock:
+                stale = np.flatnonzero(
+                    user.scores(now, self.half_life) < self.stale_score
+                )
+                demoted += self._demote(user_id, user, stale.tolist())
+        return demoted
+
+    def counts(self, user_id: str) -> Tuple[int, int]:
+        """``(hot, cold)`` memory counts for a user."""
+        user = self._user(user_id)
+        with user.lock:
+            return len(user), user.cold_count
+
+    def cold_size_bytes(self, user_id: str) -> int:
+        return self._archive.size_bytes(user_id)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats)
+
+    def close(self) -> None:
+        self._archive.close()
+
+    def _enforce_cap(
+        self,
+        user_id: str,
+        user: _HotTier,
+        now: float,
+        protect: Optional[Set[str]] = None,
+    ) -> None:
+        cap = user.cap if user.cap is not None else self.hot_cap
+        if cap is None or len(user) <= cap:
+            return
+        target = max(1, int(cap * self.low_water))
+        scores = user.scores(now, self.half_life)
+        for memory_id in protect or ():
+            scores[user.rows[memory_id]] = np.inf
+        excess = len(user) - target
+        lowest = np.argpartition(scores, excess - 1)[:excess]
+        self._demote(user_id, user, lowest.tolist())
+
+    def _demote(self, user_id: str, user: _HotTier, rows: List[int]) -> int:
+        if not rows:
+            return 0
+        records = user.take(rows)
+        self._archive.put_many(user_id, records)
+        user.cold_count += len(records)
+        with self._lock:
+            self._stats["demoted"] += len(records)
+        return len(records)
+
+
+# -------------------------
+# Benchmark
+# -------------------------
+def run_benchmark(
+    memories: int = 100_000,
+    hot_cap: int = 5_000,
+    dims: int = 128,
+    queries: int = 2_000,
+    k: int = 5,
+    seed: int = 0,
+) -> Dict[str, Dict[str, float]]:
+    """
+    Replay the same synthetic history against a flat index (no cap) and a
+    tiered one, then measure retrieval on a final batch of queries.
+
+    A third of the memories are stale near-duplicates of another memory (an
+    earlier wording that was never retrieved again). Queries are a noisy copy
+    of one current memory: 60% among the 2,000 newest, 35% among 100 old
+    favourites, 5% anywhere. A query hits if its target is returned; noise is
+    the number of other memories returned with it.
+    """
+    rng = np.random.default_rng(seed)
+    base = rng.standard_normal((memories, dims)).astype(np.float32)
+    base /= np.linalg.norm(base, axis=1, keepdims=True)
+    stale = np.zeros(memories, dtype=bool)
+    for i in range(memories // 3, memories, 3):
+        # Memory i is a rewording of a random earlier memory, which it supersedes.
+        original = int(rng.integers(0, i))
+        noise = rng.standard_normal(dims).astype(np.float32)
+        base[i] = _unit(base[original] + 0.45 * noise / np.linalg.norm(noise))
+        stale[original] = True
+    favourites = rng.choice(np.flatnonzero(~stale[: memories // 10]), 100, False)
+
+    def pick(added: int) -> int:
+        while True:
+            roll = rng.random()
+            if roll < 0.6:
+                target = int(rng.integers(max(0, added - 2_000), added))
+            elif roll < 0.95 and (favourites < added).any():
+                target = int(rng.choice(favourites[favourites < added]))
+            else:
+                target = int(rng.integers(0, added))
+            if not stale[target]:
+                return target
+
+    def query_for(target: int) -> List[float]:
+        noise = rng.standard_normal(dims).astype(np.float32)
+        vector: List[float] = (
+            base[target] + 0.5 * noise / np.linalg.norm(noise)
+        ).tolist()
+        return vector
+
+    # Both indexes see the same adds and queries at the same simulated times.
+    clock = [0.0]
+    flat = TieredMemoryIndex(hot_cap=None, min_similarity=0.6, clock=lambda: clock[0])
+    tiered = TieredMemoryIndex(
+        hot_cap=hot_cap, min_similarity=0.6, clock=lambda: clock[0]
+    )
+    step = 180 * DAY / memories
+    for i in range(memories):
+        clock[0] += step
+        for index in (flat, tiered):
+            index.add("user", str(i), f"memory {i}", base[i])
+        if i >= 1_000 and i % 25 == 0:
+            vector = query_for(pick(i + 1))
+            for index in (flat, tiered):
+                index.search("user", vector, k)
+
+    report: Dict[str, Dict[str, float]] = {}
+    workload = [(t, query_for(t)) for t in (pick(memories) for _ in range(queries))]
+    for name, index in (("flat", flat), ("tiered", tiered)):
+        before = index.stats()["cold_searches"]
+        latencies: List[float] = []
+        hits = returned_noise = 0
+        for target, vector in workload:
+            start = time.perf_counter()
+            found = index.search("user", vector, k)
+            latencies.append(time.perf_counter() - start)
+            ids = {hit.memory_id for hit in found}
+            hits += str(target) in ids
+            returned_noise += len(ids - {str(target)})
+        latencies.sort()
+        hot, cold = index.counts("user")
+        report[name] = {
+            "hot": float(hot),
+            "cold": float(cold),
+            "cold_mb": float(index.cold_size_bytes("user")) / 1e6,
+            "p50_ms": 1000 * latencies[len(latencies) // 2],
+            "p95_ms": 1000 * latencies[int(0.95 * len(latencies))],
+            "p99_ms": 1000 * latencies[int(0.99 * len(latencies))],
+            "mean_ms": 1000 * sum(latencies) / len(latencies),
+            "hit_rate": hits / queries,
+            "noise_per_query": returned_noise / queries,
+            "cold_search_rate": (index.stats()["cold_searches"] - before) / queries,
+        }
+        index.close()
+    return report
+
+
+def _benchmark() -> None:
+    report = run_benchmark()
+    print(f"{'100k memories':<18} | {'flat':>10} | {'tiered':>10}")
+    for metric in report["flat"]:
+        flat, tiered = report["flat"][metric], report["tiered"][metric]
+        print(f"{metric:<18} | {flat:>10.3f} | {tiered:>10.3f}")
+
+
+if __name__ == "__main__":
+    _benchmark()
@@ -0,0 +1,531 @@
+"""
+Batched memory-update phase for extracted facts.
+
+The update phase used to run, for every fact extracted from a message pair,
+its own similarity search, its own ADD/UPDATE/DELETE/NO CHANGE classification
+call and its own storage write. ``MemoryUpdater.update`` handles all facts
+from one message pair together:
+
+- one batched embedding call for the facts
+- one multi-vector similarity query (``search_many``)
+- one LLM call that classifies every fact against its candidate memories
+- one transaction applying the result, with inserts, updates and deletes
+  each sent as a single ``execute_values`` statement
+
+``PostgresMemoryStore`` runs against pgvector through a pooled ``psycopg2``
+connection. ``SQLiteMemoryStore`` is a local stand-in for tests and
+development; it goes through the same write path with an ``execute_values``
+shim and scores similarity with numpy.
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Protocol,
+    Sequence,
+    Set,
+    Tuple,
+)
+
+import numpy as np
+
+from embedding_cache import EmbedFn
+
+# Takes a prompt and returns the model's text completion.
+LLMFn = Callable[[str], str]
+# Same signature as ``psycopg2.extras.execute_values``.
+ExecuteValues = Callable[..., Any]
+
+CLASSIFY_PROMPT = """You manage a user's long-term memories for a Text2SQL assistant.
+Compare each new fact below with the existing memories listed under it and
+choose one operation per fact:
+- ADD: the fact is new information
+- UPDATE: the fact refines or corrects an existing memory; give its id and the
+  merged memory text
+- DELETE: the fact means an existing memory no longer holds; give its id
+- NONE: the fact is already covered
+
+Reply with a JSON array only, one object per fact, for example:
+[{{"fact": 1, "operation": "UPDATE", "memory_id": "abc", "text": "..."}}]
+
+New facts:
+{facts}
+"""
+
+
+@dataclass
+class Match:
+    memory_id: str
+    content: str
+    score: float
+
+
+@dataclass
+class MemoryOperation:
+    kind: str  # ADD, UPDATE, DELETE or NONE
+    fact: str
+    memory_id: Optional[str] = None
+    content: Optional[str] = None
+    embedding: Optional[List[float]] = field(default=None, repr=False, compare=False)
+
+
+@dataclass
+class UpdateStats:
+    batches: int = 0
+    facts: int = 0
+    embed_calls: int = 0
+    searches: int = 0
+    llm_calls: int = 0
+    transactions: int = 0
+
+
+class MemoryStore(Protocol):
+    def search_many(
+        self, user_id: str, embeddings: Sequence[Sequence[float]], limit: int
+    ) -> List[List[Match]]: ...
+
+    def apply(self, user_id: str, operations: Sequence[MemoryOperation]) -> None: ...
+
+
+def build_prompt(facts: Sequence[str], candidates: Sequence[Sequence[Match]]) -> str:
+    """Render every fact with its candidate memories into one classification prompt."""
+    lines = []
+    for number, (fact, matches) in enumerate(zip(facts, candidates), start=1):
+        lines.append(f"{number}. {fact}")
+        for match in matches:
+            lines.append(
+                f"   existing [{match.memory_id}] {match.content}"
+                f" (similarity {match.score:.2f})"
+            )
+        if not matches:
+            lines.append("   existing: none")
+    return CLASSIFY_PROMPT.format(facts="\n".join(lines))
+
+
+def parse_operations(
+    reply: str, facts: Sequence[str], candidates: Sequence[Sequence[Match]]
+) -> List[MemoryOperation]:
+    """
+    Turn the classifier's JSON reply into one operation per fact.
+
+    UPDATE and DELETE must name one of that fact's candidate memories, and each
+    memory is changed at most once. Anything else becomes NONE. Facts the reply
+    leaves out are added if nothing similar exists, otherwise left alone.
+    """
+    found = re.search(r"\[.*\]", reply, re.DOTALL)
+    try:
+        items = json.loads(found.group(0)) if found else []
+    except json.JSONDecodeError:
+        items = []
+
+    decided: Dict[int, MemoryOperation] = {}
+    touched: Set[str] = set()
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict):
+            continue
+        try:
+            index = int(item["fact"]) - 1
+        except (KeyError, TypeError, ValueError):
+            continue
+        if not 0 <= index < len(facts) or index in decided:
+            continue
+        fact = facts[index]
+        kind = str(item.get("operation", "")).upper()
+        memory_id = item.get("memory_id")
+        text = " ".join(str(item.get("text") or fact).split())
+
+        if kind == "ADD":
+            decided[index] = MemoryOperation("ADD", fact, content=text)
+        elif (
+            kind in ("UPDATE", "DELETE")
+            and memory_id in {m.memory_id for m in candidates[index]}
+            and memory_id not in touched
+        ):
+            touched.add(memory_id)
+            content = text if kind == "UPDATE" else None
+            decided[index] = MemoryOperation(kind, fact, memory_id, content)
+        else:
+            decided[index] = MemoryOperation("NONE", fact)
+
+    for index, fact in enumerate(facts):
+        if index not in decided:
+            kind = "NONE" if candidates[index] else "ADD"
+            decided[index] = MemoryOperation(
+                kind, fact, content=fact if kind == "ADD" else None
+            )
+    return [decided[index] for index in range(len(facts))]
+
+
+# -------------------------
+# Shared write path
+# -------------------------
+@dataclass(frozen=True)
+class _WriteSQL:
+    insert: str
+    update: str
+    delete: str
+
+
+def _write(
+    cursor: Any,
+    execute_values: ExecuteValues,
+    sql: _WriteSQL,
+    user_id: str,
+    operations: Sequence[MemoryOperation],
+    encode: Callable[[Sequence[float]], Any],
+    now: Any,
+) -> None:
+    """Send all inserts, updates and deletes as one statement each."""
+    inserts, updates, deletes = [], [], []
+    for op in operations:
+        if op.kind == "ADD" and op.embedding is not None:
+            inserts.append(
+                (op.memory_id, user_id, op.content, encode(op.embedding), now, now)
+            )
+        elif op.kind == "UPDATE" and op.embedding is not None:
+            updates.append(
+                (op.memory_id, user_id, op.content, encode(op.embedding), now)
+            )
+        elif op.kind == "DELETE":
+            deletes.append((op.memory_id, user_id))
+    for statement, rows in (
+        (sql.insert, inserts),
+        (sql.update, updates),
+        (sql.delete, deletes),
+    ):
+        if rows:
+            execute_values(cursor, statement, rows, page_size=len(rows))
+
+
+def _group(rows: Sequence[Tuple[Any, ...]], count: int) -> List[List[Match]]:
+    """Group ``(query index, id, content, score)`` rows per query, best first."""
+    grouped: List[List[Match]] = [[] for _ in range(count)]
+    for index, memory_id, content, score in rows:
+        grouped[int(index)].append(Match(memory_id, content, float(score)))
+    for matches in grouped:
+        matches.sort(key=lambda m: m.score, reverse=True)
+    return grouped
+
+
+# -------------------------
+# Postgres + pgvector
+# -------------------------
+def _pg_vector(vector: Sequence[float]) -> str:
+    return "[" + ",".join(f"{x:.7g}" for x in vector) + "]"
+
+
+class PostgresMemoryStore:
+    """
+    pgvector-backed store using a ``psycopg2`` connection pool.
+
+    Expects a table with ``id``, ``user_id``, ``content``, ``embedding vector``,
+    ``created_at`` and ``updated_at`` columns.
+
+    Usage:
+        store = PostgresMemoryStore.from_dsn(os.getenv("PG_CONN_STRING"))
+        updater = MemoryUpdater(store, llm, embed_fn)
+    """
+
+    def __init__(self, pool: Any, table: str = "memories") -> None:
+        self._pool = pool
+        self._search_sql = (
+            "SELECT q.idx, m.id, m.content, 1 - (m.embedding <=> q.embedding::vector)"
+            " FROM (VALUES %s) AS q(idx, user_id, embedding)"
+            f" CROSS JOIN LATERAL (SELECT id, content, embedding FROM {table}"
+            f" WHERE {table}.user_id = q.user_id"
+            " ORDER BY embedding <=> q.embedding::vector LIMIT {limit}) AS m"
+        )
+        self._sql = _WriteSQL(
+            insert=(
+                f"INSERT INTO {table}"
+                " (id, user_id, content, embedding, created_at, updated_at)"
+                " VALUES %s"
+            ),
+            update=(
+                f"UPDATE {table} AS m SET content = v.content,"
+                " embedding = v.embedding::vector,"
+                " updated_at = v.updated_at::timestamptz"
+                " FROM (VALUES %s) AS v(id, user_id, content, embedding, updated_at)"
+                " WHERE m.id = v.id AND m.user_id = v.user_id"
+            ),
+            delete=f"DELETE FROM {table} WHERE (id, user_id) IN (VALUES %s)",
+        )
+
+    @classmethod
+    def from_dsn(
+        cls,
+        dsn: Optional[str] = None,
+        minconn: int = 1,
+        maxconn: int = 4,
+        table: str = "memories",
+    ) -> "PostgresMemoryStore":
+        from psycopg2.pool import ThreadedConnectionPool  # type: ignore[import-untyped]
+
+        dsn = dsn or os.environ["PG_CONN_STRING"]
+        return cls(ThreadedConnectionPool(minconn, maxconn, dsn), table)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[Any]:
+        conn = self._pool.getconn()
+        try:
+            # Commits on success and rolls back on error; the connection stays open.
+            with conn:
+                with conn.cursor() as cursor:
+                    yield cursor
+        finally:
+            self._pool.putconn(conn)
+
+    def search_many(
+        self, user_id: str, embeddings: Sequence[Sequence[float]], limit: int
+    ) -> List[List[Match]]:
+        from psycopg2.extras import execute_values  # type: ignore[import-untyped]
+
+        if not embeddings:
+            return []
+        rows = [(i, user_id, _pg_vector(v)) for i, v in enumerate(embeddings)]
+        with self._transaction() as cursor:
+            found = execute_values(
+                cursor,
+                self._search_sql.replace("{limit}", str(int(limit))),
+                rows,
+                page_size=len(rows),
+                fetch=True,
+            )
+        return _group(found, len(embeddings))
+
+    def apply(self, user_id: str, operations: Sequence[MemoryOperation]) -> None:
+        from psycopg2.extras import execute_values  # type: ignore[import-untyped]
+
+        with self._transaction() as cursor:
+            _write(
+                cursor,
+                execute_values,
+                self._sql,
+                user_id,
+                operations,
+                _pg_vector,
+                datetime.now(timezone.utc),
+            )
+
+    def close(self) -> None:
+        self._pool.closeall()
+
+
+# -------------------------
+# SQLite stand-in
+# -------------------------
+def sqlite_execute_values(
+    cursor: sqlite3.Cursor,
+    sql: str,
+    argslist: Sequence[Sequence[Any]],
+    template: Optional[str] = None,
+    page_size: int = 100,
+    fetch: bool = False,
+) -> Optional[List[Any]]:
+    """``psycopg2.extras.execute_values`` for sqlite3 cursors."""
+    results: List[Any] = []
+    for start in range(0, len(argslist), page_size):
+        page = argslist[start : start + page_size]
+        values = ",".join("(" + ",".join("?" * len(row)) + ")" for row in page)
+        cursor.execute(
+            sql.replace("%s", values, 1), [value for row in page for value in row]
+        )
+        if fetch:
+            results.extend(cursor.fetchall())
+    return results if fetch else None
+
+
+def _blob(vector: Sequence[float]) -> bytes:
+    return np.asarray(vector, dtype=np.float32).tobytes()
+
+
+def _unit_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+class SQLiteMemoryStore:
+    """
+    Local stand-in for ``PostgresMemoryStore``.
+
+    Writes use the same statements shape and a single transaction per batch;
+    a search loads the user's vectors in one query and scores every query
+    vector against them at once.
+    """
+
+    def __init__(
+        self,
+        path: str = ":memory:",
+        table: str = "memories",
+        execute_values: ExecuteValues = sqlite_execute_values,
+    ) -> None:
+        self._table = table
+        self._execute_values = execute_values
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            " id TEXT PRIMARY KEY,"
+            " user_id TEXT NOT NULL,"
+            " content TEXT NOT NULL,"
+            " embedding BLOB NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self._sql = _WriteSQL(
+            insert=(
+                f"INSERT INTO {table}"
+                " (id, user_id, content, embedding, created_at, updated_at)"
+                " VALUES %s"
+            ),
+            update=(
+                f"UPDATE {table} SET content = v.column3, embedding = v.column4,"
+                " updated_at = v.column5 FROM (VALUES %s) AS v"
+                f" WHERE {table}.id = v.column1 AND {table}.user_id = v.column2"
+            ),
+            delete=f"DELETE FROM {table} WHERE (id, user_id) IN (VALUES %s)",
+        )
+        self.transactions = 0
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Cursor]:
+        with self._lock:
+            cursor = self._conn.cursor()
+            try:
+                yield cursor
+                self._conn.commit()
+                self.transactions += 1
+            except BaseException:
+                self._conn.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def search_many(
+        self, user_id: str, embeddings: Sequence[Sequence[float]], limit: int
+    ) -> List[List[Match]]:
+        if not embeddings:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, content, embedding FROM {self._table} WHERE user_id = ?",
+                (user_id,),
+            ).fetchall()
+        if not rows:
+            return [[] for _ in embeddings]
+
+        stored = _unit_rows(
+            np.stack([np.frombuffer(blob, dtype=np.float32) for _, _, blob in rows])
+        )
+        queries = _unit_rows(np.asarray(embeddings, dtype=np.float32))
+        scores = queries @ stored.T
+        found = []
+        for index, row in enumerate(scores):
+            for best in np.argsort(-row)[:limit]:
+                memory_id, content, _ = rows[best]
+                found.append((index, memory_id, content, row[best]))
+        return _group(found, len(embeddings))
+
+    def apply(self, user_id: str, operations: Sequence[MemoryOperation]) -> None:
+        with self._transaction() as cursor:
+            _write(
+                cursor,
+                self._execute_values,
+                self._sql,
+                user_id,
+                operations,
+                _blob,
+                time.time(),
+            )
+
+    def memories(self, user_id: str) -> Dict[str, str]:
+        """``{memory_id: content}`` for a user."""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, content FROM {self._table} WHERE user_id = ?",
+                (user_id,),
+            ).fetchall()
+        return dict(rows)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class MemoryUpdater:
+    """
+    Applies the facts extracted from one message pair in a single batch.
+
+    Usage:
+        updater = MemoryUpdater(store, openai_llm, embedding_cache.embed_many)
+        operations = updater.update(user_id, extracted_facts)
+        if any(op.kind != "NONE" for op in operations):
+            query_cache.invalidate_user(user_id)
+    """
+
+    def __init__(
+        self, store: MemoryStore, llm: LLMFn, embed_fn: EmbedFn, top_k: int = 3
+    ) -> None:
+        self.store = store
+        self.llm = llm
+        self.embed_fn = embed_fn
+        self.top_k = top_k
+        self.stats = UpdateStats()
+
+    def update(self, user_id: str, facts: Sequence[str]) -> List[MemoryOperation]:
+        """Classify and apply ``facts``; returns one operation per distinct fact."""
+        unique = list(dict.fromkeys(" ".join(f.split()) for f in facts if f.strip()))
+        if not unique:
+            return []
+
+        vectors = self.embed_fn(unique)
+        self.stats.embed_calls += 1
+        candidates = self.store.search_many(user_id, vectors, self.top_k)
+        reply = self.llm(build_prompt(unique, candidates))
+        operations = parse_operations(reply, unique, candidates)
+        writes = [op for op in operations if op.kind != "NONE"]
+        self._attach_embeddings(writes, dict(zip(unique, vectors)))
+        if writes:
+            self.store.apply(user_id, writes)
+
+        self.stats.batches += 1
+        self.stats.facts += len(unique)
+        self.stats.searches += 1
+        self.stats.llm_calls += 1
+        self.stats.transactions += 1 if writes else 0
+        return operations
+
+    def _attach_embeddings(
+        self, operations: Sequence[MemoryOperation], known: Dict[str, List[float]]
+    ) -> None:
+        """Give new and rewritten memories an id and a vector for their final text."""
+        texts = list(
+            dict.fromkeys(
+                op.content
+                for op in operations
+                if op.content is not None and op.content not in known
+            )
+        )
+        if texts:
+            known = {**known, **dict(zip(texts, self.embed_fn(texts)))}
+            self.stats.embed_calls += 1
+        for op in operations:
+            if op.kind == "ADD":
+                op.memory_id = uuid.uuid4().hex
+            if op.content is not None:
+                op.embedding = list(known[op.content])
@@ -0,0 +1,310 @@
+"""
+Semantic query-plan cache for repeated Text2SQL questions.
+
+Analysts ask close paraphrases of the same questions ("top interest-rate loans"
+vs "loans with highest interest rates"). Instead of running memory retrieval,
+schema lookup and SQL generation every time, this cache stores the generated
+SQL per user, keyed by:
+
+- the question embedding (matched by cosine similarity above a threshold)
+- a fingerprint of the user's active preferences
+- the database schema version
+
+Entries are dropped when the user's memories change (``invalidate_user``) or
+the schema changes (``invalidate_schema``). ``invalidate_user`` also bumps the
+user's epoch, so SQL generated from memories read before the invalidation is
+not stored afterwards. Generation latency is recorded separately for hits and
+misses.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import (
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Protocol,
+    Sequence,
+    Tuple,
+)
+
+import numpy as np
+
+
+class Embedder(Protocol):
+    def embed(self, text: str) -> List[float]: ...
+
+
+def preferences_fingerprint(preferences: Iterable[str]) -> str:
+    """Order-independent hash of the user's active preference memories."""
+    canonical = json.dumps(sorted(" ".join(p.split()) for p in preferences))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+def _unit(vector: Sequence[float]) -> np.ndarray:
+    array = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(array))
+    return array / norm if norm else array
+
+
+@dataclass
+class CachedQuery:
+    question: str
+    sql: str
+    database: str
+    schema_version: str
+    preferences_fp: str
+    created_at: float = field(default_factory=time.time)
+    hits: int = 0
+
+
+class _UserEntries:
+    """One user's cached queries plus a matrix of their unit-norm embeddings."""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.entries: List[CachedQuery] = []
+        self.matrix: Optional[np.ndarray] = None
+
+    def append(self, entry: CachedQuery, unit: np.ndarray, limit: int) -> None:
+        row = unit[np.newaxis, :]
+        if self.matrix is None or self.matrix.shape[1] != unit.shape[0]:
+            # First entry, or the embedding model changed: start over.
+            self.entries, self.matrix = [], row
+        else:
+            self.matrix = np.vstack([self.matrix, row])
+        self.entries.append(entry)
+        if len(self.entries) > limit:
+            self.entries = self.entries[-limit:]
+            self.matrix = self.matrix[-limit:]
+
+    def keep(self, predicate: Callable[[CachedQuery], bool]) -> int:
+        mask = [predicate(e) for e in self.entries]
+        removed = mask.count(False)
+        if removed and self.matrix is not None:
+            self.entries = [e for e, k in zip(self.entries, mask) if k]
+            self.matrix = (
+                self.matrix[np.array(mask, dtype=bool)] if self.entries else None
+            )
+        return removed
+
+
+class SemanticQueryCache:
+    """
+    Per-user cache of generated SQL.
+
+    Usage:
+        cache = SemanticQueryCache(EmbeddingCache(embed_fn), threshold=0.92)
+        sql, hit = cache.get_or_generate(
+            user_id, question, database, schema_version, preferences,
+            generate=lambda: agent.generate_sql(user_id, question),
+        )
+        cache.invalidate_user(user_id)       # after a memory ADD/UPDATE/DELETE
+        cache.invalidate_schema(database)    # after the semantic model changes
+    """
+
+    def __init__(
+        self,
+        embedder: Embedder,
+        threshold: float = 0.92,
+        max_entries_per_user: int = 256,
+        latency_window: int = 1000,
+    ) -> None:
+        self.embedder = embedder
+        self.threshold = threshold
+        self.max_entries_per_user = max_entries_per_user
+        # The global lock only guards the user map; scoring takes the user's lock.
+        self._users: Dict[str, _UserEntries] = {}
+        # Bumped by invalidate_user; only users invalidated at least once appear.
+        self._epochs: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._latencies: Dict[str, Deque[float]] = {
+            "hit": deque(maxlen=latency_window),
+            "miss": deque(maxlen=latency_window),
+        }
+        self._counts = {"hit": 0, "miss": 0}
+
+    def _user(self, user_id: str) -> Optional[_UserEntries]:
+        with self._lock:
+            return self._users.get(user_id)
+
+    def user_epoch(self, user_id: str) -> int:
+        """Read before generating SQL; pass it to ``store`` as ``epoch``."""
+        with self._lock:
+            return self._epochs.get(user_id, 0)
+
+    def lookup(
+        self,
+        user_id: str,
+        question: str,
+        database: str,
+        schema_version: str,
+        preferences: Iterable[str] = (),
+        embedding: Optional[Sequence[float]] = None,
+    ) -> Optional[CachedQuery]:
+        """Return the most similar cached query above the threshold, if any."""
+        user = self._user(user_id)
+        if user is None:
+            return None
+        if embedding is None:
+            embedding = self.embedder.embed(question)
+        unit = _unit(embedding)
+        fingerprint = preferences_fingerprint(preferences)
+
+        with user.lock:
+            if user.matrix is None or user.matrix.shape[1] != unit.shape[0]:
+                return None
+            scores = user.matrix @ unit
+            eligible = np.array(
+                [
+                    e.database == database
+                    and e.schema_version == schema_version
+                    and e.preferences_fp == fingerprint
+                    for e in user.entries
+                ],
+                dtype=bool,
+            )
+            scores = np.where(eligible, scores, -np.inf)
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None
+            entry = user.entries[best]
+            entry.hits += 1
+            return entry
+
+    def store(
+        self,
+        user_id: str,
+        question: str,
+        sql: str,
+        database: str,
+        schema_version: str,
+        preferences: Iterable[str] = (),
+        embedding: Optional[Sequence[float]] = None,
+        epoch: Optional[int] = None,
+    ) -> Optional[CachedQuery]:
+        """
+        Cache generated SQL for a question, evicting the oldest entry if full.
+
+        With ``epoch`` (from ``user_epoch``), nothing is stored and None is
+        returned if the user was invalidated since, as the SQL may rest on
+        memories that have changed.
+        """
+        if embedding is None:
+            embedding = self.embedder.embed(question)
+        entry = CachedQuery(
+            question=question,
+            sql=sql,
+            database=database,
+            schema_version=schema_version,
+            preferences_fp=preferences_fingerprint(preferences),
+        )
+        with self._lock:
+            if epoch is not None and self._epochs.get(user_id, 0) != epoch:
+                return None
+            user = self._users.setdefault(user_id, _UserEntries())
+        with user.lock:
+            user.append(entry, _unit(embedding), self.max_entries_per_user)
+        return entry
+
+    def get_or_generate(
+        self,
+        user_id: str,
+        question: str,
+        database: str,
+        schema_version: str,
+        preferences: Iterable[str],
+        generate: Callable[[], str],
+    ) -> Tuple[str, bool]:
+        """
+        Return ``(sql, cache_hit)``. On a miss, ``generate`` runs the full
+        retrieval + schema lookup + LLM path and its result is cached.
+        """
+        preferences = list(preferences)
+        start = time.perf_counter()
+        epoch = self.user_epoch(user_id)
+        embedding = self.embedder.embed(question)
+        entry = self.lookup(
+            user_id, question, database, schema_version, preferences, embedding
+        )
+        if entry is not None:
+            self._record("hit", time.perf_counter() - start)
+            return entry.sql, True
+
+        sql = generate()
+        self.store(
+            user_id,
+            question,
+            sql,
+            database,
+            schema_version,
+            preferences,
+            embedding,
+            epoch=epoch,
+        )
+        self._record("miss", time.perf_counter() - start)
+        return sql, False
+
+    def invalidate_user(self, user_id: str) -> int:
+        """Drop all entries for a user (call whenever their memories change)."""
+        with self._lock:
+            self._epochs[user_id] = self._epochs.get(user_id, 0) + 1
+            user = self._users.pop(user_id, None)
+        if user is None:
+            return 0
+        with user.lock:
+            return len(user.entries)
+
+    def invalidate_schema(
+        self, database: str, keep_version: Optional[str] = None
+    ) -> int:
+        """Drop entries for ``database`` not generated against ``keep_version``."""
+        with self._lock:
+            users = list(self._users.values())
+        removed = 0
+        for user in users:
+            with user.lock:
+                removed += user.keep(
+                    lambda e: e.database != database
+                    or (keep_version is not None and e.schema_version == keep_version)
+                )
+        return removed
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Hit rate over all lookups, plus mean/p95 generation latency (ms) over
+        the most recent ``latency_window`` hits and misses.
+        """
+        with self._lock:
+            latencies = {
+                kind: sorted(values) for kind, values in self._latencies.items()
+            }
+            counts = dict(self._counts)
+        total = counts["hit"] + counts["miss"]
+        report: Dict[str, float] = {
+            "lookups": total,
+            "hit_rate": counts["hit"] / total if total else 0.0,
+        }
+        for kind, values in latencies.items():
+            report[f"{kind}_count"] = counts[kind]
+            report[f"{kind}_mean_ms"] = (
+                1000 * sum(values) / len(values) if values else 0.0
+            )
+            report[f"{kind}_p95_ms"] = (
+                1000 * values[min(len(values) - 1, int(0.95 * len(values)))]
+                if values
+                else 0.0
+            )
+        return report
+
+    def _record(self, kind: str, seconds: float) -> None:
+        with self._lock:
+            self._latencies[kind].append(seconds)
+            self._counts[kind] += 1
@@ -0,0 +1,309 @@
+"""
+Paged delivery of SQL results to the Gradio frontend.
+
+``memory_frontend.py`` used to load the whole result set before showing
+anything. ``run_paged`` fetches results through a server-side cursor, one page
+at a time:
+
+- the first page is returned as soon as it has been fetched
+- later pages are fetched on demand with ``next_page``, e.g. from a
+  "Load more" button that keeps the ``PagedResult`` in ``gr.State``
+- delivery stops after ``max_rows`` rows or ``max_bytes`` of cell data, with a
+  truncation notice, and the cursor is closed
+- peak Python memory while fetching is measured per query with ``tracemalloc``
+
+psycopg2 connections get a named cursor, so Postgres keeps the result on the
+server and sends ``page_size`` rows per round trip; the connection stays in a
+transaction until the result is closed. sqlite3 cursors already step through
+results lazily.
+
+Run ``python result_pager.py`` to compare loading everything with paging.
+"""
+
+import sqlite3
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+Row = Tuple[Any, ...]
+
+
+def row_bytes(row: Sequence[Any]) -> int:
+    """Size of a row as shown in the UI: the length of each rendered cell."""
+    return sum(len(str(value).encode("utf-8")) for value in row if value is not None)
+
+
+class _Tracing:
+    """
+    Keeps ``tracemalloc`` running while any page fetch is being measured, and
+    only then, since tracing slows down every allocation in the process.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._users = 0
+        self._started = False
+
+    def acquire(self) -> None:
+        with self._lock:
+            if self._users == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started = True
+            self._users += 1
+
+    def release(self) -> None:
+        with self._lock:
+            self._users -= 1
+            if self._users == 0 and self._started:
+                tracemalloc.stop()
+                self._started = False
+
+
+_tracing = _Tracing()
+
+
+@dataclass
+class ResultPage:
+    columns: List[str]
+    rows: List[Row]
+    number: int
+    offset: int
+    done: bool
+    truncated: bool = False
+    notice: str = ""
+
+    def to_dataframe(self) -> Dict[str, Any]:
+        """Value for a ``gr.Dataframe`` component."""
+        return {"headers": self.columns, "data": [list(row) for row in self.rows]}
+
+
+class PagedResult:
+    """
+    Pages of one query result, fetched as they are requested.
+
+    Usage (Gradio):
+        def run_query(sql):
+            result = run_paged(conn, sql)
+            page = result.next_page()
+            return page.to_dataframe(), page.notice, result   # result -> gr.State
+
+        def load_more(result):
+            page = result.next_page()
+            return page.to_dataframe(), page.notice, result
+    """
+
+    def __init__(
+        self,
+        cursor: Any,
+        page_size: int,
+        max_rows: int,
+        max_bytes: int,
+        measure_memory: bool = True,
+    ) -> None:
+        self._cursor: Optional[Any] = cursor
+        self.page_size = page_size
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.columns: List[str] = []
+        self.pages = 0
+        self.rows_delivered = 0
+        self.bytes_delivered = 0
+        self.truncated = False
+        self.done = False
+        # Largest peak of memory allocated while fetching a page. With queries
+        # measured concurrently in other threads this is an upper bound.
+        self.peak_memory_bytes = 0
+        self.fetch_seconds = 0.0
+        self._lookahead: List[Row] = []
+        self._measure_memory = measure_memory
+
+    def next_page(self) -> ResultPage:
+        """Fetch the next page; returns an empty, done page once exhausted."""
+        if self.done or self._cursor is None:
+            return ResultPage(self.columns, [], self.pages, self.rows_delivered, True)
+
+        with self._measure():
+            want = min(self.page_size, self.max_rows - self.rows_delivered)
+            # One row of lookahead tells whether this is the last page.
+            rows = self._lookahead + [
+                tuple(row)
+                for row in self._cursor.fetchmany(want + 1 - len(self._lookahead))
+            ]
+            if not self.columns and self._cursor.description:
+                self.columns = [column[0] for column in self._cursor.description]
+            self._lookahead = rows[want:]
+            rows = rows[:want]
+
+            kept: List[Row] = []
+            for row in rows:
+                size = row_bytes(row)
+                if self.bytes_delivered + size > self.max_bytes:
+                    break
+                kept.append(row)
+                self.bytes_delivered += size
+
+        offset = self.rows_delivered
+        self.rows_delivered += len(kept)
+        self.pages += 1
+        more = len(kept) < len(rows) or bool(self._lookahead)
+        self.truncated = more and (
+            len(kept) < len(rows) or self.rows_delivered >= self.max_rows
+        )
+        notice = ""
+        if self.truncated:
+            notice = (
+                f"Showing the first {self.rows_delivered:,} rows; the result was"
+                f" truncated at the {self._limit_reached()} limit. Refine the query"
+                " (filters, aggregation or LIMIT) to see the rest."
+            )
+        if not more or self.truncated:
+            self.close()
+        return ResultPage(
+            self.columns, kept, self.pages, offset, self.done, self.truncated, notice
+        )
+
+    def __iter__(self) -> Iterator[ResultPage]:
+        while not self.done:
+            yield self.next_page()
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "pages": self.pages,
+            "rows": self.rows_delivered,
+            "bytes": self.bytes_delivered,
+            "truncated": float(self.truncated),
+            "peak_memory_bytes": self.peak_memory_bytes,
+            "fetch_ms": 1000 * self.fetch_seconds,
+        }
+
+    def close(self) -> None:
+        """Close the cursor, releasing the server-side result."""
+        if self._cursor is not None:
+            self._cursor.close()
+            self._cursor = None
+            self._lookahead = []
+        self.done = True
+
+    def __enter__(self) -> "PagedResult":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def _limit_reached(self) -> str:
+        if self.rows_delivered >= self.max_rows:
+            return f"{self.max_rows:,}-row"
+        return f"{self.max_bytes / 1_000_000:g} MB"
+
+    @contextmanager
+    def _measure(self) -> Iterator[None]:
+        start = time.perf_counter()
+        if not self._measure_memory:
+            try:
+                yield
+            finally:
+                self.fetch_seconds += time.perf_counter() - start
+            return
+
+        _tracing.acquire()
+        if hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        try:
+            yield
+        finally:
+            self.fetch_seconds += time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1] - baseline
+            _tracing.release()
+            self.peak_memory_bytes = max(self.peak_memory_bytes, peak)
+
+
+def open_cursor(conn: Any, page_size: int) -> Any:
+    """A server-side cursor for psycopg2 connections, a plain one otherwise."""
+    if type(conn).__module__.startswith("psycopg2"):
+        cursor = conn.cursor(name=f"result_{uuid.uuid4().hex}")
+        cursor.itersize = page_size
+        return cursor
+    return conn.cursor()
+
+
+def run_paged(
+    conn: Any,
+    sql: str,
+    params: Sequence[Any] = (),
+    page_size: int = 200,
+    max_rows: int = 10_000,
+    max_bytes: int = 5_000_000,
+    measure_memory: bool = True,
+) -> PagedResult:
+    """Execute ``sql`` and return its result for page-by-page delivery."""
+    if page_size < 1 or max_rows < 1 or max_bytes < 1:
+        raise ValueError("page_size, max_rows and max_bytes must be at least 1")
+    cursor = open_cursor(conn, page_size)
+    try:
+        cursor.execute(sql, params)
+    except Exception:
+        cursor.close()
+        raise
+    return PagedResult(cursor, page_size, max_rows, max_bytes, measure_memory)
+
+
+def _benchmark(rows: int = 200_000) -> None:
+    """Load a large SQLite result fully vs. page by page and compare."""
+    conn = sqlite3.connect(":memory:")
+    conn.execute(
+        "CREATE TABLE loans (loan_id INTEGER, customer TEXT, state TEXT,"
+        " amount REAL, notes TEXT)"
+    )
+    conn.executemany(
+        "INSERT INTO loans VALUES (?, ?, ?, ?, ?)",
+        (
+            (i, f"customer {i}", "CA", i * 10.5, "approved, collateral on file")
+            for i in range(rows)
+        ),
+    )
+    sql = "SELECT * FROM loans"
+
+    # Timings without tracemalloc, which slows allocation-heavy code down.
+    start = time.perf_counter()
+    conn.execute(sql).fetchall()
+    full_ms = 1000 * (time.perf_counter() - start)
+    tracemalloc.start()
+    everything = conn.execute(sql).fetchall()
+    full_peak = tracemalloc.get_traced_memory()[1]
+    del everything
+    tracemalloc.stop()
+
+    untraced = run_paged(conn, sql, measure_memory=False)
+    start = time.perf_counter()
+    first = untraced.next_page()
+    first_ms = 1000 * (time.perf_counter() - start)
+    untraced.close()
+
+    result = run_paged(conn, sql, max_rows=rows, max_bytes=1 << 40)
+    result.next_page()
+    first_peak = result.peak_memory_bytes
+    for _ in result:
+        pass
+    capped = list(run_paged(conn, sql))
+
+    print(f"{'':<28} | {'first rows ms':>13} | {'peak memory':>12}")
+    print(f"{'fetchall':<28} | {full_ms:>13.1f} | {full_peak / 1e6:>9.1f} MB")
+    print(
+        f"{f'paged ({result.page_size} rows/page)':<28} | {first_ms:>13.1f} |"
+        f" {first_peak / 1e6:>9.2f} MB (first page)"
+    )
+    print(
+        f"\nall {result.rows_delivered:,} rows in {result.pages} pages,"
+        f" peak {result.peak_memory_bytes / 1e6:.2f} MB over all pages"
+        f"\n{len(first.rows)} rows on the first page; with the default caps:"
+        f" {capped[-1].notice}"
+    )
+
+
+if __name__ == "__main__":
+    _benchmark()
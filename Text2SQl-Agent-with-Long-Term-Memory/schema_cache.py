@@ -0,0 +1,456 @@
+"""
+Versioned schema cache and relevance-pruned schema context for SQL generation.
+
+The "Load Database" step fetches the semantic model from the Denodo AI SDK
+(``DENODO_API_HOST``) and the SQL-generation prompt includes the whole schema.
+For wide databases that is slow and bloats every prompt. ``SchemaCache``:
+
+- caches the parsed schema per database, keyed by a version (the server's
+  ETag, or a hash of the metadata when the server sends none)
+- refreshes conditionally: within ``ttl_seconds`` no request is made; after
+  that the fetch carries ``If-None-Match`` and an unchanged schema keeps the
+  existing index
+- precomputes an embedding index over tables and columns when a version is
+  first seen
+- renders, per question, only the ``top_k`` most relevant tables plus the
+  tables needed to join them
+- reports prompt tokens for the full vs. pruned schema
+
+The fetch function is injected, so the cache can run against the real AI SDK
+(``denodo_fetch_fn``) or the local stub in ``denodo_stub.py``. Run
+``python schema_cache.py`` to measure prompt-token savings against the stub.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from embedding_cache import EmbedFn
+from token_utils import estimate_tokens
+
+
+@dataclass
+class FetchResult:
+    """Raw ``getMetadata`` payload plus the server's ETag, if any."""
+
+    payload: Dict[str, Any]
+    etag: Optional[str] = None
+
+
+# Takes a database name and the ETag of the cached copy (or None) and returns
+# the new metadata, or None when the server reports it unchanged (HTTP 304).
+FetchFn = Callable[[str, Optional[str]], Optional[FetchResult]]
+
+
+def denodo_fetch_fn(
+    host: Optional[str] = None,
+    username: Optional[str] = None,
+    password: Optional[str] = None,
+    timeout: float = 60.0,
+    session: Optional[Any] = None,
+) -> FetchFn:
+    """Build a fetch function backed by the Denodo AI SDK ``getMetadata`` endpoint."""
+    import requests
+
+    host = host or os.getenv("DENODO_API_HOST") or "http://localhost:8080"
+    base_url = host.rstrip("/")
+    auth = (
+        username or os.getenv("DENODO_USERNAME") or "",
+        password or os.getenv("DENODO_PASSWORD") or "",
+    )
+    http = session or requests.Session()
+
+    def fetch(database: str, etag: Optional[str]) -> Optional[FetchResult]:
+        headers = {"If-None-Match": etag} if etag else {}
+        response = http.get(
+            f"{base_url}/getMetadata",
+            params={"vdp_database_names": database, "insert": "false"},
+            auth=auth,
+            headers=headers,
+            timeout=timeout,
+        )
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+        return FetchResult(payload=response.json(), etag=response.headers.get("ETag"))
+
+    return fetch
+
+
+# -------------------------
+# Parsed schema
+# -------------------------
+@dataclass
+class Column:
+    name: str
+    type: str = ""
+    description: str = ""
+
+
+@dataclass
+class Table:
+    name: str
+    description: str = ""
+    columns: List[Column] = field(default_factory=list)
+    # (other table, join condition)
+    joins: List[Tuple[str, str]] = field(default_factory=list)
+
+    def render(self, within: Optional[Iterable[str]] = None) -> str:
+        """Prompt text for the table; joins are limited to ``within`` if given."""
+        lines = [
+            f"Table {self.name}" + (f": {self.description}" if self.description else "")
+        ]
+        for column in self.columns:
+            line = f"  - {column.name} {column.type}".rstrip()
+            if column.description:
+                line += f" -- {column.description}"
+            lines.append(line)
+        for other, condition in self.joins:
+            if within is not None and other not in within:
+                continue
+            lines.append(f"  JOIN {other} ON {condition}")
+        return "\n".join(lines)
+
+
+@dataclass
+class SchemaSnapshot:
+    database: str
+    version: str
+    tables: Dict[str, Table]
+
+    def render(self, names: Optional[Iterable[str]] = None) -> str:
+        """Prompt text for the given tables (all tables by default)."""
+        if names is None:
+            return "\n\n".join(table.render() for table in self.tables.values())
+        selected = list(names)
+        return "\n\n".join(self.tables[name].render(selected) for name in selected)
+
+
+def _first(item: Dict[str, Any], *keys: str, default: Any = "") -> Any:
+    for key in keys:
+        if item.get(key) not in (None, ""):
+            return item[key]
+    return default
+
+
+def parse_metadata(
+    database: str, payload: Dict[str, Any], etag: Optional[str] = None
+) -> SchemaSnapshot:
+    """
+    Parse a ``getMetadata`` response (its ``db_schema_json`` list of views) into
+    a snapshot. The version is the ETag when given, else a content hash.
+    """
+    views = payload.get("db_schema_json", payload.get("tables", []))
+    tables: Dict[str, Table] = {}
+    for view in views:
+        name = _first(view, "tableName", "name")
+        columns = [
+            Column(
+                name=_first(col, "columnName", "name"),
+                type=_first(col, "type"),
+                description=_first(col, "description", "logicalName"),
+            )
+            for col in _first(view, "schema", "columns", default=[])
+        ]
+        joins = [
+            (
+                _first(assoc, "table_name", "other_view", "table"),
+                _first(assoc, "where", "condition", "on"),
+            )
+            for assoc in _first(view, "associations", "joins", default=[])
+        ]
+        tables[name] = Table(name, _first(view, "description"), columns, joins)
+
+    version = (
+        etag
+        or hashlib.sha256(
+            json.dumps(views, sort_keys=True).encode("utf-8")
+        ).hexdigest()[:16]
+    )
+    return SchemaSnapshot(database, version, tables)
+
+
+# -------------------------
+# Embedding index
+# -------------------------
+def _unit_rows(vectors: Sequence[Sequence[float]]) -> np.ndarray:
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+class SchemaIndex:
+    """
+    Embedding index over one schema snapshot. A table's score for a question is
+    the best of its own description and any of its columns.
+    """
+
+    def __init__(self, snapshot: SchemaSnapshot, embed_fn: EmbedFn) -> None:
+        self.snapshot = snapshot
+        self.embed_fn = embed_fn
+        self.names = list(snapshot.tables)
+        documents: List[str] = []
+        owners: List[int] = []
+        for i, name in enumerate(self.names):
+            table = snapshot.tables[name]
+            columns = ", ".join(c.name for c in table.columns)
+            documents.append(f"{name}: {table.description} ({columns})")
+            owners.append(i)
+            for column in table.columns:
+                documents.append(
+                    f"{name}.{column.name} {column.type} {column.description}".strip()
+                )
+                owners.append(i)
+        self._owners = np.asarray(owners, dtype=np.int64)
+        self._matrix = (
+            _unit_rows(embed_fn(documents))
+            if documents
+            else np.zeros((0, 0), np.float32)
+        )
+        self._graph: Dict[str, Dict[str, str]] = {name: {} for name in self.names}
+        for name, table in snapshot.tables.items():
+            for other, condition in table.joins:
+                if other in self._graph:
+                    self._graph[name].setdefault(other, condition)
+                    self._graph[other].setdefault(name, condition)
+
+    def rank(self, question: str) -> List[Tuple[str, float]]:
+        """All tables ordered by relevance to the question."""
+        if not self.names:
+            return []
+        query = _unit_rows(self.embed_fn([question]))[0]
+        scores = self._matrix @ query
+        best = np.full(len(self.names), -np.inf, dtype=np.float32)
+        np.maximum.at(best, self._owners, scores)
+        order = np.argsort(-best, kind="stable")
+        return [(self.names[i], float(best[i])) for i in order]
+
+    def join_path(self, source: str, target: str) -> List[str]:
+        """Shortest chain of tables joining ``source`` to ``target`` (BFS), or []."""
+        previous: Dict[str, Optional[str]] = {source: None}
+        queue = deque([source])
+        while queue:
+            node = queue.popleft()
+            if node == target:
+                path = [node]
+                while previous[path[-1]] is not None:
+                    path.append(previous[path[-1]])  # type: ignore[arg-type]
+                return path[::-1]
+            for neighbour in self._graph.get(node, {}):
+                if neighbour not in previous:
+                    previous[neighbour] = node
+                    queue.append(neighbour)
+        return []
+
+    def select(self, question: str, top_k: int) -> List[str]:
+        """Top-k tables for the question plus any bridge tables needed to join them."""
+        top = [name for name, _ in self.rank(question)[:top_k]]
+        selected = list(top)
+        for other in top[1:]:
+            for name in self.join_path(top[0], other):
+                if name not in selected:
+                    selected.append(name)
+        return selected
+
+
+# -------------------------
+# Cache
+# -------------------------
+@dataclass
+class SchemaContext:
+    database: str
+    version: str
+    tables: List[str]
+    text: str
+    full_tokens: int
+    pruned_tokens: int
+
+
+@dataclass
+class _Entry:
+    snapshot: SchemaSnapshot
+    index: SchemaIndex
+    etag: Optional[str]
+    full_tokens: int
+    checked_at: float
+
+
+class SchemaCache:
+    """
+    Usage:
+        cache = SchemaCache(denodo_fetch_fn(), embeddings.embed_many, top_k=5)
+        context = cache.context_for("bank", question)
+        prompt = SQL_PROMPT.format(schema=context.text, ...)
+        sql, hit = query_cache.get_or_generate(..., schema_version=context.version, ...)
+    """
+
+    def __init__(
+        self,
+        fetch: FetchFn,
+        embed_fn: EmbedFn,
+        ttl_seconds: float = 300.0,
+        top_k: int = 5,
+        on_version_change: Optional[Callable[[str, str], None]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.fetch = fetch
+        self.embed_fn = embed_fn
+        self.ttl_seconds = ttl_seconds
+        self.top_k = top_k
+        # Called with (database, new_version), e.g. to drop stale cached SQL:
+        # lambda db, v: query_cache.invalidate_schema(db, keep_version=v)
+        self.on_version_change = on_version_change
+        self._clock = clock
+        self._entries: Dict[str, _Entry] = {}
+        # Last version seen per database; survives invalidate() so a reload
+        # with a different version still notifies.
+        self._last_version: Dict[str, str] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            "fetches": 0,
+            "not_modified": 0,
+            "rebuilds": 0,
+            "contexts": 0,
+            "full_tokens": 0,
+            "pruned_tokens": 0,
+        }
+
+    def get(self, database: str, force: bool = False) -> SchemaSnapshot:
+        """Current schema for ``database``, refreshing it if the TTL has expired."""
+        return self._entry(database, force).snapshot
+
+    def version(self, database: str) -> str:
+        return self._entry(database).snapshot.version
+
+    def context_for(
+        self, database: str, question: str, top_k: Optional[int] = None
+    ) -> SchemaContext:
+        """Schema text for the SQL-generation prompt, pruned to the question."""
+        entry = self._entry(database)
+        tables = entry.index.select(question, top_k or self.top_k)
+        text = entry.snapshot.render(tables)
+        context = SchemaContext(
+            database=database,
+            version=entry.snapshot.version,
+            tables=tables,
+            text=text,
+            full_tokens=entry.full_tokens,
+            pruned_tokens=estimate_tokens(text),
+        )
+        with self._lock:
+            self._stats["contexts"] += 1
+            self._stats["full_tokens"] += context.full_tokens
+            self._stats["pruned_tokens"] += context.pruned_tokens
+        return context
+
+    def invalidate(self, database: str) -> None:
+        with self._lock:
+            self._entries.pop(database, None)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            report: Dict[str, float] = dict(self._stats)
+        full = report["full_tokens"]
+        report["token_savings"] = 1 - report["pruned_tokens"] / full if full else 0.0
+        return report
+
+    def _entry(self, database: str, force: bool = False) -> _Entry:
+        with self._lock:
+            entry = self._entries.get(database)
+            if (
+                entry
+                and not force
+                and self._clock() - entry.checked_at < self.ttl_seconds
+            ):
+                return entry
+            lock = self._locks.setdefault(database, threading.Lock())
+
+        # One refresh per database at a time; other callers wait for its result.
+        with lock:
+            with self._lock:
+                current = self._entries.get(database)
+            if current is not entry and current is not None and not force:
+                return current
+            return self._refresh(database, current)
+
+    def _refresh(self, database: str, entry: Optional[_Entry]) -> _Entry:
+        result = self.fetch(database, entry.etag if entry else None)
+        now = self._clock()
+        with self._lock:
+            self._stats["fetches"] += 1
+
+        snapshot = (
+            parse_metadata(database, result.payload, result.etag) if result else None
+        )
+        if entry is not None and (
+            snapshot is None or snapshot.version == entry.snapshot.version
+        ):
+            with self._lock:
+                self._stats["not_modified"] += 1
+                entry.checked_at = now
+            return entry
+        if snapshot is None:
+            raise RuntimeError(
+                f"Server reported {database!r} unchanged but nothing is cached"
+            )
+
+        fresh = _Entry(
+            snapshot=snapshot,
+            index=SchemaIndex(snapshot, self.embed_fn),
+            etag=result.etag if result else None,
+            full_tokens=estimate_tokens(snapshot.render()),
+            checked_at=now,
+        )
+        with self._lock:
+            self._entries[database] = fresh
+            self._stats["rebuilds"] += 1
+            previous = self._last_version.get(database)
+            self._last_version[database] = snapshot.version
+        if self.on_version_change and previous not in (None, snapshot.version):
+            self.on_version_change(database, snapshot.version)
+        return fresh
+
+
+def _benchmark(tables: int = 60, questions: int = 20) -> None:
+    from denodo_stub import StubDenodoServer, hashed_embed_fn, sample_metadata
+
+    asked = [
+        "loans with the highest interest rate",
+        "customers in California with a credit score below 750",
+        "total payments per customer last month",
+        "market value of properties by city",
+    ]
+    with StubDenodoServer({"bank": sample_metadata(tables)}).start() as server:
+        # ttl_seconds=0 revalidates on every question to exercise the 304 path.
+        cache = SchemaCache(
+            denodo_fetch_fn(host=server.base_url), hashed_embed_fn, ttl_seconds=0
+        )
+        start = time.perf_counter()
+        for i in range(questions):
+            context = cache.context_for("bank", asked[i % len(asked)])
+        elapsed = time.perf_counter() - start
+        stats = cache.stats()
+
+    print(f"{tables} tables, {questions} questions against stub {server.base_url}")
+    print(
+        f"  requests: {server.requests} ({int(stats['not_modified'])} not modified),"
+        f" index builds: {int(stats['rebuilds'])}"
+    )
+    print(
+        f"  schema tokens per prompt: full {context.full_tokens},"
+        f" last pruned {context.pruned_tokens} ({len(context.tables)} tables)"
+    )
+    print(f"  prompt-token savings: {stats['token_savings']:.1%}")
+    print(f"  mean context build: {1000 * elapsed / questions:.2f} ms")
+
+
+if __name__ == "__main__":
+    _benchmark()
@@ -0,0 +1,123 @@
+from typing import List
+
+import pytest
+
+from conversation_summary import RollingSummary, estimate_tokens
+
+
+class RecordingLLM:
+    """Fake summarizer: records prompts and returns a short fixed summary."""
+
+    def __init__(self, reply: str = "summary") -> None:
+        self.prompts: List[str] = []
+        self.reply = reply
+
+    def __call__(self, prompt: str) -> str:
+        self.prompts.append(prompt)
+        return self.reply
+
+
+def add_pairs(summary: RollingSummary, count: int, start: int = 0) -> None:
+    for i in range(start, start + count):
+        summary.add_pair(f"question {i}", f"answer {i}")
+
+
+def test_recent_pairs_must_be_positive() -> None:
+    with pytest.raises(ValueError):
+        RollingSummary(RecordingLLM(), recent_pairs=0)
+
+
+@pytest.mark.parametrize("refresh_window", [1, 3])
+def test_refresh_window_not_larger_than_recent_window(refresh_window: int) -> None:
+    llm = RecordingLLM()
+    summary = RollingSummary(llm, recent_pairs=3, refresh_window=refresh_window)
+    add_pairs(summary, 5)
+    assert summary.recent == [(f"question {i}", f"answer {i}") for i in (2, 3, 4)]
+    assert summary.stats.delta_updates == 2
+    # Evicted pairs are folded in oldest first.
+    assert "question 0" in llm.prompts[0] and "question 1" in llm.prompts[1]
+
+
+def test_single_recent_pair() -> None:
+    llm = RecordingLLM()
+    summary = RollingSummary(llm, recent_pairs=1, refresh_window=1)
+    add_pairs(summary, 3)
+    assert summary.recent == [("question 2", "answer 2")]
+    assert summary.stats.delta_updates == 2
+    assert "question 1" in llm.prompts[-1]
+
+
+def test_no_llm_calls_until_window_overflows() -> None:
+    llm = RecordingLLM()
+    summary = RollingSummary(llm, recent_pairs=4)
+    add_pairs(summary, 4)
+    assert llm.prompts == []
+    add_pairs(summary, 1, start=4)
+    assert len(llm.prompts) == 1
+
+
+def test_delta_prompt_size_stays_bounded() -> None:
+    llm = RecordingLLM()
+    summary = RollingSummary(llm, recent_pairs=2, refresh_every=1000)
+    add_pairs(summary, 200)
+    sizes = [estimate_tokens(p) for p in llm.prompts]
+    assert max(sizes[-50:]) <= max(sizes[:10]) + 5
+
+
+def test_full_refresh_after_refresh_every_deltas() -> None:
+    summary = RollingSummary(RecordingLLM(), recent_pairs=2, refresh_every=5)
+    add_pairs(summary, 2 + 10)
+    assert summary.stats.delta_updates == 10
+    assert summary.stats.full_refreshes == 2
+    assert summary.deltas_since_refresh == 0
+
+
+def test_full_refresh_when_summary_too_long() -> None:
+    summary = RollingSummary(
+        RecordingLLM("word " * 400), recent_pairs=1, max_summary_tokens=50
+    )
+    add_pairs(summary, 2)
+    assert summary.stats.full_refreshes == 1
+    assert estimate_tokens(summary.summary) <= 50
+
+
+def test_history_is_bounded_by_refresh_window() -> None:
+    summary = RollingSummary(RecordingLLM(), recent_pairs=2, refresh_window=5)
+    add_pairs(summary, 50)
+    assert len(summary.to_dict()["history"]) == 5
+
+
+def test_context_respects_budget() -> None:
+    summary = RollingSummary(RecordingLLM(), recent_pairs=4, context_budget_tokens=40)
+    for i in range(4):
+        summary.add_pair(f"question {i} " + "x" * 60, f"answer {i}")
+    context = summary.build_context()
+    assert estimate_tokens(context) <= 40
+    # The newest pairs are kept first.
+    assert "question 3" in context and "question 0" not in context
+
+
+def test_summary_is_truncated_to_the_context_budget() -> None:
+    summary = RollingSummary(
+        RecordingLLM(reply="s" * 800),
+        recent_pairs=1,
+        max_summary_tokens=400,
+        context_budget_tokens=100,
+    )
+    add_pairs(summary, 3)
+    assert estimate_tokens(summary.summary) > 100
+    context = summary.build_context()
+    assert estimate_tokens(context) <= 100
+    assert context.startswith("Conversation summary:\nsss")
+
+
+def test_round_trip_through_dict() -> None:
+    llm = RecordingLLM()
+    summary = RollingSummary(llm, recent_pairs=2)
+    add_pairs(summary, 6)
+    restored = RollingSummary.from_dict(summary.to_dict(), llm, recent_pairs=2)
+    assert restored.summary == summary.summary
+    assert restored.turns == 6
+    assert restored.recent == summary.recent
+    restored.add_pair("question 6", "answer 6")
+    assert "question 4" in llm.prompts[-1]
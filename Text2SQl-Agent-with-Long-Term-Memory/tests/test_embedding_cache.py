@@ -0,0 +1,163 @@
+import threading
+from pathlib import Path
+from typing import List, Optional
+
+import pytest
+
+from embedding_cache import EmbeddingCache, cache_key
+
+
+class RecordingEmbedder:
+    """Batched embed function that records every call it receives."""
+
+    def __init__(self, gate: Optional[threading.Event] = None) -> None:
+        self.calls: List[List[str]] = []
+        self.gate = gate
+        self.started = threading.Event()
+        self._lock = threading.Lock()
+
+    def __call__(self, texts: List[str]) -> List[List[float]]:
+        with self._lock:
+            self.calls.append(list(texts))
+        self.started.set()
+        if self.gate is not None:
+            self.gate.wait(5)
+        return [[float(len(t)), float(sum(map(ord, t)) % 97)] for t in texts]
+
+
+def test_cache_key_normalizes_text_and_includes_model() -> None:
+    assert cache_key("Show  Approved\nloans", "m") == cache_key(
+        "show approved loans", "m"
+    )
+    assert cache_key("show approved loans", "m1") != cache_key(
+        "show approved loans", "m2"
+    )
+
+
+def test_concurrent_misses_are_batched() -> None:
+    embedder = RecordingEmbedder()
+    with EmbeddingCache(
+        embedder, model="m", max_batch_size=64, max_wait_ms=50
+    ) as cache:
+        threads = [
+            threading.Thread(target=cache.embed, args=(f"q{i}",)) for i in range(20)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        stats = cache.stats()
+
+    assert sum(len(c) for c in embedder.calls) == 20
+    assert len(embedder.calls) < 20
+    assert stats["avg_batch_size"] > 1
+
+
+def test_batches_respect_max_batch_size() -> None:
+    embedder = RecordingEmbedder()
+    with EmbeddingCache(embedder, model="m", max_batch_size=3, max_wait_ms=20) as cache:
+        cache.embed_many([f"q{i}" for i in range(10)])
+
+    assert all(len(call) <= 3 for call in embedder.calls)
+    assert sum(len(c) for c in embedder.calls) == 10
+
+
+def test_duplicate_key_joins_batch_already_being_embedded() -> None:
+    gate = threading.Event()
+    embedder = RecordingEmbedder(gate=gate)
+    results: List[List[float]] = []
+    with EmbeddingCache(embedder, model="m", max_wait_ms=1) as cache:
+        first = threading.Thread(target=lambda: results.append(cache.embed("hello")))
+        first.start()
+        assert embedder.started.wait(5)
+        # The first batch is now inside embed_fn; a second caller must wait on it.
+        second = threading.Thread(target=lambda: results.append(cache.embed("hello")))
+        second.start()
+        gate.set()
+        first.join()
+        second.join()
+
+    assert len(embedder.calls) == 1
+    assert results[0] == results[1]
+
+
+def test_duplicates_within_one_request_are_embedded_once() -> None:
+    embedder = RecordingEmbedder()
+    with EmbeddingCache(embedder, model="m") as cache:
+        vectors = cache.embed_many(["a", "b", "a", "A "])
+
+    assert embedder.calls == [["a", "b"]]
+    assert vectors[0] == vectors[2] == vectors[3]
+
+
+def test_memory_hits_and_hit_rate() -> None:
+    embedder = RecordingEmbedder()
+    with EmbeddingCache(embedder, model="m") as cache:
+        cache.embed("hello")
+        cache.embed("HELLO")
+        stats = cache.stats()
+
+    assert len(embedder.calls) == 1
+    assert stats["memory_hits"] == 1
+    assert stats["hit_rate"] == pytest.approx(0.5)
+
+
+def test_mutating_a_result_does_not_corrupt_the_cache() -> None:
+    with EmbeddingCache(RecordingEmbedder(), model="m") as cache:
+        vector = cache.embed("hello")
+        expected = list(vector)
+        vector[0] = -1.0
+        assert cache.embed("hello") == expected
+
+
+def test_lru_evicts_oldest_entries() -> None:
+    embedder = RecordingEmbedder()
+    with EmbeddingCache(embedder, model="m", lru_size=2) as cache:
+        cache.embed_many(["a", "b", "c"])
+        cache.embed("a")
+
+    assert embedder.calls[-1] == ["a"]
+
+
+def test_sqlite_tier_survives_reopen(tmp_path: Path) -> None:
+    db_path = str(tmp_path / "embeddings.db")
+    with EmbeddingCache(RecordingEmbedder(), model="m", db_path=db_path) as cache:
+        expected = cache.embed("show approved loans")
+
+    def unavailable(texts: List[str]) -> List[List[float]]:
+        raise AssertionError("should be served from SQLite")
+
+    with EmbeddingCache(unavailable, model="m", db_path=db_path) as cache:
+        assert cache.embed("show approved loans") == pytest.approx(expected)
+        assert cache.stats()["disk_hits"] == 1
+
+
+def test_sqlite_tier_is_keyed_by_model(tmp_path: Path) -> None:
+    db_path = str(tmp_path / "embeddings.db")
+    with EmbeddingCache(RecordingEmbedder(), model="m1", db_path=db_path) as cache:
+        cache.embed("hello")
+
+    embedder = RecordingEmbedder()
+    with EmbeddingCache(embedder, model="m2", db_path=db_path) as cache:
+        cache.embed("hello")
+
+    assert embedder.calls == [["hello"]]
+
+
+def test_embed_errors_propagate_to_every_waiter() -> None:
+    def broken(texts: List[str]) -> List[List[float]]:
+        raise RuntimeError("embedding API down")
+
+    with EmbeddingCache(broken, model="m") as cache:
+        with pytest.raises(RuntimeError, match="embedding API down"):
+            cache.embed("hello")
+        # A failed key is not left in flight; the next call retries.
+        with pytest.raises(RuntimeError, match="embedding API down"):
+            cache.embed("hello")
+
+
+def test_closed_cache_rejects_new_misses() -> None:
+    cache = EmbeddingCache(RecordingEmbedder(), model="m")
+    cache.close()
+    with pytest.raises(RuntimeError):
+        cache.embed("hello")
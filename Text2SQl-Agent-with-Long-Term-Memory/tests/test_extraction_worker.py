@@ -0,0 +1,135 @@
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import pytest
+
+from extraction_worker import ExtractionQueue, ExtractionWorker
+
+Pairs = List[Tuple[str, str]]
+
+
+class RecordingExtract:
+    """Records each run; optionally blocks until ``release`` is set."""
+
+    def __init__(self, block: bool = False) -> None:
+        self.runs: List[Tuple[str, Pairs]] = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+        if not block:
+            self.release.set()
+
+    def __call__(self, user_id: str, pairs: Pairs) -> None:
+        self.started.set()
+        self.release.wait(5)
+        self.runs.append((user_id, list(pairs)))
+
+
+def test_submit_returns_before_extraction_runs(tmp_path: Path) -> None:
+    extract = RecordingExtract(block=True)
+    with ExtractionWorker(str(tmp_path / "q.db"), extract) as worker:
+        start = time.perf_counter()
+        worker.submit("u1", "question", "answer")
+        assert time.perf_counter() - start < 0.5
+        assert extract.started.wait(5) and extract.runs == []
+        extract.release.set()
+        assert worker.wait_for("u1", timeout=5)
+    assert extract.runs == [("u1", [("question", "answer")])]
+
+
+def test_pending_pairs_for_a_user_are_coalesced(tmp_path: Path) -> None:
+    extract = RecordingExtract(block=True)
+    with ExtractionWorker(str(tmp_path / "q.db"), extract, workers=1) as worker:
+        worker.submit("u1", "q0", "a0")
+        assert extract.started.wait(5)
+        for i in range(1, 4):
+            worker.submit("u1", f"q{i}", f"a{i}")
+        extract.release.set()
+        assert worker.wait_for("u1", timeout=5)
+        assert worker.stats()["runs"] == 2
+    assert [pairs for _, pairs in extract.runs] == [
+        [("q0", "a0")],
+        [("q1", "a1"), ("q2", "a2"), ("q3", "a3")],
+    ]
+
+
+def test_each_user_is_processed_in_order_one_run_at_a_time(tmp_path: Path) -> None:
+    seen: Dict[str, List[str]] = {}
+    active: Dict[str, int] = {}
+    overlaps: List[str] = []
+    lock = threading.Lock()
+
+    def extract(user_id: str, pairs: Pairs) -> None:
+        with lock:
+            active[user_id] = active.get(user_id, 0) + 1
+            if active[user_id] > 1:
+                overlaps.append(user_id)
+        time.sleep(0.002)
+        with lock:
+            seen.setdefault(user_id, []).extend(q for q, _ in pairs)
+            active[user_id] -= 1
+
+    users = [f"u{i}" for i in range(5)]
+    with ExtractionWorker(
+        str(tmp_path / "q.db"), extract, workers=4, max_batch=3
+    ) as worker:
+        for i in range(20):
+            for user in users:
+                worker.submit(user, f"{user}-q{i}", "a")
+        for user in users:
+            assert worker.wait_for(user, timeout=10)
+    assert overlaps == []
+    assert seen == {user: [f"{user}-q{i}" for i in range(20)] for user in users}
+
+
+def test_wait_for_gives_read_your_writes(tmp_path: Path) -> None:
+    memories: Dict[str, List[str]] = {}
+
+    def extract(user_id: str, pairs: Pairs) -> None:
+        time.sleep(0.05)
+        memories.setdefault(user_id, []).extend(q for q, _ in pairs)
+
+    with ExtractionWorker(str(tmp_path / "q.db"), extract) as worker:
+        worker.submit("u1", "only approved loans", "ok")
+        assert worker.wait_for("u1", timeout=5)
+        assert memories["u1"] == ["only approved loans"]
+        # Nothing queued for another user: no waiting.
+        assert worker.wait_for("u2", timeout=0)
+
+
+def test_queue_survives_a_restart(tmp_path: Path) -> None:
+    path = str(tmp_path / "q.db")
+    queue = ExtractionQueue(path)
+    queue.enqueue("u1", "q0", "a0")
+    queue.enqueue("u1", "q1", "a1")
+    # A worker claimed the pairs, then the process died.
+    assert len(queue.claim(set(), limit=10)) == 2
+    queue.close()
+
+    extract = RecordingExtract()
+    with ExtractionWorker(path, extract) as worker:
+        assert worker.wait_for("u1", timeout=5)
+    assert extract.runs == [("u1", [("q0", "a0"), ("q1", "a1")])]
+
+
+def test_failing_pairs_are_retried_then_parked(tmp_path: Path) -> None:
+    calls: List[Pairs] = []
+
+    def extract(user_id: str, pairs: Pairs) -> None:
+        calls.append(pairs)
+        raise RuntimeError("LLM unavailable")
+
+    with ExtractionWorker(
+        str(tmp_path / "q.db"), extract, max_attempts=2, retry_delay=0.01
+    ) as worker:
+        worker.submit("u1", "q0", "a0")
+        assert worker.wait_for("u1", timeout=5)
+        assert len(calls) == 2
+        [(_, user_id, error)] = worker.queue.failed()
+        assert user_id == "u1" and "LLM unavailable" in error
+
+
+def test_invalid_settings() -> None:
+    with pytest.raises(ValueError):
+        ExtractionWorker(":memory:", RecordingExtract(), max_batch=0)
@@ -0,0 +1,152 @@
+from typing import List
+
+import numpy as np
+import pytest
+
+from memory_tiers import DAY, TieredMemoryIndex, decay_score, run_benchmark
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def axis(i: int, dims: int = 32) -> List[float]:
+    """Orthogonal test embeddings: memory ``i`` only matches itself."""
+    vector = [0.0] * dims
+    vector[i % dims] = 1.0
+    return vector
+
+
+def make_index(clock: Clock, **kwargs: object) -> TieredMemoryIndex:
+    kwargs.setdefault("hot_cap", 4)
+    kwargs.setdefault("low_water", 1.0)
+    return TieredMemoryIndex(clock=clock, half_life_days=10, **kwargs)  # type: ignore
+
+
+def test_decay_score_halves_per_half_life() -> None:
+    assert decay_score(4.0, 0.0, 10 * DAY, 10 * DAY) == pytest.approx(2.0)
+    assert decay_score(4.0, 0.0, 0.0, 10 * DAY) == 4.0
+
+
+def test_retrieval_raises_the_score() -> None:
+    clock = Clock()
+    index = make_index(clock)
+    index.add("u1", "m0", "approved loans", axis(0))
+    clock.now = 10 * DAY
+    assert index.score("u1", "m0") == pytest.approx(0.5)
+    index.search("u1", axis(0))
+    assert index.score("u1", "m0") == pytest.approx(1.5)
+
+
+def test_cap_archives_the_lowest_scoring_memories() -> None:
+    clock = Clock()
+    index = make_index(clock)
+    for i in range(4):
+        index.add("u1", f"m{i}", f"memory {i}", axis(i))
+        clock.now += DAY
+    # m0 is the oldest but keeps being retrieved; m1 is the stalest.
+    index.search("u1", axis(0))
+    index.add("u1", "m4", "memory 4", axis(4))
+    assert index.counts("u1") == (4, 1)
+    assert index.score("u1", "m1") is None
+    assert index.score("u1", "m0") is not None
+
+
+def test_cold_archive_is_searched_only_when_hot_has_too_few_results() -> None:
+    clock = Clock()
+    index = make_index(clock, hot_cap=2)
+    for i in range(3):
+        index.add("u1", f"m{i}", f"memory {i}", axis(i))
+        clock.now += DAY
+    assert index.score("u1", "m0") is None
+
+    [hit] = index.search("u1", axis(2))
+    assert hit.memory_id == "m2" and hit.tier == "hot"
+    assert index.stats()["cold_searches"] == 0
+
+    [hit] = index.search("u1", axis(0))
+    assert (hit.memory_id, hit.content, hit.tier) == ("m0", "memory 0", "cold")
+    assert hit.similarity == pytest.approx(1.0, abs=1e-3)
+    assert index.stats()["cold_searches"] == 1
+
+
+def test_cold_hit_is_promoted_back_to_hot() -> None:
+    clock = Clock()
+    index = make_index(clock, hot_cap=2)
+    for i in range(3):
+        index.add("u1", f"m{i}", f"memory {i}", axis(i))
+        clock.now += DAY
+    index.search("u1", axis(0))
+    assert index.score("u1", "m0") is not None
+    # Promoting m0 pushed the stalest hot memory out instead.
+    assert index.counts("u1") == (2, 1)
+    assert index.score("u1", "m1") is None
+    [hit] = index.search("u1", axis(0))
+    assert hit.tier == "hot"
+
+
+def test_per_user_caps() -> None:
+    clock = Clock()
+    index = make_index(clock, hot_cap=10)
+    index.set_cap("small", 2)
+    for user in ("small", "large"):
+        for i in range(5):
+            index.add(user, f"m{i}", f"memory {i}", axis(i))
+    assert index.counts("small") == (2, 3)
+    assert index.counts("large") == (5, 0)
+
+
+def test_add_and_remove_reach_either_tier() -> None:
+    clock = Clock()
+    index = make_index(clock, hot_cap=1)
+    index.add("u1", "m0", "old text", axis(0))
+    index.add("u1", "m1", "memory 1", axis(1))
+    assert index.counts("u1") == (1, 1)
+    # Re-adding an archived memory replaces it and makes it hot again.
+    index.add("u1", "m0", "new text", axis(0))
+    assert index.counts("u1") == (1, 1)
+    assert index.search("u1", axis(0))[0].content == "new text"
+    assert index.remove("u1", "m1") and index.remove("u1", "m0")
+    assert not index.remove("u1", "m0")
+    assert index.counts("u1") == (0, 0)
+
+
+def test_sweep_archives_stale_memories() -> None:
+    clock = Clock()
+    index = make_index(clock, hot_cap=None)
+    index.add("u1", "old", "old memory", axis(0))
+    clock.now = 50 * DAY
+    index.add("u1", "new", "new memory", axis(1))
+    assert index.sweep() == 1
+    assert index.counts("u1") == (1, 1)
+
+
+def test_cold_archive_is_compressed_and_persistent(tmp_path: object) -> None:
+    path = str(tmp_path) + "/archive.db"
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((200, 64))
+    clock = Clock()
+    index = make_index(clock, archive_path=path, hot_cap=1)
+    for i, vector in enumerate(vectors):
+        index.add("u1", f"m{i}", "customers in California " * 20, vector)
+    raw = 199 * (64 * 4 + len("customers in California " * 20))
+    assert index.cold_size_bytes("u1") < raw / 4
+    index.close()
+
+    reopened = make_index(clock, archive_path=path)
+    assert reopened.counts("u1") == (0, 199)
+    [hit] = reopened.search("u1", vectors[7], k=1)
+    assert hit.memory_id == "m7" and hit.similarity > 0.99
+
+
+def test_benchmark_keeps_quality_with_a_small_hot_tier() -> None:
+    report = run_benchmark(memories=8_000, hot_cap=3_000, dims=64, queries=300)
+    flat, tiered = report["flat"], report["tiered"]
+    assert flat["cold"] == 0 and tiered["hot"] <= 3_000
+    assert tiered["hit_rate"] >= flat["hit_rate"] - 0.02
+    assert tiered["noise_per_query"] < flat["noise_per_query"]
+    assert tiered["cold_search_rate"] < 0.25
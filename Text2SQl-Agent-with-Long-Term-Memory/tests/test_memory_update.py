@@ -0,0 +1,190 @@
+import hashlib
+import json
+import re
+from typing import Any, Dict, List, Sequence
+
+import pytest
+
+from memory_update import (
+    Match,
+    MemoryOperation,
+    MemoryUpdater,
+    SQLiteMemoryStore,
+    parse_operations,
+    sqlite_execute_values,
+)
+
+
+def embed(texts: List[str]) -> List[List[float]]:
+    """Bag-of-words hashing embedding."""
+    vectors = []
+    for text in texts:
+        vector = [0.0] * 64
+        for word in re.findall(r"[a-z0-9]+", text.lower()):
+            vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % 64] += 1.0
+        vectors.append(vector)
+    return vectors
+
+
+class CountingEmbedder:
+    def __init__(self) -> None:
+        self.calls: List[List[str]] = []
+
+    def __call__(self, texts: List[str]) -> List[List[float]]:
+        self.calls.append(list(texts))
+        return embed(texts)
+
+
+class ScriptedLLM:
+    """Replies with the next scripted list of operations, as JSON."""
+
+    def __init__(self, *replies: List[Dict[str, Any]]) -> None:
+        self.replies = list(replies)
+        self.prompts: List[str] = []
+
+    def __call__(self, prompt: str) -> str:
+        self.prompts.append(prompt)
+        return json.dumps(self.replies.pop(0))
+
+
+def add_all(count: int) -> List[Dict[str, Any]]:
+    return [{"fact": i + 1, "operation": "ADD"} for i in range(count)]
+
+
+def seed(store: SQLiteMemoryStore, user_id: str, facts: List[str]) -> Dict[str, str]:
+    """Add ``facts`` and return ``{content: memory_id}``."""
+    MemoryUpdater(store, ScriptedLLM(add_all(len(facts))), embed).update(user_id, facts)
+    return {
+        content: memory_id for memory_id, content in store.memories(user_id).items()
+    }
+
+
+def test_all_facts_use_one_call_per_stage() -> None:
+    store = SQLiteMemoryStore()
+    embedder = CountingEmbedder()
+    llm = ScriptedLLM(add_all(3))
+    updater = MemoryUpdater(store, llm, embedder)
+
+    facts = ["only approved loans", "luxury means over 1M", "focus on California"]
+    operations = updater.update("u1", facts)
+
+    assert [op.kind for op in operations] == ["ADD", "ADD", "ADD"]
+    assert len(embedder.calls) == 1 and len(llm.prompts) == 1
+    assert store.transactions == 1
+    assert sorted(store.memories("u1").values()) == sorted(facts)
+    assert all(fact in llm.prompts[0] for fact in facts)
+
+
+def test_update_delete_and_none_apply_together() -> None:
+    store = SQLiteMemoryStore()
+    ids = seed(store, "u1", ["only approved loans", "interested in Texas loans"])
+    llm = ScriptedLLM(
+        [
+            {
+                "fact": 1,
+                "operation": "UPDATE",
+                "memory_id": ids["only approved loans"],
+                "text": "only approved or pending loans",
+            },
+            {
+                "fact": 2,
+                "operation": "DELETE",
+                "memory_id": ids["interested in Texas loans"],
+            },
+            {"fact": 3, "operation": "NONE"},
+        ]
+    )
+    updater = MemoryUpdater(store, llm, embed)
+    updater.update(
+        "u1",
+        ["also pending loans", "no longer Texas loans", "approved loans only"],
+    )
+
+    assert store.memories("u1") == {
+        ids["only approved loans"]: "only approved or pending loans"
+    }
+    assert store.transactions == 2
+    # The rewritten memory is searchable by its new text.
+    [matches] = store.search_many("u1", embed(["only approved or pending loans"]), 1)
+    assert matches[0].content == "only approved or pending loans"
+    assert matches[0].score == pytest.approx(1.0, abs=1e-6)
+
+
+def test_search_many_is_per_user_and_ranked() -> None:
+    store = SQLiteMemoryStore()
+    seed(store, "u1", ["approved loans", "California customers", "luxury homes"])
+    seed(store, "u2", ["approved loans"])
+
+    queries = embed(["approved loans please", "customers in California"])
+    results = store.search_many("u1", queries, 2)
+    assert [m.content for m in results[0]][0] == "approved loans"
+    assert [m.content for m in results[1]][0] == "California customers"
+    assert all(len(matches) == 2 for matches in results)
+    assert [len(m) for m in store.search_many("u3", queries, 2)] == [0, 0]
+
+
+def test_invalid_or_missing_operations() -> None:
+    candidates: List[Sequence[Match]] = [
+        [Match("m1", "approved loans", 0.9)],
+        [Match("m1", "approved loans", 0.8)],
+        [],
+        [Match("m2", "Texas", 0.7)],
+    ]
+    facts = ["a", "b", "c", "d"]
+    reply = (
+        "```json\n"
+        + json.dumps(
+            [
+                {"fact": 1, "operation": "UPDATE", "memory_id": "m1", "text": "x"},
+                # m1 was already changed by fact 1.
+                {"fact": 2, "operation": "DELETE", "memory_id": "m1"},
+                # Not one of fact 4's candidates.
+                {"fact": 4, "operation": "DELETE", "memory_id": "m9"},
+                {"fact": 9, "operation": "ADD"},
+            ]
+        )
+        + "\n```"
+    )
+    operations = parse_operations(reply, facts, candidates)
+    assert [op.kind for op in operations] == ["UPDATE", "NONE", "ADD", "NONE"]
+    assert operations[0].content == "x" and operations[2].content == "c"
+
+    unparsable = parse_operations("I could not decide.", facts, candidates)
+    assert [op.kind for op in unparsable] == ["NONE", "NONE", "ADD", "NONE"]
+
+
+def test_failed_write_rolls_back_the_whole_batch() -> None:
+    def failing_delete(
+        cursor: Any, sql: str, argslist: Sequence[Any], **kwargs: Any
+    ) -> Any:
+        if sql.startswith("DELETE"):
+            raise RuntimeError("connection lost")
+        return sqlite_execute_values(cursor, sql, argslist, **kwargs)
+
+    store = SQLiteMemoryStore(execute_values=failing_delete)
+    ids = seed(store, "u1", ["Texas loans"])
+    llm = ScriptedLLM(
+        [
+            {"fact": 1, "operation": "ADD"},
+            {"fact": 2, "operation": "DELETE", "memory_id": ids["Texas loans"]},
+        ]
+    )
+    with pytest.raises(RuntimeError):
+        MemoryUpdater(store, llm, embed).update(
+            "u1", ["luxury homes", "not Texas loans"]
+        )
+    assert list(store.memories("u1").values()) == ["Texas loans"]
+
+
+def test_duplicate_and_blank_facts_are_skipped() -> None:
+    store = SQLiteMemoryStore()
+    llm = ScriptedLLM(add_all(1))
+    updater = MemoryUpdater(store, llm, embed)
+    assert updater.update("u1", ["  ", ""]) == []
+    operations = updater.update("u1", ["approved  loans", "approved loans"])
+    assert operations == [
+        MemoryOperation(
+            "ADD", "approved loans", operations[0].memory_id, "approved loans"
+        )
+    ]
+    assert updater.stats.batches == 1 and updater.stats.facts == 1
@@ -0,0 +1,210 @@
+import math
+import threading
+from typing import Dict, List, Optional
+
+import pytest
+
+from query_cache import CachedQuery, SemanticQueryCache, preferences_fingerprint
+
+
+class TableEmbedder:
+    """Looks questions up in a fixed table of vectors and counts calls."""
+
+    def __init__(self, vectors: Dict[str, List[float]]) -> None:
+        self.vectors = vectors
+        self.calls = 0
+
+    def embed(self, text: str) -> List[float]:
+        self.calls += 1
+        return self.vectors[text]
+
+
+def at_angle(cos: float) -> List[float]:
+    return [cos, math.sqrt(1 - cos * cos)]
+
+
+def sql_of(entry: Optional[CachedQuery]) -> str:
+    assert entry is not None
+    return entry.sql
+
+
+@pytest.fixture
+def cache() -> SemanticQueryCache:
+    embedder = TableEmbedder(
+        {
+            "top loans": [1.0, 0.0],
+            "close paraphrase": at_angle(0.95),
+            "different question": at_angle(0.80),
+        }
+    )
+    return SemanticQueryCache(embedder, threshold=0.92)
+
+
+def test_preferences_fingerprint_ignores_order_and_whitespace() -> None:
+    assert preferences_fingerprint(["a  b", "c"]) == preferences_fingerprint(
+        ["c", "a b"]
+    )
+    assert preferences_fingerprint(["a"]) != preferences_fingerprint(["b"])
+
+
+def test_hit_above_threshold_and_miss_below(cache: SemanticQueryCache) -> None:
+    cache.store("u1", "top loans", "SELECT 1", "db", "v1")
+    hit = cache.lookup("u1", "close paraphrase", "db", "v1")
+    assert hit is not None and hit.sql == "SELECT 1" and hit.hits == 1
+    assert cache.lookup("u1", "different question", "db", "v1") is None
+
+
+def test_embedding_scale_does_not_affect_similarity(cache: SemanticQueryCache) -> None:
+    cache.store("u1", "q", "SELECT 1", "db", "v1", embedding=[10.0, 0.0])
+    assert cache.lookup("u1", "q", "db", "v1", embedding=[0.5, 0.0]) is not None
+
+
+def test_lookup_picks_most_similar_entry(cache: SemanticQueryCache) -> None:
+    cache.store("u1", "a", "SELECT a", "db", "v1", embedding=at_angle(0.93))
+    cache.store("u1", "b", "SELECT b", "db", "v1", embedding=at_angle(0.99))
+    assert sql_of(cache.lookup("u1", "top loans", "db", "v1")) == "SELECT b"
+
+
+def test_preferences_database_and_schema_version_must_match(
+    cache: SemanticQueryCache,
+) -> None:
+    cache.store(
+        "u1", "top loans", "SELECT 1", "db", "v1", preferences=["only approved"]
+    )
+    assert (
+        cache.lookup("u1", "top loans", "db", "v1", preferences=["only approved"])
+        is not None
+    )
+    assert cache.lookup("u1", "top loans", "db", "v1", preferences=[]) is None
+    assert (
+        cache.lookup("u1", "top loans", "db", "v2", preferences=["only approved"])
+        is None
+    )
+    assert (
+        cache.lookup("u1", "top loans", "other", "v1", preferences=["only approved"])
+        is None
+    )
+
+
+def test_entries_are_per_user(cache: SemanticQueryCache) -> None:
+    cache.store("u1", "top loans", "SELECT 1", "db", "v1")
+    assert cache.lookup("u2", "top loans", "db", "v1") is None
+
+
+def test_get_or_generate_embeds_once_and_records_hits(
+    cache: SemanticQueryCache,
+) -> None:
+    generated: List[int] = []
+
+    def generate() -> str:
+        generated.append(1)
+        return "SELECT 1"
+
+    assert cache.get_or_generate("u1", "top loans", "db", "v1", [], generate) == (
+        "SELECT 1",
+        False,
+    )
+    assert cache.get_or_generate(
+        "u1", "close paraphrase", "db", "v1", [], generate
+    ) == ("SELECT 1", True)
+    assert len(generated) == 1
+    assert isinstance(cache.embedder, TableEmbedder)
+    assert cache.embedder.calls == 2
+
+    stats = cache.stats()
+    assert stats["lookups"] == 2
+    assert stats["hit_rate"] == 0.5
+    assert stats["hit_count"] == 1 and stats["miss_count"] == 1
+
+
+def test_latency_samples_are_bounded() -> None:
+    cache = SemanticQueryCache(TableEmbedder({"q": [1.0, 0.0]}), latency_window=5)
+    for _ in range(20):
+        cache.get_or_generate("u1", "q", "db", "v1", [], lambda: "SELECT 1")
+    assert cache.stats()["lookups"] == 20
+    assert all(len(values) <= 5 for values in cache._latencies.values())
+
+
+def test_oldest_entry_is_evicted_when_full() -> None:
+    cache = SemanticQueryCache(TableEmbedder({}), max_entries_per_user=2)
+    cache.store("u1", "a", "SELECT a", "db", "v1", embedding=[1.0, 0.0])
+    cache.store("u1", "b", "SELECT b", "db", "v1", embedding=[0.0, 1.0])
+    cache.store("u1", "c", "SELECT c", "db", "v1", embedding=[-1.0, 0.0])
+    assert cache.lookup("u1", "a", "db", "v1", embedding=[1.0, 0.0]) is None
+    assert (
+        sql_of(cache.lookup("u1", "b", "db", "v1", embedding=[0.0, 1.0])) == "SELECT b"
+    )
+    assert (
+        sql_of(cache.lookup("u1", "c", "db", "v1", embedding=[-1.0, 0.0])) == "SELECT c"
+    )
+
+
+def test_invalidate_user(cache: SemanticQueryCache) -> None:
+    cache.store("u1", "top loans", "SELECT 1", "db", "v1")
+    cache.store("u1", "different question", "SELECT 2", "db", "v1")
+    assert cache.invalidate_user("u1") == 2
+    assert cache.invalidate_user("u1") == 0
+    assert cache.lookup("u1", "top loans", "db", "v1") is None
+
+
+def test_sql_generated_across_an_invalidation_is_not_cached(
+    cache: SemanticQueryCache,
+) -> None:
+    def generate() -> str:
+        # A memory update lands while the SQL is being generated.
+        cache.invalidate_user("u1")
+        return "SELECT stale"
+
+    assert cache.get_or_generate("u1", "top loans", "db", "v1", [], generate) == (
+        "SELECT stale",
+        False,
+    )
+    assert cache.lookup("u1", "top loans", "db", "v1") is None
+
+    epoch = cache.user_epoch("u1")
+    assert (
+        cache.store("u1", "top loans", "SELECT 1", "db", "v1", epoch=epoch) is not None
+    )
+    cache.invalidate_user("u1")
+    assert cache.store("u1", "top loans", "SELECT 2", "db", "v1", epoch=epoch) is None
+    assert cache.lookup("u1", "top loans", "db", "v1") is None
+
+
+def test_invalidate_schema_keeps_current_version_and_other_databases(
+    cache: SemanticQueryCache,
+) -> None:
+    cache.store("u1", "a", "SELECT old", "db", "v1", embedding=[1.0, 0.0])
+    cache.store("u1", "b", "SELECT new", "db", "v2", embedding=[0.0, 1.0])
+    cache.store("u2", "c", "SELECT other", "other", "v1", embedding=[1.0, 0.0])
+    assert cache.invalidate_schema("db", keep_version="v2") == 1
+    assert cache.lookup("u1", "a", "db", "v1", embedding=[1.0, 0.0]) is None
+    assert (
+        sql_of(cache.lookup("u1", "b", "db", "v2", embedding=[0.0, 1.0]))
+        == "SELECT new"
+    )
+    assert (
+        sql_of(cache.lookup("u2", "c", "other", "v1", embedding=[1.0, 0.0]))
+        == "SELECT other"
+    )
+    assert cache.invalidate_schema("db") == 1
+    assert cache.lookup("u1", "b", "db", "v2", embedding=[0.0, 1.0]) is None
+
+
+def test_concurrent_stores_and_lookups() -> None:
+    cache = SemanticQueryCache(TableEmbedder({}), max_entries_per_user=50)
+
+    def worker(user: str) -> None:
+        for i in range(100):
+            vector = [math.cos(i), math.sin(i)]
+            cache.store(user, str(i), f"SELECT {i}", "db", "v1", embedding=vector)
+            assert cache.lookup(user, str(i), "db", "v1", embedding=vector) is not None
+
+    threads = [threading.Thread(target=worker, args=(f"u{n}",)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    for n in range(4):
+        assert len(cache._users[f"u{n}"].entries) == 50
+        matrix = cache._users[f"u{n}"].matrix
+        assert matrix is not None and matrix.shape == (50, 2)
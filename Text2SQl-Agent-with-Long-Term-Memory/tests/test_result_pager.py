@@ -0,0 +1,142 @@
+import sqlite3
+import tracemalloc
+from typing import Any, Iterator, List
+
+import pytest
+
+from result_pager import row_bytes, run_paged
+
+
+@pytest.fixture
+def conn() -> Iterator[sqlite3.Connection]:
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE loans (loan_id INTEGER, state TEXT, notes TEXT)")
+    conn.executemany(
+        "INSERT INTO loans VALUES (?, ?, ?)",
+        ((i, "CA", "approved") for i in range(1000)),
+    )
+    yield conn
+    conn.close()
+
+
+class CountingCursor:
+    """Wraps a sqlite3 cursor and records each ``fetchmany`` size."""
+
+    def __init__(self, cursor: sqlite3.Cursor) -> None:
+        self.cursor = cursor
+        self.fetches: List[int] = []
+        self.closed = False
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.cursor, name)
+
+    def fetchmany(self, size: int) -> List[Any]:
+        self.fetches.append(size)
+        return self.cursor.fetchmany(size)
+
+    def close(self) -> None:
+        self.closed = True
+        self.cursor.close()
+
+
+class CountingConnection:
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self.conn = conn
+        self.cursors: List[CountingCursor] = []
+
+    def cursor(self) -> CountingCursor:
+        self.cursors.append(CountingCursor(self.conn.cursor()))
+        return self.cursors[-1]
+
+
+def test_first_page_fetches_only_that_page(conn: sqlite3.Connection) -> None:
+    counting = CountingConnection(conn)
+    result = run_paged(counting, "SELECT * FROM loans ORDER BY loan_id", page_size=50)
+    page = result.next_page()
+    assert page.columns == ["loan_id", "state", "notes"]
+    assert [row[0] for row in page.rows] == list(range(50))
+    assert page.number == 1 and not page.done
+    # The page plus one row of lookahead, nothing more.
+    assert counting.cursors[0].fetches == [51]
+
+    second = result.next_page()
+    assert second.offset == 50 and second.rows[0][0] == 50
+
+
+def test_pages_until_exhausted(conn: sqlite3.Connection) -> None:
+    result = run_paged(conn, "SELECT * FROM loans WHERE loan_id < 120", page_size=50)
+    pages = list(result)
+    assert [len(page.rows) for page in pages] == [50, 50, 20]
+    assert [page.done for page in pages] == [False, False, True]
+    assert not any(page.truncated for page in pages)
+    assert result.next_page().rows == []
+
+
+def test_exact_multiple_of_page_size_ends_on_last_page(
+    conn: sqlite3.Connection,
+) -> None:
+    pages = list(run_paged(conn, "SELECT * FROM loans", page_size=250))
+    assert len(pages) == 4 and pages[-1].done and pages[-1].notice == ""
+
+
+def test_row_cap_truncates_with_notice_and_closes_cursor(
+    conn: sqlite3.Connection,
+) -> None:
+    counting = CountingConnection(conn)
+    result = run_paged(counting, "SELECT * FROM loans", page_size=40, max_rows=100)
+    pages = list(result)
+    assert [len(page.rows) for page in pages] == [40, 40, 20]
+    assert pages[-1].truncated and "first 100 rows" in pages[-1].notice
+    assert "100-row limit" in pages[-1].notice
+    assert counting.cursors[0].closed
+
+
+def test_byte_cap(conn: sqlite3.Connection) -> None:
+    first = conn.execute("SELECT * FROM loans LIMIT 31").fetchall()
+    budget = sum(row_bytes(row) for row in first) - 1
+    pages = list(run_paged(conn, "SELECT * FROM loans", page_size=20, max_bytes=budget))
+    assert sum(len(page.rows) for page in pages) == 30
+    assert pages[-1].truncated and "MB limit" in pages[-1].notice
+
+
+def test_result_under_cap_is_not_truncated(conn: sqlite3.Connection) -> None:
+    pages = list(run_paged(conn, "SELECT * FROM loans LIMIT 100", max_rows=100))
+    assert not pages[-1].truncated and pages[-1].done
+
+
+def test_empty_result(conn: sqlite3.Connection) -> None:
+    page = run_paged(conn, "SELECT * FROM loans WHERE loan_id < 0").next_page()
+    assert (
+        page.rows == [] and page.done and page.columns == ["loan_id", "state", "notes"]
+    )
+
+
+def test_peak_memory_is_measured_and_bounded_by_page() -> None:
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE t (payload TEXT)")
+    conn.executemany("INSERT INTO t VALUES (?)", (("x" * 200,) for _ in range(5000)))
+
+    result = run_paged(conn, "SELECT payload FROM t", page_size=100)
+    result.next_page()
+    assert 0 < result.peak_memory_bytes < 200 * 1000
+    # Tracing only runs during a fetch, even while the result stays open.
+    assert not tracemalloc.is_tracing()
+
+    tracemalloc.start()
+    conn.execute("SELECT payload FROM t").fetchall()
+    full_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert result.peak_memory_bytes * 5 < full_peak
+
+
+def test_invalid_limits(conn: sqlite3.Connection) -> None:
+    with pytest.raises(ValueError):
+        run_paged(conn, "SELECT 1", page_size=0)
+
+
+def test_dataframe_value(conn: sqlite3.Connection) -> None:
+    page = run_paged(conn, "SELECT loan_id, state FROM loans", page_size=2).next_page()
+    assert page.to_dataframe() == {
+        "headers": ["loan_id", "state"],
+        "data": [[0, "CA"], [1, "CA"]],
+    }
@@ -0,0 +1,176 @@
+import threading
+from typing import Any, Iterator, List, Optional, Tuple
+
+import pytest
+import requests
+
+from denodo_stub import StubDenodoServer, hashed_embed_fn, sample_metadata
+from schema_cache import FetchResult, SchemaCache, denodo_fetch_fn, parse_metadata
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class CountingEmbedder:
+    def __init__(self) -> None:
+        self.texts = 0
+
+    def __call__(self, texts: List[str]) -> List[List[float]]:
+        self.texts += len(texts)
+        return hashed_embed_fn(texts)
+
+
+@pytest.fixture
+def server() -> Iterator[StubDenodoServer]:
+    with StubDenodoServer({"bank": sample_metadata(40)}).start() as stub:
+        yield stub
+
+
+def make_cache(server: StubDenodoServer, **kwargs: Any) -> SchemaCache:
+    kwargs.setdefault("top_k", 2)
+    return SchemaCache(denodo_fetch_fn(host=server.base_url), hashed_embed_fn, **kwargs)
+
+
+def test_parse_metadata_reads_views_columns_and_associations() -> None:
+    snapshot = parse_metadata("bank", sample_metadata(4))
+    loans = snapshot.tables["loans"]
+    assert [c.name for c in loans.columns][:2] == ["loan_id", "customer_id"]
+    assert loans.joins == [("customers", "loans.customer_id = customers.customer_id")]
+    assert parse_metadata("bank", sample_metadata(4)).version == snapshot.version
+    assert parse_metadata("bank", sample_metadata(5)).version != snapshot.version
+    assert parse_metadata("bank", sample_metadata(4), etag='"abc"').version == '"abc"'
+
+
+def test_within_ttl_no_request_is_made(server: StubDenodoServer) -> None:
+    clock = Clock()
+    cache = make_cache(server, ttl_seconds=60, clock=clock)
+    cache.context_for("bank", "loans with the highest interest rate")
+    cache.context_for("bank", "customers by state")
+    assert server.requests == 1
+
+
+def test_expired_ttl_revalidates_with_etag_and_keeps_index(
+    server: StubDenodoServer,
+) -> None:
+    clock = Clock()
+    embedder = CountingEmbedder()
+    cache = SchemaCache(
+        denodo_fetch_fn(host=server.base_url), embedder, ttl_seconds=60, clock=clock
+    )
+    version = cache.version("bank")
+    indexed = embedder.texts
+
+    clock.now = 61
+    assert cache.version("bank") == version
+    assert server.requests == 2 and server.not_modified == 1
+    assert embedder.texts == indexed
+    assert cache.stats()["rebuilds"] == 1
+
+
+def test_schema_change_rebuilds_and_notifies(server: StubDenodoServer) -> None:
+    clock = Clock()
+    changes: List[Tuple[str, str]] = []
+    cache = make_cache(
+        server,
+        ttl_seconds=60,
+        clock=clock,
+        on_version_change=lambda db, v: changes.append((db, v)),
+    )
+    old = cache.version("bank")
+
+    server.set_metadata("bank", sample_metadata(41))
+    clock.now = 61
+    new = cache.version("bank")
+    assert new != old
+    assert changes == [("bank", new)]
+    assert len(cache.get("bank").tables) == 41
+
+
+def test_reload_after_invalidate_notifies_only_on_a_new_version(
+    server: StubDenodoServer,
+) -> None:
+    changes: List[Tuple[str, str]] = []
+    cache = make_cache(server, on_version_change=lambda db, v: changes.append((db, v)))
+    cache.version("bank")
+    cache.invalidate("bank")
+    cache.version("bank")
+    assert changes == []
+
+    server.set_metadata("bank", sample_metadata(41))
+    cache.invalidate("bank")
+    assert changes == [("bank", cache.version("bank"))]
+
+
+def test_works_without_etags_by_comparing_content() -> None:
+    with StubDenodoServer(
+        {"bank": sample_metadata(10)}, send_etag=False
+    ).start() as server:
+        embedder = CountingEmbedder()
+        cache = SchemaCache(
+            denodo_fetch_fn(host=server.base_url), embedder, ttl_seconds=0
+        )
+        version = cache.version("bank")
+        indexed = embedder.texts
+        assert cache.version("bank") == version
+        assert embedder.texts == indexed
+        assert cache.stats()["not_modified"] == 1
+
+
+def test_context_contains_top_tables_and_join_bridges(server: StubDenodoServer) -> None:
+    cache = make_cache(server)
+    context = cache.context_for("bank", "total payments amount per customer state")
+    assert set(context.tables[:2]) == {"payments", "customers"}
+    # payments -> loans -> customers: loans is pulled in to join them.
+    assert "loans" in context.tables
+    assert "Table loans" in context.text
+    assert "JOIN loans ON payments.loan_id = loans.loan_id" in context.text
+    assert "audit_0" not in context.text
+
+
+def test_pruned_joins_only_reference_selected_tables(server: StubDenodoServer) -> None:
+    cache = make_cache(server, top_k=1)
+    context = cache.context_for("bank", "loan interest rate and loan status")
+    assert context.tables == ["loans"]
+    assert "JOIN" not in context.text
+
+
+def test_stats_report_token_savings(server: StubDenodoServer) -> None:
+    cache = make_cache(server)
+    context = cache.context_for("bank", "market value of properties by city")
+    assert context.pruned_tokens < context.full_tokens
+    stats = cache.stats()
+    assert stats["contexts"] == 1
+    assert stats["token_savings"] == pytest.approx(
+        1 - context.pruned_tokens / context.full_tokens
+    )
+    assert stats["token_savings"] > 0.5
+
+
+def test_concurrent_callers_share_one_fetch() -> None:
+    gate = threading.Event()
+    calls: List[Optional[str]] = []
+
+    def fetch(database: str, etag: Optional[str]) -> FetchResult:
+        calls.append(etag)
+        gate.wait(5)
+        return FetchResult(sample_metadata(8))
+
+    cache = SchemaCache(fetch, hashed_embed_fn)
+    threads = [threading.Thread(target=cache.get, args=("bank",)) for _ in range(8)]
+    for t in threads:
+        t.start()
+    gate.set()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+
+
+def test_unknown_database_raises(server: StubDenodoServer) -> None:
+    cache = make_cache(server)
+    with pytest.raises(requests.HTTPError):
+        cache.get("missing")
@@ -0,0 +1,19 @@
+"""
+Token budgeting helpers shared by the prompt-building modules.
+
+The estimate is deliberately cheap (about 4 characters per token); it is used
+to keep prompt sections within a budget, not to bill usage.
+"""
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token) used for budgeting."""
+    return (len(text) + 3) // 4
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Trim text to roughly ``max_tokens`` tokens."""
+    max_chars = max_tokens * 4
+    if len(text) <= max_chars:
+        return text
+    return text[: max(0, max_chars - 3)] + "..."